@@ -0,0 +1,165 @@
+import argparse
+import asyncio
+import gzip
+import time
+import zlib
+from pathlib import Path
+
+from aiohttp import web
+from aiohttp.test_utils import make_mocked_request
+from psycopg_pool import AsyncConnectionPool
+
+from m2rss.appkeys import feed_cache_key, single_flight_key
+from m2rss.compression import ENCODINGS, brotli, zstandard
+from m2rss.data.aliases import AliasCache
+from m2rss.data.emails import FeedRow
+from m2rss.data.groups import GroupCache
+from m2rss.feed_cache import FeedCache
+from m2rss.fragments import card_fragment, item_url, rss_fragment
+from m2rss.handlers.cache import cached_response
+from m2rss.parsing import email_from_data, get_sanitizer
+from m2rss.rss import RSS_SERIALIZER, RssChannel
+from m2rss.single_flight import SingleFlight
+
+CORPUS_DIR = Path(__file__).resolve().parent / "corpus"
+SERVICE_URL = "https://m2rss.example.com"
+
+
+def feed_rows(count: int) -> list[tuple[FeedRow, FeedRow]]:
+    sanitizer = get_sanitizer()
+    emails = [
+        email_from_data(sanitizer, "reader@example.com", path.read_bytes())
+        for path in sorted(CORPUS_DIR.glob("*.eml"))
+    ]
+    rows: list[tuple[FeedRow, FeedRow]] = []
+    for k in range(count):
+        mail = emails[k % len(emails)]
+        rows.append(
+            (
+                FeedRow(
+                    k, mail.date, mail.subject, mail.from_full, mail.rss_fragment, ""
+                ),
+                FeedRow(
+                    k, mail.date, mail.subject, mail.from_full, mail.html_fragment, ""
+                ),
+            )
+        )
+    return rows
+
+
+def bodies(count: int) -> dict[str, bytes]:
+    rows = feed_rows(count)
+    channel = RssChannel(
+        title="list@example.com",
+        description="list@example.com mailing list",
+        link=f"{SERVICE_URL}/page/list.html",
+    )
+    rss = "".join(
+        RSS_SERIALIZER.chunks(
+            f"{SERVICE_URL}/rss/list.xml",
+            channel,
+            [],
+            rendered=[
+                rss_fragment(row, item_url(SERVICE_URL, "list", row.id))
+                for row, _ in rows
+            ],
+        )
+    )
+    cards = "".join(
+        card_fragment(row, item_url(SERVICE_URL, "list", row.id)) for _, row in rows
+    )
+    return {f"rss/{count}": rss.encode(), f"cards/{count}": cards.encode()}
+
+
+def codec_table(name: str, body: bytes, repeat: int):
+    def gzip_level(level: int):
+        return lambda: gzip.compress(body, level, mtime=0)
+
+    candidates = [(f"gzip-{level}", gzip_level(level)) for level in (1, 6, 9)]
+    candidates.append(("deflate-6", lambda: zlib.compress(body, 6)))
+    if brotli is not None:
+        candidates += [
+            (f"br-{quality}", lambda q=quality: brotli.compress(body, quality=q))
+            for quality in (5, 9, 11)
+        ]
+    if zstandard is not None:
+        candidates += [
+            (
+                f"zstd-{level}",
+                lambda lv=level: zstandard.ZstdCompressor(level=lv).compress(body),
+            )
+            for level in (3, 6, 19)
+        ]
+    print(f"{name}: {len(body) / 1024:.1f} KiB")
+    for label, run in candidates:
+        size = len(run())
+        start = time.process_time()
+        for _ in range(repeat):
+            run()
+        seconds = (time.process_time() - start) / repeat
+        print(
+            f"  {label:<10} {size / 1024:8.1f} KiB ({size / len(body):5.1%}) "
+            f"{seconds * 1000:7.2f} ms"
+        )
+
+
+# CPU and bytes per poll of one feed: plain, compressed on every request (what
+# a compressing middleware does) and compressed once into the feed cache.
+async def per_request(name: str, body: bytes, polls: int):
+    app = web.Application()
+    # The caches are never reloaded, the pool is not opened.
+    pool = AsyncConnectionPool("", open=False)
+    alias_cache = AliasCache(pool)
+    app[feed_cache_key] = FeedCache(
+        alias_cache, GroupCache(pool, alias_cache), 16, 2**30
+    )
+    app[single_flight_key] = SingleFlight(1, 1)
+    # Not stored in the cache, clearing its compressed bodies keeps sizes right.
+    feed = app[feed_cache_key].put(("rss", "list", "0//", 20), body, "text/xml", -1)
+
+    async def serve(accept_encoding: str, cached: bool) -> int:
+        request = make_mocked_request(
+            "GET",
+            "/rss/list.xml",
+            headers={"Accept-Encoding": accept_encoding},
+            app=app,
+        )
+        if not cached:
+            feed.encoded.clear()
+        response = await cached_response(request, feed)
+        assert isinstance(response.body, bytes)
+        return len(response.body)
+
+    print(f"{name}: {polls} polls")
+    for label, accept_encoding, cached in [
+        ("identity", "identity", True),
+        *[(f"{encoding} every poll", encoding, False) for encoding in ENCODINGS],
+        *[(f"{encoding} cached", encoding, True) for encoding in ENCODINGS],
+    ]:
+        feed.encoded.clear()
+        start = time.process_time()
+        sent = 0
+        for _ in range(polls):
+            sent += await serve(accept_encoding, cached)
+        seconds = time.process_time() - start
+        print(
+            f"  {label:<18} {sent / polls / 1024:8.1f} KiB/request "
+            f"{seconds / polls * 1e6:9.1f} us CPU/request"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Response compression benchmark")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--polls", type=int, default=50)
+    args = parser.parse_args()
+
+    print(f"Available codings: {', '.join(ENCODINGS)}")
+    for count in (20, 200):
+        for name, body in bodies(count).items():
+            codec_table(name, body, args.repeat)
+            asyncio.run(per_request(name, body, args.polls))
+
+
+if __name__ == "__main__":
+    main()
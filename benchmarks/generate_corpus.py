@@ -0,0 +1,162 @@
+import argparse
+import random
+from collections.abc import Iterator
+from datetime import UTC, datetime, timedelta
+from email.message import EmailMessage
+from email.utils import format_datetime
+from html import escape
+from pathlib import Path
+
+from pydantic import BaseModel
+
+ASCII_WORDS = (
+    "the a patch release build kernel list thread reply review merge branch commit "
+    "fix regression test driver memory cache lock queue scheduler upstream bisect "
+    'config option warning error stable backport & < > "quoted" it\'s'
+).split()
+LATIN_WORDS = "été naïve façade résumé déjà Ärger Größe niño".split()
+CJK_WORDS = "日本語 メール 修正 リリース 確認".split()
+
+# Words each charset can encode, so that no message falls back to another one.
+CHARSET_WORDS = {
+    "us-ascii": ASCII_WORDS,
+    "utf-8": ASCII_WORDS + LATIN_WORDS + CJK_WORDS,
+    "iso-8859-1": ASCII_WORDS + LATIN_WORDS,
+    "windows-1252": ASCII_WORDS + LATIN_WORDS,
+    "shift_jis": ASCII_WORDS + CJK_WORDS,
+}
+
+
+# Shape of a synthetic mailing list corpus, generation is deterministic for a
+# given profile.
+class CorpusProfile(BaseModel):
+    messages: int = 1000
+    lists: int = 5
+    html_ratio: float = 0.5
+    digest_ratio: float = 0.05
+    digest_size: int = 30
+    paragraphs: int = 8
+    charsets: list[str] = ["utf-8", "iso-8859-1", "us-ascii"]
+    seed: int = 13
+
+
+def list_addr(k: int) -> str:
+    return f"list{k}@lists.example.org"
+
+
+class CorpusGenerator:
+    def __init__(self, profile: CorpusProfile):
+        self.profile = profile
+        self.random = random.Random(profile.seed)
+        self.start = datetime(2024, 1, 1, tzinfo=UTC)
+
+    def sentence(self, words: list[str], length: int) -> str:
+        return " ".join(self.random.choice(words) for _ in range(length)) + "."
+
+    def paragraphs(self, words: list[str], count: int) -> list[str]:
+        return [
+            "\n".join(
+                self.sentence(words, self.random.randint(6, 16))
+                for _ in range(self.random.randint(1, 5))
+            )
+            for _ in range(count)
+        ]
+
+    def html(self, paragraphs: list[str], k: int) -> str:
+        body = "".join(
+            f"<p>{escape(paragraph).replace(chr(10), '<br>')} "
+            f"<a href='https://lists.example.org/archive/{k}/{p}'>archive</a></p>"
+            for p, paragraph in enumerate(paragraphs)
+        )
+        return (
+            "<html><head><style>p { margin: 0 }</style></head><body>"
+            f"<table><tr><td>{body}</td></tr></table></body></html>"
+        )
+
+    def digest(self, words: list[str], k: int) -> list[str]:
+        parts = ["Today's Topics:", ""]
+        parts += [
+            f"   {t}. {self.sentence(words, 5)}"
+            for t in range(1, self.profile.digest_size + 1)
+        ]
+        for t in range(1, self.profile.digest_size + 1):
+            parts += [
+                "-" * 70,
+                f"Message: {t}",
+                f"From: Member {t % 13} <member{t % 13}@example.com>",
+                f"Subject: Re: {self.sentence(words, 5)}",
+                "",
+                *self.paragraphs(words, self.random.randint(1, 4)),
+            ]
+        return parts
+
+    def message(self, k: int) -> bytes:
+        profile = self.profile
+        charset = self.random.choice(profile.charsets)
+        words = CHARSET_WORDS[charset]
+        mailing_list = list_addr(k % profile.lists)
+        msg = EmailMessage()
+        msg["To"] = mailing_list
+        # Feeds of the benchmarks follow the lists through sender_addr.
+        msg["Sender"] = f"List {k % profile.lists} <{mailing_list}>"
+        msg["Delivered-To"] = "reader@example.com"
+        msg["Date"] = format_datetime(self.start + timedelta(minutes=k))
+        msg["Message-ID"] = f"<{profile.seed}.{k}@lists.example.org>"
+        if self.random.random() < profile.digest_ratio:
+            msg["From"] = mailing_list
+            msg["Subject"] = f"List {k % profile.lists} Digest, Issue {k}"
+            msg.set_content("\n".join(self.digest(words, k)), charset=charset)
+            return msg.as_bytes()
+
+        msg["From"] = f"Member {k % 13} <member{k % 13}@example.com>"
+        msg["Subject"] = f"[list{k % profile.lists}] {self.sentence(words, 6)}"
+        paragraphs = self.paragraphs(words, profile.paragraphs)
+        msg.set_content("\n\n".join(paragraphs), charset=charset)
+        if self.random.random() < profile.html_ratio:
+            msg.add_alternative(
+                self.html(paragraphs, k), subtype="html", charset=charset
+            )
+        return msg.as_bytes()
+
+    def __iter__(self) -> Iterator[bytes]:
+        for k in range(self.profile.messages):
+            yield self.message(k)
+
+
+def generate(profile: CorpusProfile) -> list[bytes]:
+    return list(CorpusGenerator(profile))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Write a synthetic email corpus")
+    parser.add_argument("directory", type=Path)
+    parser.add_argument("--messages", type=int, default=1000)
+    parser.add_argument("--lists", type=int, default=5)
+    parser.add_argument("--html-ratio", type=float, default=0.5)
+    parser.add_argument("--digest-ratio", type=float, default=0.05)
+    parser.add_argument("--digest-size", type=int, default=30)
+    parser.add_argument("--paragraphs", type=int, default=8)
+    parser.add_argument(
+        "--charsets", default="utf-8,iso-8859-1,us-ascii", help="comma separated"
+    )
+    parser.add_argument("--seed", type=int, default=13)
+    args = parser.parse_args()
+
+    profile = CorpusProfile(
+        messages=args.messages,
+        lists=args.lists,
+        html_ratio=args.html_ratio,
+        digest_ratio=args.digest_ratio,
+        digest_size=args.digest_size,
+        paragraphs=args.paragraphs,
+        charsets=args.charsets.split(","),
+        seed=args.seed,
+    )
+    args.directory.mkdir(parents=True, exist_ok=True)
+    for k, data in enumerate(CorpusGenerator(profile)):
+        (args.directory / f"{k:06d}.eml").write_bytes(data)
+    print(f"Wrote {profile.messages} messages to {args.directory}")
+
+
+if __name__ == "__main__":
+    main()
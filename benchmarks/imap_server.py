@@ -0,0 +1,147 @@
+import asyncio
+import re
+
+SEQUENCE_PATTERN = re.compile(r"^(\d+|\*)(?::(\d+|\*))?$")
+
+
+def parse_uid_set(sequence: str, max_uid: int) -> set[int]:
+    uids: set[int] = set()
+    for item in sequence.split(","):
+        match = SEQUENCE_PATTERN.match(item)
+        if match is None:
+            continue
+        start, end = match.group(1), match.group(2) or match.group(1)
+        first = max_uid if start == "*" else int(start)
+        last = max_uid if end == "*" else int(end)
+        uids.update(range(min(first, last), max(first, last) + 1))
+    return uids
+
+
+# Minimal scriptable IMAP server for the m2rss sync engine. Messages added with
+# `add_message` are announced with EXISTS to every session currently in IDLE,
+# and to the other selected sessions in the response to their next command.
+class ImapStandIn:
+    def __init__(self, uid_validity: int = 1, idle: bool = True):
+        self.uid_validity = uid_validity
+        self.idle = idle
+        self.messages: dict[int, bytes] = {}
+        self.deleted: set[int] = set()
+        self.next_uid = 1
+        self.idling: set[asyncio.StreamWriter] = set()
+        self.selected: set[asyncio.StreamWriter] = set()
+        self.announce: set[asyncio.StreamWriter] = set()
+        self.commands: list[str] = []
+        self.server: asyncio.Server | None = None
+
+    async def start(self, host: str = "127.0.0.1", port: int = 0) -> int:
+        self.server = await asyncio.start_server(self.handle, host, port)
+        return self.server.sockets[0].getsockname()[1]
+
+    async def stop(self):
+        if self.server is not None:
+            self.server.close()
+            for writer in list(self.idling):
+                writer.close()
+            await self.server.wait_closed()
+
+    def add_message(self, data: bytes) -> int:
+        uid = self.next_uid
+        self.next_uid += 1
+        self.messages[uid] = data
+        for writer in self.idling:
+            writer.write(f"* {len(self.messages)} EXISTS\r\n".encode())
+        self.announce |= self.selected - self.idling
+        return uid
+
+    def sequence_number(self, uid: int) -> int:
+        return sorted(self.messages).index(uid) + 1
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        writer.write(b"* OK IMAP stand-in ready\r\n")
+        try:
+            while line := await reader.readline():
+                tag, _, command = line.decode().strip().partition(" ")
+                self.commands.append(command.split(" ", 1)[0].upper())
+                if not await self.dispatch(reader, writer, tag, command):
+                    break
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            self.idling.discard(writer)
+            self.selected.discard(writer)
+            self.announce.discard(writer)
+            writer.close()
+
+    async def dispatch(
+        self,
+        reader: asyncio.StreamReader,
+        writer: asyncio.StreamWriter,
+        tag: str,
+        command: str,
+    ) -> bool:
+        name, _, args = command.partition(" ")
+        match name.upper():
+            case "CAPABILITY":
+                capabilities = "IMAP4rev1 IDLE" if self.idle else "IMAP4rev1"
+                writer.write(f"* CAPABILITY {capabilities}\r\n".encode())
+            case "SELECT":
+                self.selected.add(writer)
+                self.announce.discard(writer)
+                writer.write(
+                    f"* {len(self.messages)} EXISTS\r\n"
+                    f"* OK [UIDVALIDITY {self.uid_validity}] UIDs valid\r\n"
+                    f"* OK [UIDNEXT {self.next_uid}] Predicted next UID\r\n".encode()
+                )
+            case "UID":
+                self.uid_command(writer, args)
+            case "EXPUNGE":
+                for uid in sorted(self.deleted & set(self.messages), reverse=True):
+                    writer.write(f"* {self.sequence_number(uid)} EXPUNGE\r\n".encode())
+                    del self.messages[uid]
+                self.deleted.clear()
+            case "IDLE":
+                writer.write(b"+ idling\r\n")
+                await writer.drain()
+                self.idling.add(writer)
+                done = await reader.readline()
+                self.idling.discard(writer)
+                if done.strip().upper() != b"DONE":
+                    writer.write(f"{tag} BAD expected DONE\r\n".encode())
+                    return True
+            case "LOGOUT":
+                writer.write(f"* BYE\r\n{tag} OK LOGOUT completed\r\n".encode())
+                await writer.drain()
+                return False
+            case "LOGIN" | "NOOP":
+                pass
+            case _:
+                writer.write(f"{tag} BAD unknown command\r\n".encode())
+                return True
+        if writer in self.announce:
+            self.announce.discard(writer)
+            writer.write(f"* {len(self.messages)} EXISTS\r\n".encode())
+        writer.write(f"{tag} OK {name.upper()} completed\r\n".encode())
+        return True
+
+    def uid_command(self, writer: asyncio.StreamWriter, args: str):
+        name, _, args = args.partition(" ")
+        max_uid = max(self.messages, default=0)
+        match name.upper():
+            case "SEARCH":
+                uids = parse_uid_set(args.split()[-1], max_uid) & set(self.messages)
+                found = " ".join(map(str, sorted(uids)))
+                writer.write(f"* SEARCH {found}\r\n".encode())
+            case "FETCH":
+                uids = parse_uid_set(args.split()[0], max_uid) & set(self.messages)
+                for uid in sorted(uids):
+                    data = self.messages[uid]
+                    writer.write(
+                        f"* {self.sequence_number(uid)} FETCH "
+                        f"(UID {uid} RFC822 {{{len(data)}}}\r\n".encode()
+                    )
+                    writer.write(data + b")\r\n")
+            case "STORE":
+                uids = parse_uid_set(args.split()[0], max_uid) & set(self.messages)
+                if "\\Deleted" in args:
+                    self.deleted.update(uids)
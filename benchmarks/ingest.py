@@ -0,0 +1,85 @@
+import argparse
+import asyncio
+import os
+from concurrent.futures import ProcessPoolExecutor
+from datetime import UTC, datetime, timedelta
+from email.message import EmailMessage
+from email.utils import format_datetime
+
+from benchmarks.imap_server import ImapStandIn
+from m2rss.data.emails import Email
+from m2rss.imap import ImapClient, MailboxSync
+from m2rss.ingest import IngestPipeline
+
+
+def make_message(k: int, paragraphs: int = 40) -> bytes:
+    msg = EmailMessage()
+    msg["From"] = f"Sender {k % 7} <list{k % 7}@example.com>"
+    msg["To"] = "reader@example.com"
+    msg["Subject"] = f"Digest number {k}"
+    msg["Date"] = format_datetime(
+        datetime(2024, 1, 1, tzinfo=UTC) + timedelta(minutes=k)
+    )
+    text = "\n\n".join(f"Paragraph {p} of message {k}." for p in range(paragraphs))
+    html = "".join(
+        f"<div><p>Paragraph <b>{p}</b> of <a href='https://example.com/{k}'>"
+        f"message {k}</a>.</p><table><tr><td>cell</td></tr></table></div>"
+        for p in range(paragraphs)
+    )
+    msg.set_content(text)
+    msg.add_alternative(f"<html><body>{html}</body></html>", subtype="html")
+    return msg.as_bytes()
+
+
+async def ingest(messages: int, workers: int, batch_size: int) -> float:
+    server = ImapStandIn()
+    port = await server.start()
+    for k in range(messages):
+        server.add_message(make_message(k))
+
+    stored: list[Email] = []
+
+    async def store(emails: list[Email]):
+        stored.extend(emails)
+
+    async def checkpoint(uid: int):
+        pass
+
+    with ProcessPoolExecutor(workers) as executor:
+        # Start the workers before timing.
+        list(executor.map(int, range(workers)))
+        async with ImapClient("127.0.0.1", port, starttls=False) as client:
+            await client.login("reader@example.com", "pass")
+            sync = MailboxSync(client)
+            await sync.select()
+            pipeline = IngestPipeline(
+                executor,
+                workers,
+                "reader@example.com",
+                batch_size,
+                4,
+                store,
+                checkpoint,
+            )
+            stats = await pipeline.run(sync, await sync.new_uids(0))
+    await server.stop()
+    assert len(stored) == messages
+    return stats.rate
+
+
+def main():
+    parser = argparse.ArgumentParser(description="IMAP ingestion throughput")
+    parser.add_argument("--messages", type=int, default=2000)
+    parser.add_argument("--batch-size", type=int, default=100)
+    parser.add_argument("--max-workers", type=int, default=os.cpu_count() or 1)
+    args = parser.parse_args()
+
+    workers = 1
+    while workers <= args.max_workers:
+        rate = asyncio.run(ingest(args.messages, workers, args.batch_size))
+        print(f"{workers} workers: {rate:.1f} emails/s")
+        workers *= 2
+
+
+if __name__ == "__main__":
+    main()
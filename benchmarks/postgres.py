@@ -0,0 +1,98 @@
+import os
+import shutil
+import socket
+import subprocess
+import tempfile
+import time
+from collections.abc import Iterator
+from contextlib import contextmanager
+from pathlib import Path
+
+from psycopg import Connection, conninfo, sql
+
+
+class PostgresUnavailable(Exception):
+    pass
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def find_binary(name: str) -> str | None:
+    # Debian style installs keep the server binaries out of PATH.
+    bin_dir = os.environ.get("PG_BIN")
+    if bin_dir is not None:
+        path = Path(bin_dir) / name
+        return str(path) if path.exists() else None
+    return shutil.which(name)
+
+
+# A cluster created with initdb in a temporary directory, only reachable
+# through its own socket directory and a free localhost port.
+@contextmanager
+def temporary_cluster() -> Iterator[str]:
+    initdb, pg_ctl = find_binary("initdb"), find_binary("pg_ctl")
+    if initdb is None or pg_ctl is None:
+        raise PostgresUnavailable("initdb/pg_ctl not found, set PG_BIN")
+    with tempfile.TemporaryDirectory(prefix="m2rss-bench-") as directory:
+        data = Path(directory) / "data"
+        subprocess.run(
+            [initdb, "-D", str(data), "-U", "bench", "-A", "trust", "--no-sync"],
+            check=True,
+            capture_output=True,
+        )
+        port = free_port()
+        options = (
+            f"-p {port} -k {directory} -c listen_addresses=127.0.0.1 "
+            "-c fsync=off -c synchronous_commit=off -c full_page_writes=off"
+        )
+        subprocess.run(
+            [pg_ctl, "-D", str(data), "-o", options, "-l", str(data / "log"), "-w"]
+            + ["start"],
+            check=True,
+            capture_output=True,
+        )
+        try:
+            yield f"postgresql://bench@127.0.0.1:{port}/postgres"
+        finally:
+            subprocess.run(
+                [pg_ctl, "-D", str(data), "-m", "immediate", "stop"],
+                check=False,
+                capture_output=True,
+            )
+
+
+# A fresh database on the server of `admin_url`, dropped on exit.
+@contextmanager
+def temporary_database(admin_url: str) -> Iterator[str]:
+    name = f"m2rss_bench_{time.time_ns()}"
+    with Connection.connect(admin_url, autocommit=True) as conn:
+        conn.execute(sql.SQL("CREATE DATABASE {}").format(sql.Identifier(name)))
+    try:
+        yield conninfo.make_conninfo(admin_url, dbname=name)
+    finally:
+        with Connection.connect(admin_url, autocommit=True) as conn:
+            conn.execute(
+                sql.SQL("DROP DATABASE IF EXISTS {} WITH (FORCE)").format(
+                    sql.Identifier(name)
+                )
+            )
+
+
+# Throwaway database for the benchmarks: a new database on `admin_url` when it
+# is given, a temporary cluster otherwise.
+@contextmanager
+def throwaway_database(admin_url: str | None = None) -> Iterator[str]:
+    if admin_url is not None:
+        with temporary_database(admin_url) as database_url:
+            yield database_url
+        return
+    with temporary_cluster() as cluster_url:
+        with temporary_database(cluster_url) as database_url:
+            yield database_url
+
+
+__all__ = ["PostgresUnavailable", "throwaway_database"]
@@ -0,0 +1,92 @@
+import argparse
+import asyncio
+import time
+import tracemalloc
+from collections.abc import Awaitable, Callable, Sized
+from datetime import UTC, datetime, timedelta
+from functools import partial
+
+from psycopg_pool import AsyncConnectionPool
+
+from m2rss.data.emails import Email, get_emails, get_feed_rows, save_emails
+from m2rss.db_migrations import execute_migrations
+from m2rss.fragments import RENDERER_VERSION, render_fragments
+
+
+def make_emails(count: int, run: str) -> list[Email]:
+    start = datetime(2024, 1, 1, tzinfo=UTC)
+    return [
+        render_fragments(
+            Email(
+                date=start + timedelta(minutes=k),
+                from_full=f"Sender <{run}@example.com>",
+                from_name="Sender",
+                from_addr=f"{run}@example.com",
+                subject=f"Message {k}",
+                body=f"Body of message {k}\n" * 50,
+                formatted_body=f"<p>Body of message {k}</p>" * 50,
+                message_id=f"<{run}.{k}@bench.example.com>",
+            )
+        )
+        for k in range(count)
+    ]
+
+
+async def measure(
+    name: str, query: Callable[[], Awaitable[Sized | None]], repeat: int
+) -> None:
+    await query()
+    start = time.perf_counter()
+    for _ in range(repeat):
+        await query()
+    latency = (time.perf_counter() - start) / repeat * 1000
+    tracemalloc.start()
+    rows = await query()
+    size, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(
+        f"{name:<20} {latency:7.2f} ms, {peak / 1024:8.1f} KiB peak, "
+        f"{size / 1024:8.1f} KiB kept for {len(rows or ())} rows"
+    )
+
+
+async def run(database_url: str, count: int, repeat: int):
+    async with AsyncConnectionPool(database_url, open=False) as pool:
+        async with pool.connection() as conn:
+            await execute_migrations(conn)
+        run_id = f"read{time.time_ns()}"
+        await save_emails(pool, make_emails(count, run_id))
+        addr = f"{run_id}@example.com"
+
+        await measure(
+            "get_emails",
+            lambda: get_emails(pool, "from_addr", addr, limit=count),
+            repeat,
+        )
+        for kind in ("rss", "html", "text"):
+            await measure(
+                f"get_feed_rows {kind}",
+                partial(
+                    get_feed_rows,
+                    pool,
+                    "from_addr",
+                    addr,
+                    kind,
+                    RENDERER_VERSION,
+                    limit=count,
+                ),
+                repeat,
+            )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Feed page read path cost")
+    parser.add_argument("database_url", help="throwaway database, it gets written")
+    parser.add_argument("--count", type=int, default=200)
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+    asyncio.run(run(args.database_url, args.count, args.repeat))
+
+
+if __name__ == "__main__":
+    main()
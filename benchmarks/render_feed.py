@@ -0,0 +1,134 @@
+import argparse
+import re
+import timeit
+from collections.abc import Sequence
+from datetime import UTC, datetime, timedelta
+
+from jinja2 import DictLoader, Environment, select_autoescape
+from lxml import etree
+
+from m2rss.rss import RSS_SERIALIZER, RssChannel, RSSItem
+
+BR_PATTERN = re.compile(r"\s*<br/>\s*")
+
+# feed.xml as rendered by make_rss before the serializers replaced it.
+LEGACY_TEMPLATE = """<?xml version="1.0" encoding="UTF-8" ?>
+<rss version="2.0" xmlns:atom="http://www.w3.org/2005/Atom">
+<channel>
+    <atom:link href="{{self_link}}" rel="self" type="application/rss+xml" />
+    {% if next_link is not none %}
+    <atom:link href="{{next_link}}" rel="next" type="application/rss+xml" />
+    {% endif %}
+    {% for key, val in channel.items() %}
+    <{{key}}>{{val}}</{{key}}>
+    {% endfor %}
+
+    {% for item in items %}
+    <item>
+        <title>{{item.title}}</title>
+        <description>
+            <![CDATA[
+                {% for line in item.description.splitlines() %}
+                {{line}}<br/>
+                {% endfor %}
+            ]]>
+        </description>
+        {% if item.link is not none %}
+        <link>{{item.link}}</link>
+        {% endif %}
+        <guid isPermaLink="true">{{item.guid}}</guid>
+        <pubDate>{{item.pub_date}}</pubDate>
+        {% if item.author is not none %}
+        <author>{{item.author}}</author>
+        {% endif %}
+    </item>
+    {% endfor %}
+</channel>
+</rss>
+"""
+
+
+def legacy_make_rss(
+    self_link: str,
+    channel: RssChannel,
+    items: Sequence[RSSItem],
+    next_link: str | None = None,
+) -> str:
+    env = Environment(
+        loader=DictLoader({"feed.xml": LEGACY_TEMPLATE}),
+        autoescape=select_autoescape(),
+    )
+    template = env.get_template("feed.xml")
+    return template.render(
+        self_link=self_link,
+        next_link=next_link,
+        channel=channel.model_dump(exclude_none=True),
+        items=items,
+    )
+
+
+def make_items(count: int) -> list[RSSItem]:
+    start = datetime(2024, 1, 1, tzinfo=UTC)
+    return [
+        RSSItem(
+            title=f"Re: [list] Question <{k}> & answer",
+            description=f"Hello,\n\nLine with <tags> & entities {k}\n" * 20,
+            link=f"https://m2rss.example.com/page/list/{k}.html",
+            guid=f"https://m2rss.example.com/page/list/{k}.html",
+            pub_date=(start + timedelta(hours=k)).strftime("%a, %d %b %Y %H:%M:%S %z"),
+            author=f"Sender {k} <sender{k}@example.com>",
+        )
+        for k in range(count)
+    ]
+
+
+# Element texts with the template's indentation whitespace removed.
+def normalized(document: str) -> list[tuple[str, str]]:
+    root = etree.fromstring(document.encode())
+    return [
+        (element.tag, BR_PATTERN.sub("<br/>", (element.text or "").strip()))
+        for element in root.iter()
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="RSS rendering microbenchmark")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    channel = RssChannel(
+        title="list@example.com",
+        description="list@example.com mailing list",
+        link="https://m2rss.example.com/page/list.html",
+    )
+    self_link = "https://m2rss.example.com/rss/list.xml"
+    for count in (20, 200, 2000):
+        items = make_items(count)
+        legacy = legacy_make_rss(self_link, channel, items)
+        current = RSS_SERIALIZER.render(self_link, channel, items)
+        assert normalized(legacy) == normalized(current), "output differs"
+
+        number = max(1, 2000 // count)
+        legacy_time = min(
+            timeit.repeat(
+                lambda: legacy_make_rss(self_link, channel, items),  # noqa: B023
+                number=number,
+                repeat=args.repeat,
+            )
+        )
+        current_time = min(
+            timeit.repeat(
+                lambda: RSS_SERIALIZER.render(self_link, channel, items),  # noqa: B023
+                number=number,
+                repeat=args.repeat,
+            )
+        )
+        print(
+            f"{count:>5} items: make_rss {legacy_time / number * 1000:.2f} ms, "
+            f"serializer {current_time / number * 1000:.2f} ms "
+            f"({legacy_time / current_time:.1f}x)"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+import argparse
+import email
+import timeit
+from email.message import Message
+from pathlib import Path
+
+from bs4 import BeautifulSoup
+from html_sanitizer import Sanitizer
+
+from m2rss.parsing import format_html, format_plain
+
+CORPUS_DIR = Path(__file__).resolve().parent / "corpus"
+
+
+# format_plain and the HTML branch of email_from_data before the rewrite.
+def legacy_format_plain(text: str) -> str:
+    lines = text.splitlines()
+    final_text = ""
+    for line in lines:
+        if line == "":
+            final_text += "</p><p>"
+        elif final_text == "":
+            final_text += line
+        else:
+            final_text += "<br>" + line
+    return "<p>" + final_text + "</p>"
+
+
+def legacy_format_html(html_sanitizer: Sanitizer, html: str) -> str | None:
+    html_body = BeautifulSoup(html_sanitizer.sanitize(html), "lxml").body
+    if html_body is None:
+        return None
+    return "".join([str(item) for item in html_body.contents])
+
+
+# The legacy join wrote top level text nodes unescaped, parity is checked
+# against the same parse serialized with escaping.
+def reference_format_html(html_sanitizer: Sanitizer, html: str) -> str | None:
+    html_body = BeautifulSoup(html_sanitizer.sanitize(html), "lxml").body
+    return None if html_body is None else html_body.decode_contents()
+
+
+def text_parts(path: Path) -> list[tuple[str, str]]:
+    msg: Message = email.message_from_bytes(path.read_bytes())
+    parts: list[tuple[str, str]] = []
+    for part in msg.walk():
+        payload = part.get_payload(decode=True)
+        charset = part.get_content_charset()
+        if part.get_content_maintype() == "text" and isinstance(payload, bytes):
+            parts.append((part.get_content_subtype(), payload.decode(charset or "")))
+    return parts
+
+
+def compare(name: str, legacy, new, number: int) -> float:
+    legacy_time = min(timeit.repeat(legacy, number=number, repeat=3)) / number
+    new_time = min(timeit.repeat(new, number=number, repeat=3)) / number
+    print(
+        f"{name:<38} legacy {legacy_time * 1000:8.2f} ms, "
+        f"new {new_time * 1000:8.2f} ms ({legacy_time / new_time:.1f}x)"
+    )
+    return legacy_time / new_time
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Body sanitization parity and speed")
+    parser.add_argument("--number", type=int, default=5)
+    parser.add_argument(
+        "--scale", type=int, default=20, help="copies of the digest to format"
+    )
+    args = parser.parse_args()
+
+    sanitizer = Sanitizer()
+    mismatches = 0
+    for path in sorted(CORPUS_DIR.glob("*.eml")):
+        for subtype, body in text_parts(path):
+            name = f"{path.stem} ({subtype})"
+            if subtype == "plain":
+                if format_plain(body) != legacy_format_plain(body):
+                    mismatches += 1
+                    print(f"{name}: format_plain output differs")
+                compare(
+                    name,
+                    lambda: sanitizer.sanitize(legacy_format_plain(body)),
+                    lambda: sanitizer.sanitize(format_plain(body)),
+                    args.number,
+                )
+            elif subtype == "html":
+                if format_html(sanitizer, body) != reference_format_html(
+                    sanitizer, body
+                ):
+                    mismatches += 1
+                    print(f"{name}: format_html output differs")
+                compare(
+                    name,
+                    lambda: legacy_format_html(sanitizer, body),
+                    lambda: format_html(sanitizer, body),
+                    args.number,
+                )
+
+    # The quadratic concatenation only shows on long bodies.
+    digest = text_parts(CORPUS_DIR / "mailman-digest.eml")[0][1] * args.scale
+    compare(
+        f"format_plain, digest x{args.scale}",
+        lambda: legacy_format_plain(digest),
+        lambda: format_plain(digest),
+        args.number,
+    )
+    print("parity: ok" if mismatches == 0 else f"parity: {mismatches} mismatches")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+import argparse
+import asyncio
+import time
+from datetime import UTC, datetime, timedelta
+from itertools import batched
+
+from psycopg_pool import AsyncConnectionPool
+
+from m2rss.data.emails import Email, save_email, save_emails
+from m2rss.db_migrations import execute_migrations
+
+
+def make_emails(count: int, run: str) -> list[Email]:
+    start = datetime(2024, 1, 1, tzinfo=UTC)
+    return [
+        Email(
+            date=start + timedelta(minutes=k),
+            from_full=f"Sender {k % 7} <list{k % 7}@example.com>",
+            from_name=f"Sender {k % 7}",
+            from_addr=f"list{k % 7}@example.com",
+            subject=f"Message {k}",
+            body=f"Body of message {k}\n" * 50,
+            formatted_body=f"<p>Body of message {k}</p>" * 50,
+            message_id=f"<{run}.{k}@bench.example.com>",
+        )
+        for k in range(count)
+    ]
+
+
+async def run(database_url: str, count: int, batch_size: int):
+    async with AsyncConnectionPool(database_url, open=False) as pool:
+        async with pool.connection() as conn:
+            await execute_migrations(conn)
+        run_id = f"{time.time_ns()}"
+
+        emails = make_emails(count, f"single-{run_id}")
+        start = time.perf_counter()
+        for mail in emails:
+            await save_email(pool, mail)
+        single = time.perf_counter() - start
+        print(f"save_email:  {count / single:.1f} emails/s")
+
+        emails = make_emails(count, f"batch-{run_id}")
+        start = time.perf_counter()
+        inserted = 0
+        for batch in batched(emails, batch_size):
+            inserted += await save_emails(pool, list(batch))
+        bulk = time.perf_counter() - start
+        print(f"save_emails: {count / bulk:.1f} emails/s ({inserted} inserted)")
+
+        start = time.perf_counter()
+        inserted = 0
+        for batch in batched(emails, batch_size):
+            inserted += await save_emails(pool, list(batch))
+        retry = time.perf_counter() - start
+        print(f"retry:       {count / retry:.1f} emails/s ({inserted} inserted)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Email insert throughput")
+    parser.add_argument("database_url", help="throwaway database, it gets written")
+    parser.add_argument("--count", type=int, default=10_000)
+    parser.add_argument("--batch-size", type=int, default=500)
+    args = parser.parse_args()
+    asyncio.run(run(args.database_url, args.count, args.batch_size))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,388 @@
+import argparse
+import asyncio
+import multiprocessing
+import os
+import platform
+import signal
+import statistics
+import subprocess
+import sys
+import time
+from collections.abc import Awaitable, Callable
+from datetime import UTC, datetime, timedelta
+from functools import partial
+from multiprocessing.synchronize import Event
+from pathlib import Path
+
+import aiohttp
+from psycopg import AsyncConnection
+from pydantic import BaseModel
+
+from benchmarks.generate_corpus import CorpusProfile, generate, list_addr
+from benchmarks.imap_server import ImapStandIn
+from benchmarks.postgres import PostgresUnavailable, free_port, throwaway_database
+from m2rss.cli.server import run_migrations, serve_app
+from m2rss.config import Config
+from m2rss.constants import PROJECT_DIR
+from m2rss.data.emails import Email, get_emails, get_feed_rows, save_emails
+from m2rss.data.pool import make_pool
+from m2rss.fragments import RENDERER_VERSION, render_fragments
+from m2rss.imap import ImapClient, MailboxSync
+from m2rss.ingest import IngestPipeline, ingest_workers, make_executor
+from m2rss.parsing import email_from_data, get_sanitizer
+from m2rss.watch import make_watchers
+
+PAGE_SIZE = 20
+PARSE_PASSES = 3
+READ_LIST = "reader-bench@lists.example.org"
+
+PARSE_PROFILES = {
+    "plain": CorpusProfile(messages=200, html_ratio=0.0, digest_ratio=0.0),
+    "html": CorpusProfile(messages=200, html_ratio=1.0, digest_ratio=0.0),
+    "digest": CorpusProfile(messages=50, html_ratio=0.0, digest_ratio=1.0),
+    "mixed": CorpusProfile(messages=200),
+}
+
+
+class Result(BaseModel):
+    value: float
+    unit: str
+    higher_is_better: bool
+
+
+class Report(BaseModel):
+    meta: dict[str, str | int | None]
+    results: dict[str, Result] = {}
+    skipped: list[str] = []
+
+    def add(self, name: str, value: float, unit: str, higher_is_better: bool):
+        self.results[name] = Result(
+            value=value, unit=unit, higher_is_better=higher_is_better
+        )
+        print(f"{name:<40} {value:12.3f} {unit}")
+
+
+def git_revision() -> str | None:
+    try:
+        revision = subprocess.run(
+            ["git", "describe", "--always", "--dirty"],
+            cwd=PROJECT_DIR,
+            check=True,
+            capture_output=True,
+            text=True,
+        )
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return revision.stdout.strip()
+
+
+def bench_config(database_url: str, **overrides) -> Config:
+    return Config.model_validate(
+        {
+            "email_addr": "reader@example.com",
+            "email_server": "127.0.0.1",
+            "email_pass": "pass",
+            "imap_port": 0,
+            "imap_starttls": False,
+            "fetch_mail_every": 600,
+            "database_url": database_url,
+            "service_url": "http://127.0.0.1",
+            "server_port": 0,
+            "admin_pass": "admin",
+            **overrides,
+        }
+    )
+
+
+def percentile(values: list[float], q: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+def bench_parse(report: Report):
+    sanitizer = get_sanitizer()
+    for name, profile in PARSE_PROFILES.items():
+        messages = generate(profile)
+        email_from_data(sanitizer, "reader@example.com", messages[0])
+        # Best of a few passes, single runs vary by 15% on small machines.
+        passes: list[float] = []
+        for _ in range(PARSE_PASSES):
+            start = time.process_time()
+            for data in messages:
+                email_from_data(sanitizer, "reader@example.com", data)
+            passes.append(time.process_time() - start)
+        report.add(
+            f"parse.{name}", min(passes) / len(messages) * 1000, "ms/email", False
+        )
+
+
+async def bench_ingest(report: Report, database_url: str | None, messages: int):
+    server = ImapStandIn()
+    port = await server.start()
+    for data in generate(CorpusProfile(messages=messages)):
+        server.add_message(data)
+    config = bench_config(database_url or "", imap_port=port)
+
+    with make_executor(config) as executor:
+        # Start the workers before timing.
+        list(executor.map(int, range(ingest_workers(config))))
+        start = time.perf_counter()
+        if database_url is None:
+            # Parsing only, stored emails are dropped.
+            async def store(emails: list[Email]):
+                pass
+
+            async def checkpoint(uid: int):
+                pass
+
+            async with ImapClient("127.0.0.1", port, starttls=False) as client:
+                await client.login(config.email_addr, config.email_pass)
+                sync = MailboxSync(client)
+                await sync.select()
+                pipeline = IngestPipeline(
+                    executor,
+                    ingest_workers(config),
+                    config.email_addr,
+                    config.imap_fetch_batch_size,
+                    config.ingest_queue_size,
+                    store,
+                    checkpoint,
+                )
+                await pipeline.run(sync, await sync.new_uids(0))
+            name = "ingest.memory"
+        else:
+            async with make_pool(config) as pool:
+                await make_watchers(config, pool, executor, None)[0].fetch()
+            name = "ingest.postgres"
+        seconds = time.perf_counter() - start
+    await server.stop()
+    report.add(name, messages / seconds, "emails/s", True)
+
+
+def read_emails(count: int) -> list[Email]:
+    start = datetime(2024, 1, 1, tzinfo=UTC)
+    return [
+        render_fragments(
+            Email(
+                date=start + timedelta(minutes=k),
+                from_full=f"Member {k % 13} <member{k % 13}@example.com>",
+                from_name=f"Member {k % 13}",
+                from_addr=f"member{k % 13}@example.com",
+                sender_addr=READ_LIST,
+                subject=f"Message {k}",
+                body=f"Body of message {k}\n" * 20,
+                formatted_body=f"<p>Body of message {k}</p>" * 20,
+                message_id=f"<read.{k}@bench.example.com>",
+            )
+        )
+        for k in range(count)
+    ]
+
+
+async def timed(query: Callable[[], Awaitable[object]], repeat: int) -> float:
+    await query()
+    latencies: list[float] = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        await query()
+        latencies.append(time.perf_counter() - start)
+    return statistics.median(latencies) * 1000
+
+
+# get_emails pages with OFFSET, get_feed_rows with the keyset cursor of the
+# next links, both are measured at the same depths.
+async def bench_read_path(report: Report, database_url: str, rows: int, repeat: int):
+    config = bench_config(database_url)
+    async with make_pool(config) as pool:
+        emails = read_emails(rows)
+        for k in range(0, rows, 1000):
+            await save_emails(pool, emails[k : k + 1000])
+        async with pool.connection() as conn:
+            await conn.execute("ANALYZE emails")
+        for page in (0, 10, 100, 500):
+            if page * PAGE_SIZE >= rows:
+                break
+            latency = await timed(
+                partial(get_emails, pool, "sender_addr", READ_LIST, page, PAGE_SIZE),
+                repeat,
+            )
+            report.add(f"get_emails.page_{page}", latency, "ms", False)
+
+            before = None
+            if page > 0:
+                async with pool.connection() as conn:
+                    cur = await conn.execute(
+                        "SELECT date, id FROM emails WHERE sender_addr = %s "
+                        "ORDER BY date DESC, id DESC OFFSET %s LIMIT 1",
+                        (READ_LIST, page * PAGE_SIZE - 1),
+                    )
+                    before = await cur.fetchone()
+            latency = await timed(
+                partial(
+                    get_feed_rows,
+                    pool,
+                    "sender_addr",
+                    READ_LIST,
+                    "rss",
+                    RENDERER_VERSION,
+                    limit=PAGE_SIZE,
+                    before=before,
+                ),
+                repeat,
+            )
+            report.add(f"get_feed_rows.keyset_page_{page}", latency, "ms", False)
+
+
+def serve(config_data: dict, ready: Event):
+    asyncio.run(serve_app(Config.model_validate(config_data), ready=ready))
+
+
+async def load(url: str, concurrency: int, duration: float) -> tuple[float, float]:
+    latencies: list[float] = []
+    errors = 0
+    connector = aiohttp.TCPConnector(limit=concurrency)
+    async with aiohttp.ClientSession(connector=connector) as session:
+        deadline = time.perf_counter() + duration
+
+        async def client():
+            nonlocal errors
+            while time.perf_counter() < deadline:
+                start = time.perf_counter()
+                async with session.get(url) as response:
+                    await response.read()
+                    if response.status != 200:
+                        errors += 1
+                        continue
+                latencies.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        await asyncio.gather(*[client() for _ in range(concurrency)])
+        elapsed = time.perf_counter() - start
+    if errors:
+        print(f"{url}: {errors} failed requests")
+    return len(latencies) / elapsed, percentile(latencies, 0.99) * 1000
+
+
+# The server runs in its own process, as with `m2rss serve`, and is loaded from
+# this one. "cold" disables the feed cache so every request renders the feed.
+async def bench_http(
+    report: Report, database_url: str, concurrency: list[int], duration: float
+):
+    async with await AsyncConnection.connect(database_url, autocommit=True) as conn:
+        await conn.execute(
+            "INSERT INTO aliases (alias, link_key, link_val) VALUES (%s, %s, %s)",
+            ("bench", "sender_addr", list_addr(0)),
+        )
+    context = multiprocessing.get_context("spawn")
+    for scenario, overrides in (
+        ("hot", {}),
+        ("cold", {"feed_cache_max_entries": 0}),
+    ):
+        port = free_port()
+        config = bench_config(database_url, server_port=port, **overrides)
+        ready = context.Event()
+        process = context.Process(target=serve, args=(config.model_dump(), ready))
+        process.start()
+        try:
+            if not await asyncio.to_thread(ready.wait, 30):
+                raise RuntimeError("benchmark server did not start")
+            url = f"http://127.0.0.1:{port}/rss/bench.xml"
+            await load(url, 1, 1.0)
+            for clients in concurrency:
+                rps, p99 = await load(url, clients, duration)
+                report.add(f"http.rss.{scenario}.c{clients}.rps", rps, "req/s", True)
+                report.add(f"http.rss.{scenario}.c{clients}.p99", p99, "ms", False)
+        finally:
+            if process.pid is not None:
+                os.kill(process.pid, signal.SIGTERM)
+            process.join(30)
+
+
+async def run_database_benchmarks(report: Report, database_url: str, args):
+    await run_migrations(bench_config(database_url))
+    await bench_ingest(report, database_url, args.messages)
+    await bench_read_path(report, database_url, args.rows, args.repeat)
+    await bench_http(report, database_url, args.concurrency, args.duration)
+
+
+def run(args):
+    report = Report(
+        meta={
+            "revision": git_revision(),
+            "date": datetime.now(UTC).isoformat(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+        }
+    )
+    bench_parse(report)
+    try:
+        with throwaway_database(args.database_url) as database_url:
+            asyncio.run(run_database_benchmarks(report, database_url, args))
+    except PostgresUnavailable as e:
+        print(f"Skipping the database benchmarks: {e}")
+        report.skipped += ["ingest.postgres", "get_emails", "http"]
+        asyncio.run(bench_ingest(report, None, args.messages))
+
+    args.output.write_text(report.model_dump_json(indent=2))
+    print(f"Results written to {args.output}")
+
+
+# Exits with 1 when a result got worse than `threshold` (relative).
+def compare(args):
+    base = Report.model_validate_json(args.base.read_text())
+    new = Report.model_validate_json(args.new.read_text())
+    print(f"{base.meta.get('revision')} -> {new.meta.get('revision')}")
+    regressions = 0
+    for name, result in new.results.items():
+        previous = base.results.get(name)
+        if previous is None or previous.value == 0:
+            print(f"{name:<40} {result.value:12.3f} {result.unit} (new)")
+            continue
+        change = result.value / previous.value - 1
+        worse = -change if result.higher_is_better else change
+        flag = ""
+        if worse > args.threshold:
+            flag = "  REGRESSION"
+            regressions += 1
+        print(
+            f"{name:<40} {previous.value:12.3f} -> {result.value:12.3f} "
+            f"{result.unit} ({change:+.1%}){flag}"
+        )
+    sys.exit(1 if regressions else 0)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="m2rss benchmark suite")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = commands.add_parser("run", help="run the benchmarks")
+    run_parser.add_argument(
+        "--database-url",
+        help="server to create a throwaway database on, "
+        "a temporary cluster is started with initdb otherwise",
+    )
+    run_parser.add_argument("--output", type=Path, default=Path("bench.json"))
+    run_parser.add_argument("--messages", type=int, default=1000)
+    run_parser.add_argument("--rows", type=int, default=20_000)
+    run_parser.add_argument("--repeat", type=int, default=50)
+    run_parser.add_argument(
+        "--concurrency",
+        type=lambda value: [int(level) for level in value.split(",")],
+        default=[1, 8, 32],
+    )
+    run_parser.add_argument("--duration", type=float, default=5.0)
+    run_parser.set_defaults(func=run)
+
+    compare_parser = commands.add_parser("compare", help="compare two results")
+    compare_parser.add_argument("base", type=Path)
+    compare_parser.add_argument("new", type=Path)
+    compare_parser.add_argument("--threshold", type=float, default=0.1)
+    compare_parser.set_defaults(func=compare)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
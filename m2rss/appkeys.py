@@ -1,10 +1,32 @@
 from aiohttp.web import AppKey
-from psycopg import AsyncConnection
+from psycopg_pool import AsyncConnectionPool
 
 from m2rss.config import Config
+from m2rss.data.aliases import AliasCache
+from m2rss.data.groups import GroupCache
+from m2rss.feed_cache import FeedCache
+from m2rss.single_flight import SingleFlight
+from m2rss.watch import MailboxHealth
 
 config_key = AppKey("config", Config)
-pg_key = AppKey("pg", AsyncConnection)
+pg_pool_key = AppKey("pg_pool", AsyncConnectionPool)
+alias_cache_key = AppKey("alias_cache", AliasCache)
+group_cache_key = AppKey("group_cache", GroupCache)
+feed_cache_key = AppKey("feed_cache", FeedCache)
+# Search results, kept apart so that one-off queries do not evict feeds.
+search_cache_key = AppKey("search_cache", FeedCache)
+single_flight_key = AppKey("single_flight", SingleFlight)
+# Health of the watched folders, updated in place by `email watch`.
+mailbox_health_key = AppKey("mailbox_health", list[MailboxHealth])
 
 
-__all__ = ["config_key", "pg_key"]
+__all__ = [
+    "config_key",
+    "pg_pool_key",
+    "alias_cache_key",
+    "group_cache_key",
+    "feed_cache_key",
+    "search_cache_key",
+    "single_flight_key",
+    "mailbox_health_key",
+]
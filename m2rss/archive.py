@@ -0,0 +1,108 @@
+import asyncio
+import mmap
+import re
+from collections.abc import Iterable
+from pathlib import Path
+
+MAILDIR_SUBDIRS = ("cur", "new")
+# mboxrd writers quote body lines starting with "From " (or an already quoted
+# one) with ">", which is removed on read.
+FROM_QUOTE_PATTERN = re.compile(rb"^>(>*From )", re.MULTILINE)
+
+
+# Start offsets of the messages of a mbox, each after its "From " line. Only
+# the offsets are kept, messages are sliced from the mapping when fetched.
+def mbox_offsets(data: mmap.mmap) -> list[tuple[int, int]]:
+    starts: list[int] = []
+    position = 0 if data[:5] == b"From " else data.find(b"\nFrom ")
+    while position != -1:
+        if data[position : position + 1] == b"\n":
+            position += 1
+        starts.append(position)
+        position = data.find(b"\nFrom ", position)
+    offsets: list[tuple[int, int]] = []
+    for start, end in zip(starts, [*starts[1:], len(data)]):
+        body = data.find(b"\n", start, end)
+        if body != -1:
+            offsets.append((body + 1, end))
+    return offsets
+
+
+class MboxSource:
+    def __init__(self, path: Path):
+        self.path = path
+        self.file = open(path, "rb")
+        self.data: mmap.mmap | None = None
+        self.offsets: list[tuple[int, int]] = []
+        # Empty files cannot be mapped.
+        if path.stat().st_size > 0:
+            self.data = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+            self.offsets = mbox_offsets(self.data)
+
+    def __len__(self) -> int:
+        return len(self.offsets)
+
+    def message(self, index: int) -> bytes:
+        assert self.data is not None
+        start, end = self.offsets[index]
+        # The blank line mbox writers add before the next "From " line.
+        message = self.data[start:end].removesuffix(b"\n")
+        return FROM_QUOTE_PATTERN.sub(rb"\1", message)
+
+    def close(self):
+        if self.data is not None:
+            self.data.close()
+        self.file.close()
+
+
+class MaildirSource:
+    def __init__(self, path: Path):
+        self.path = path
+        # Maildir++ folders (".Sent/cur", ...) are imported along the inbox.
+        self.files = sorted(
+            file
+            for directory in path.rglob("*")
+            if directory.name in MAILDIR_SUBDIRS and directory.is_dir()
+            for file in directory.iterdir()
+            if file.is_file()
+        )
+
+    def __len__(self) -> int:
+        return len(self.files)
+
+    def message(self, index: int) -> bytes:
+        return self.files[index].read_bytes()
+
+    def close(self):
+        pass
+
+
+# Message source of the ingest pipeline over a mbox file or a Maildir tree,
+# the "UIDs" are the positions of the messages in the archive.
+class ArchiveSource:
+    def __init__(self, path: Path):
+        self.source = MaildirSource(path) if path.is_dir() else MboxSource(path)
+
+    def __len__(self) -> int:
+        return len(self.source)
+
+    def __enter__(self) -> "ArchiveSource":
+        return self
+
+    def __exit__(self, *exc_info):
+        self.source.close()
+
+    def uids(self) -> list[int]:
+        return list(range(len(self.source)))
+
+    def read(self, uids: Iterable[int]) -> list[tuple[int, bytes]]:
+        return [(uid, self.source.message(uid)) for uid in uids]
+
+    async def fetch(self, uids: Iterable[int]) -> list[tuple[int, bytes]]:
+        return await asyncio.to_thread(self.read, list(uids))
+
+    async def delete(self, uids: Iterable[int]):
+        pass
+
+
+__all__ = ["ArchiveSource", "MaildirSource", "MboxSource", "mbox_offsets"]
@@ -0,0 +1,130 @@
+import time
+from collections import deque
+from collections.abc import Callable
+from concurrent.futures import Executor, Future
+
+from psycopg import Connection, Cursor, sql
+from pydantic import BaseModel
+
+Transform = Callable[[list[tuple]], list[tuple]]
+
+
+class BackfillStats(BaseModel):
+    rows: int = 0
+    total: int = 0
+    last_id: int = 0
+    seconds: float = 0.0
+
+    @property
+    def rate(self) -> float:
+        return self.rows / self.seconds if self.seconds > 0 else 0.0
+
+
+def get_checkpoint(conn: Connection, name: str) -> int:
+    record = conn.execute(
+        "SELECT last_id FROM backfill_state WHERE name = %s", (name,)
+    ).fetchone()
+    return 0 if record is None else record[0]
+
+
+def save_checkpoint(cur: Cursor, name: str, last_id: int):
+    cur.execute(
+        "INSERT INTO backfill_state (name, last_id) VALUES (%s, %s) "
+        "ON CONFLICT (name) DO UPDATE SET last_id = EXCLUDED.last_id",
+        (name, last_id),
+    )
+
+
+def clear_checkpoint(conn: Connection, name: str):
+    conn.execute("DELETE FROM backfill_state WHERE name = %s", (name,))
+
+
+# Re-processes emails in id order. `query` selects the id first and filters on
+# `id > %s`, its rows are read through a server-side cursor and transformed in
+# the executor. Chunks are written back in order, each in a transaction that
+# also moves the checkpoint, so an interrupted run resumes after its last
+# commit. The checkpoint is dropped once the run completes.
+class Backfill:
+    def __init__(
+        self,
+        database_url: str,
+        name: str,
+        query: sql.SQL,
+        update: str,
+        transform: Transform,
+        executor: Executor,
+        workers: int,
+        chunk_size: int = 500,
+        params: tuple = (),
+    ):
+        self.database_url = database_url
+        self.name = name
+        self.query = query
+        self.update = update
+        self.transform = transform
+        self.executor = executor
+        self.workers = workers
+        self.chunk_size = chunk_size
+        self.params = params
+
+    def run(
+        self,
+        restart: bool = False,
+        progress: Callable[[BackfillStats], None] | None = None,
+    ) -> BackfillStats:
+        stats = BackfillStats()
+        start = time.perf_counter()
+        with (
+            Connection.connect(self.database_url) as reader,
+            Connection.connect(self.database_url, autocommit=True) as writer,
+        ):
+            if restart:
+                clear_checkpoint(writer, self.name)
+            stats.last_id = get_checkpoint(writer, self.name)
+            params = (stats.last_id, *self.params)
+            record = reader.execute(
+                sql.SQL("SELECT count(*) FROM ({}) AS backfill").format(self.query),
+                params,
+            ).fetchone()
+            stats.total = 0 if record is None else record[0]
+
+            # Keeps every worker busy while earlier chunks are being written.
+            pending: deque[tuple[int, Future[list[tuple]]]] = deque()
+            with reader.cursor(name=f"backfill_{self.name}") as cur:
+                cur.itersize = self.chunk_size
+                cur.execute(self.query, params)
+                while rows := cur.fetchmany(self.chunk_size):
+                    future = self.executor.submit(self.transform, rows)
+                    pending.append((rows[-1][0], future))
+                    if len(pending) > 2 * self.workers:
+                        self.write(writer, *pending.popleft(), stats, start, progress)
+                while pending:
+                    self.write(writer, *pending.popleft(), stats, start, progress)
+            clear_checkpoint(writer, self.name)
+        stats.seconds = time.perf_counter() - start
+        return stats
+
+    def write(
+        self,
+        conn: Connection,
+        last_id: int,
+        future: Future[list[tuple]],
+        stats: BackfillStats,
+        start: float,
+        progress: Callable[[BackfillStats], None] | None,
+    ):
+        updates = future.result()
+        with conn.transaction(), conn.cursor() as cur:
+            cur.executemany(self.update, updates)
+            save_checkpoint(cur, self.name, last_id)
+        stats.rows += len(updates)
+        stats.last_id = last_id
+        stats.seconds = time.perf_counter() - start
+        if progress is not None:
+            progress(stats)
+
+
+__all__ = [
+    "Backfill",
+    "BackfillStats",
+]
@@ -2,7 +2,9 @@ import click
 
 from .aliases import alias_group
 from .email import email_group
-from .server import serve_command
+from .export import export_command
+from .groups import group_group
+from .server import compress_static_command, serve_command
 
 
 @click.group()
@@ -11,5 +13,8 @@ def root():
 
 
 root.add_command(serve_command)
+root.add_command(compress_static_command)
 root.add_command(alias_group)
+root.add_command(group_group)
 root.add_command(email_group)
+root.add_command(export_command)
@@ -2,6 +2,7 @@ import click
 from psycopg import Connection
 
 from m2rss.config import load_config
+from m2rss.data.aliases import LINK_KEYS
 
 
 @click.group("aliases")
@@ -11,7 +12,7 @@ def alias_group():
 
 @alias_group.command("add")
 @click.argument("name", type=str)
-@click.argument("link_key", type=str)
+@click.argument("link_key", type=click.Choice(LINK_KEYS))
 @click.argument("link_val", type=str)
 def add_alias_command(name: str, link_key: str, link_val: str):
     config = load_config()
@@ -39,7 +40,7 @@ def list_alias_command():
 
 
 @alias_group.command("delete")
-@click.argument("name", type=str)
+@click.argument("alias", type=str)
 def delete_alias_command(alias: str):
     config = load_config()
     with Connection.connect(config.database_url) as conn:
@@ -1,16 +1,32 @@
 import asyncio
-import email
-from email.message import Message
-from email.utils import parsedate_to_datetime
-from imaplib import IMAP4
+import time
+from datetime import datetime
+from pathlib import Path
 
 import click
-from bs4 import BeautifulSoup
-from html_sanitizer import Sanitizer
-from psycopg import AsyncConnection, Connection
+from aiohttp import web
+from psycopg import Connection, sql
+from psycopg_pool import AsyncConnectionPool
 
+from m2rss.appkeys import mailbox_health_key, pg_pool_key
+from m2rss.archive import ArchiveSource
+from m2rss.backfill import Backfill, BackfillStats, Transform
 from m2rss.config import Config, load_config
-from m2rss.data.emails import Email, save_email
+from m2rss.data.emails import Email, save_emails
+from m2rss.data.pool import make_pool
+from m2rss.export import Exporter
+from m2rss.fragments import RENDERER_VERSION, render_rows
+from m2rss.handlers.metrics import handle_mailbox_health, handle_metrics
+from m2rss.ingest import IngestPipeline, ingest_workers, make_executor
+from m2rss.parsing import format_bodies
+from m2rss.retention import (
+    get_partitions,
+    is_expired,
+    partition_aliases,
+    prune_contents,
+    remove_partition,
+)
+from m2rss.watch import MailboxWatcher, make_watchers, watch_mailboxes
 
 
 @click.group("email")
@@ -24,118 +40,106 @@ def add_alias_command(email_id: int):
     config = load_config()
     with Connection.connect(config.database_url) as conn:
         with conn.cursor() as cur:
-            cur.execute("DELETE FROM emails WHERE id = %s", (email_id,))
+            # The date bound limits the delete to the partition of the email.
+            cur.execute("SELECT date FROM emails WHERE id = %s", (email_id,))
+            row = cur.fetchone()
+            if row is None:
+                return
+            cur.execute(
+                "DELETE FROM emails WHERE id = %s AND date = %s", (email_id, row[0])
+            )
             conn.commit()
 
 
-class UnknownCharsetException(Exception):
-    pass
+# Drops (or detaches) the monthly partitions of emails past their retention
+# horizon, a whole month at a time.
+@email_group.command("retention")
+@click.option("--detach", is_flag=True, help="Detach partitions instead of dropping.")
+@click.option(
+    "--archive-dir",
+    type=click.Path(file_okay=False, path_type=Path),
+    help="Save each partition to a compressed CSV file first.",
+)
+@click.option("--dry-run", is_flag=True, help="Only list the expired partitions.")
+@click.option(
+    "--prune-contents",
+    "prune",
+    is_flag=True,
+    help="Then delete the email bodies no longer referenced.",
+)
+def retention_command(
+    detach: bool, archive_dir: Path | None, dry_run: bool, prune: bool
+):
+    config = load_config()
+    now = datetime.now()
+    with Connection.connect(config.database_url, autocommit=True) as conn:
+        aliases = {
+            alias: (link_key, link_val)
+            for alias, link_key, link_val in conn.execute(
+                "SELECT alias, link_key, link_val FROM aliases ORDER BY id"
+            )
+        }
+        for partition in get_partitions(conn):
+            present = partition_aliases(conn, partition, aliases)
+            if not is_expired(
+                partition,
+                present,
+                config.retention_days,
+                config.alias_retention_days,
+                now,
+            ):
+                continue
+            if dry_run:
+                print(f"Would remove {partition.name} ({', '.join(present)})")
+                continue
+            archive = remove_partition(
+                conn, partition, aliases, present, detach, archive_dir
+            )
+            action = "Detached" if detach else "Dropped"
+            print(
+                f"{action} {partition.name}"
+                + (f", archived to {archive}" if archive is not None else "")
+            )
+        if prune and not dry_run:
+            print(f"Deleted {prune_contents(conn)} unreferenced bodies")
 
 
-def format_plain(text: str) -> str:
-    lines = text.splitlines()
-    final_text = ""
-    for line in lines:
-        if line == "":
-            final_text += "</p><p>"
-        elif final_text == "":
-            final_text += line
-        else:
-            final_text += "<br>" + line
-    return "<p>" + final_text + "</p>"
-
-
-def email_from_data(html_sanitizer: Sanitizer, email_addr: str, data: bytes) -> Email:
-    msg: Message = email.message_from_bytes(data)
-    params = {}
-    for key, val in msg.items():
-        match key:
-            case "Date":
-                params["date"] = parsedate_to_datetime(val)
-            case "User-Agent":
-                params["user_agent"] = val
-            case "Content-Language":
-                params["content_language"] = val
-            case "To":
-                params["recipient"] = val
-            case "From":
-                author, _, addr = val.rpartition("<")
-                params["from_full"] = val
-                params["from_name"] = author.strip()
-                params["from_addr"] = addr.replace(">", "")
-            case "Sender":
-                author, _, addr = val.rpartition("<")
-                params["sender_full"] = val
-                params["sender_name"] = author.strip()
-                params["sender_addr"] = addr.replace(">", "")
-            case "Delivered-To":
-                params["delivered_to"] = val
-            case "Subject":
-                params["subject"] = val
-    for part in msg.walk():
-        maintype = part.get_content_maintype()
-        subtype = part.get_content_subtype()
-        if maintype != "text":
-            continue
-        payload = part.get_payload(decode=True)
-        charset = part.get_content_charset()
-        if charset is None:
-            raise UnknownCharsetException(
-                f"Charset is not given in email {params["subject"]}"
-            )
-        if isinstance(payload, bytes):
-            body = payload.decode(charset)
-        elif isinstance(payload, str):
-            body = payload
-        else:
-            raise UnknownCharsetException(f"Type of payload is {type(payload)}")
-        body = body.replace(email_addr, "redacted")
-        if subtype == "plain":
-            params["body"] = body
-        elif subtype == "html":
-            html_body = BeautifulSoup(html_sanitizer.sanitize(body), "lxml").body
-            if html_body is not None:
-                params["formatted_body"] = "".join(
-                    [str(item) for item in html_body.contents]
-                )
-
-    if "formatted_body" not in params:
-        params["formatted_body"] = html_sanitizer.sanitize(format_plain(params["body"]))
-    return Email.model_validate(params)
-
-
-async def fetch_mails(config: Config, conn: AsyncConnection, html_sanitizer: Sanitizer):
-    with IMAP4(config.email_server, config.imap_port) as imap_client:
-        imap_client.starttls()
-        imap_client.login(config.email_addr, config.email_pass)
-        imap_client.select()
-        _, data = imap_client.search(None, "ALL")
-        for num in data[0].split():
-            try:
-                _, fdata = imap_client.fetch(num, "(RFC822)")
-                if fdata[0] is None or not isinstance(fdata[0], tuple):
-                    continue
-                msg = email_from_data(html_sanitizer, config.email_addr, fdata[0][1])
-                print(f"Received new email from {msg.sender_addr}")
-                await save_email(conn, msg)
-                imap_client.store(num, "+FLAGS", "\\Deleted")
-            except Exception as e:
-                print("An error occured. Skipping email.", str(e))
-        imap_client.expunge()
+# The watch process has its own metrics and the health of its folders, served
+# on a separate port.
+async def serve_metrics(
+    config: Config, pool: AsyncConnectionPool, watchers: list[MailboxWatcher]
+) -> web.AppRunner:
+    app = web.Application()
+    if config.metrics_enabled:
+        app.router.add_get("/metrics", handle_metrics)
+    app.router.add_get("/health", handle_mailbox_health)
+    app[pg_pool_key] = pool
+    app[mailbox_health_key] = [watcher.health for watcher in watchers]
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, port=config.watch_metrics_port).start()
+    return runner
 
 
 async def fetch_mail_task():
     config = load_config()
-    html_sanitizer = Sanitizer()
-    async with await AsyncConnection.connect(config.database_url) as conn:
-        while True:
+    with make_executor(config) as executor:
+        async with make_pool(config) as pool:
+            # Keeps a static export up to date with the new emails.
+            exporter = None
+            if config.export_dir is not None:
+                exporter = Exporter(pool, config.service_url, Path(config.export_dir))
+            watchers = make_watchers(config, pool, executor, exporter)
+            if not watchers:
+                raise click.ClickException("No mailbox configured")
+            runner = None
+            if config.watch_metrics_port is not None:
+                runner = await serve_metrics(config, pool, watchers)
             try:
-                await fetch_mails(config, conn, html_sanitizer)
-            except Exception as e:
-                print(
-                    f"An error occured. Retrying in {config.fetch_mail_every}.", str(e)
-                )
-            await asyncio.sleep(config.fetch_mail_every)
+                await watch_mailboxes(watchers)
+            finally:
+                if runner is not None:
+                    await runner.cleanup()
 
 
 @email_group.command("watch")
@@ -143,18 +147,129 @@ def watch_mail_command():
     asyncio.run(fetch_mail_task())
 
 
-@email_group.command("format-body")
-def format_body_command():
+async def import_archive(path: Path, batch_size: int):
     config = load_config()
-    with Connection.connect(config.database_url) as conn:
-        formatted_bodies: list[tuple[str, int]] = []
-        sanitizer = Sanitizer()
-        with conn.cursor() as cur:
-            cur.execute("SELECT id, body FROM emails")
-            for record in cur:
-                formatted_bodies.append(
-                    (sanitizer.sanitize(format_plain(record[1])), record[0])
-                )
-            cur.executemany(
-                "UPDATE emails SET formatted_body = %s WHERE id = %s", formatted_bodies
+    with ArchiveSource(path) as source, make_executor(config) as executor:
+        total = len(source)
+        print(f"Importing {total} emails from {path}")
+        async with make_pool(config) as pool:
+            start = time.perf_counter()
+            imported = 0
+
+            async def store(emails: list[Email]):
+                nonlocal imported
+                imported += await save_emails(pool, emails)
+
+            async def checkpoint(uid: int):
+                # Batches are stored in order, every email up to `uid` is done.
+                rate = (uid + 1) / (time.perf_counter() - start)
+                print(f"{uid + 1}/{total} emails, {imported} new, {rate:.1f} emails/s")
+
+            pipeline = IngestPipeline(
+                executor,
+                ingest_workers(config),
+                config.email_addr,
+                batch_size,
+                config.ingest_queue_size,
+                store,
+                checkpoint,
             )
+            stats = await pipeline.run(source, source.uids())
+    print(
+        f"Imported {imported} new emails, {stats.messages - imported} already "
+        f"stored and {stats.failed} skipped in {stats.seconds:.2f}s, "
+        f"{stats.rate:.1f} emails/s"
+    )
+
+
+# Backfills an archive: a mbox file or a Maildir tree. Emails already stored
+# (same Message-ID) are skipped, so an interrupted import can be run again.
+# Mbox files are read as mboxrd: ">From " lines are unquoted, so a body line
+# that really started with ">From " in a mboxo file loses its ">".
+@email_group.command("import")
+@click.argument("path", type=click.Path(exists=True, path_type=Path))
+@click.option(
+    "--batch-size",
+    default=2000,
+    show_default=True,
+    help="Emails parsed and stored per transaction.",
+)
+def import_command(path: Path, batch_size: int):
+    asyncio.run(import_archive(path, batch_size))
+
+
+def print_progress(stats: BackfillStats):
+    print(
+        f"{stats.rows}/{stats.total} emails, {stats.rate:.1f} emails/s, "
+        f"last id {stats.last_id}"
+    )
+
+
+# Updates are bounded by date as well as id so that each only touches the
+# partition of its email.
+def run_backfill(
+    name: str,
+    query: str,
+    update: str,
+    transform: Transform,
+    chunk_size: int,
+    restart: bool,
+    params: tuple = (),
+):
+    config = load_config()
+    with make_executor(config) as executor:
+        backfill = Backfill(
+            config.database_url,
+            name,
+            sql.SQL(query),
+            update,
+            transform,
+            executor,
+            ingest_workers(config),
+            chunk_size,
+            params,
+        )
+        stats = backfill.run(restart, print_progress)
+    print(
+        f"Processed {stats.rows} emails in {stats.seconds:.2f}s, "
+        f"{stats.rate:.1f} emails/s"
+    )
+
+
+@email_group.command("format-body")
+@click.option("--chunk-size", default=500, show_default=True)
+@click.option("--restart", is_flag=True, help="Ignore an interrupted run.")
+def format_body_command(chunk_size: int, restart: bool):
+    run_backfill(
+        "format-body",
+        "SELECT id, subject, from_full, date, excerpt, c.codec, c.data FROM emails "
+        "LEFT JOIN email_contents c ON c.hash = emails.body_hash "
+        "WHERE id > %s ORDER BY id",
+        "WITH content AS (INSERT INTO email_contents (hash, codec, data) "
+        "VALUES (%s, %s, %s) ON CONFLICT (hash) DO NOTHING) "
+        "UPDATE emails SET formatted_body_hash = %s, rss_fragment = %s, "
+        "html_fragment = %s, fragment_version = %s WHERE id = %s AND date = %s",
+        format_bodies,
+        chunk_size,
+        restart,
+    )
+
+
+@email_group.command("render-fragments")
+@click.option("--all", "render_all", is_flag=True, help="Also re-render fresh rows.")
+@click.option("--chunk-size", default=500, show_default=True)
+@click.option("--restart", is_flag=True, help="Ignore an interrupted run.")
+def render_fragments_command(render_all: bool, chunk_size: int, restart: bool):
+    run_backfill(
+        "render-fragments",
+        "SELECT id, subject, from_full, date, excerpt, c.codec, c.data FROM emails "
+        "LEFT JOIN email_contents c ON c.hash = emails.body_hash "
+        "WHERE id > %s AND (%s OR fragment_version IS DISTINCT FROM %s) "
+        "ORDER BY id",
+        "UPDATE emails SET rss_fragment = %s, html_fragment = %s, "
+        "fragment_version = %s WHERE id = %s AND date = %s",
+        render_rows,
+        chunk_size,
+        restart,
+        (render_all, RENDERER_VERSION),
+    )
@@ -0,0 +1,25 @@
+import asyncio
+from pathlib import Path
+
+import click
+
+from m2rss.config import load_config
+from m2rss.data.pool import make_pool
+from m2rss.export import Exporter
+
+
+async def export_task(directory: Path, full: bool):
+    config = load_config()
+    async with make_pool(config) as pool:
+        exporter = Exporter(pool, config.service_url, directory)
+        await exporter.export_all(full)
+    print(f"Wrote {exporter.written} files to {directory}")
+
+
+# Renders the feeds, pages and items of every alias to static files, only the
+# new emails since the last export unless --full is given.
+@click.command("export")
+@click.argument("outdir", type=click.Path(file_okay=False, path_type=Path))
+@click.option("--full", is_flag=True, help="Re-export every email.")
+def export_command(outdir: Path, full: bool):
+    asyncio.run(export_task(outdir, full))
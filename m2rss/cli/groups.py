@@ -0,0 +1,67 @@
+import click
+from psycopg import Connection
+
+from m2rss.config import load_config
+
+
+@click.group("groups")
+def group_group():
+    pass
+
+
+@group_group.command("add")
+@click.argument("name", type=str)
+@click.argument("aliases", type=str, nargs=-1, required=True)
+def add_group_command(name: str, aliases: tuple[str, ...]):
+    config = load_config()
+    with Connection.connect(config.database_url) as conn:
+        with conn.cursor() as cur:
+            cur.execute(
+                "SELECT alias FROM aliases WHERE alias = ANY(%s)", (list(aliases),)
+            )
+            unknown = set(aliases) - {record[0] for record in cur}
+            if unknown:
+                raise click.ClickException(
+                    f"Unknown aliases: {', '.join(sorted(unknown))}"
+                )
+            cur.executemany(
+                "INSERT INTO feed_groups (name, alias) VALUES (%s, %s) "
+                "ON CONFLICT (name, alias) DO NOTHING",
+                [(name, alias) for alias in aliases],
+            )
+            conn.commit()
+    print(f"Follow the feed here: {config.service_url}/rss/group/{name}.xml")
+
+
+@group_group.command("list")
+def list_group_command():
+    config = load_config()
+    with Connection.connect(config.database_url) as conn:
+        with conn.cursor() as cur:
+            cur.execute(
+                "SELECT name, string_agg(alias, ', ' ORDER BY id) FROM feed_groups "
+                "GROUP BY name ORDER BY name"
+            )
+            for record in cur:
+                print(
+                    f'* Group "{record[0]}" of {record[1]} '
+                    f"-> {config.service_url}/rss/group/{record[0]}.xml"
+                )
+
+
+# Without aliases, the whole group is deleted.
+@group_group.command("delete")
+@click.argument("name", type=str)
+@click.argument("aliases", type=str, nargs=-1)
+def delete_group_command(name: str, aliases: tuple[str, ...]):
+    config = load_config()
+    with Connection.connect(config.database_url) as conn:
+        with conn.cursor() as cur:
+            if aliases:
+                cur.execute(
+                    "DELETE FROM feed_groups WHERE name = %s AND alias = ANY(%s)",
+                    (name, list(aliases)),
+                )
+            else:
+                cur.execute("DELETE FROM feed_groups WHERE name = %s", (name,))
+            conn.commit()
@@ -1,5 +1,8 @@
 import asyncio
+import signal
 from collections.abc import AsyncGenerator
+from contextlib import suppress
+from multiprocessing.synchronize import Event
 
 import aiohttp_jinja2
 import click
@@ -7,42 +10,178 @@ import jinja2
 from aiohttp import web
 from psycopg import AsyncConnection
 
-from m2rss.appkeys import config_key, pg_key
-from m2rss.config import load_config
+from m2rss.appkeys import (
+    alias_cache_key,
+    config_key,
+    feed_cache_key,
+    group_cache_key,
+    pg_pool_key,
+    search_cache_key,
+    single_flight_key,
+)
+from m2rss.compression import compress_static
+from m2rss.config import Config, load_config
 from m2rss.constants import LOGGER, PROJECT_DIR
+from m2rss.data.aliases import ALIASES_CHANNEL, AliasCache
+from m2rss.data.emails import EMAILS_CHANNEL
+from m2rss.data.groups import GROUPS_CHANNEL, GroupCache
+from m2rss.data.listener import PGListener
+from m2rss.data.pool import make_pool, pool_stats
 from m2rss.db_migrations import execute_migrations
+from m2rss.feed_cache import FeedCache
+from m2rss.handlers.error import overload_middleware
+from m2rss.handlers.metrics import handle_metrics, metrics_middleware
 from m2rss.routes import ROUTES
+from m2rss.single_flight import SingleFlight
+from m2rss.supervisor import Supervisor
+
+STATIC_DIR = PROJECT_DIR / "m2rss" / "static"
 
 
 class PGEngine:
-    def __init__(self, conninfo: str):
-        self.conninfo = conninfo
+    def __init__(self, config: Config):
+        self.config = config
 
     async def __call__(self, app: web.Application) -> AsyncGenerator[None, None]:
-        async with await AsyncConnection.connect(self.conninfo) as conn:
-            await execute_migrations(conn)
-            app[pg_key] = conn
+        async with make_pool(self.config) as pool:
+            app[pg_pool_key] = pool
             yield
+            LOGGER.debug(f"Closing database pool: {pool_stats(pool)}")
 
 
-async def http_server_task_runner():
-    config = load_config()
+class ListenerEngine:
+    def __init__(self, config: Config):
+        self.config = config
+
+    async def __call__(self, app: web.Application) -> AsyncGenerator[None, None]:
+        alias_cache = AliasCache(app[pg_pool_key])
+        group_cache = GroupCache(app[pg_pool_key], alias_cache)
+        feed_cache = FeedCache(
+            alias_cache,
+            group_cache,
+            self.config.feed_cache_max_entries,
+            self.config.feed_cache_max_bytes,
+        )
+        search_cache = FeedCache(
+            alias_cache,
+            group_cache,
+            self.config.search_cache_max_entries,
+            self.config.search_cache_max_bytes,
+        )
+        listener = PGListener(self.config.database_url)
+        listener.subscribe(ALIASES_CHANNEL, alias_cache.on_notify)
+        listener.subscribe(ALIASES_CHANNEL, feed_cache.on_aliases_notify)
+        listener.subscribe(EMAILS_CHANNEL, feed_cache.on_emails_notify)
+        listener.subscribe(ALIASES_CHANNEL, search_cache.on_aliases_notify)
+        listener.subscribe(EMAILS_CHANNEL, search_cache.on_emails_notify)
+        listener.subscribe(GROUPS_CHANNEL, group_cache.on_notify)
+        listener.subscribe(GROUPS_CHANNEL, feed_cache.on_groups_notify)
+        listener.on_connect(alias_cache.reload)
+        listener.on_connect(group_cache.reload)
+        listener.on_connect(feed_cache.clear)
+        listener.on_connect(search_cache.clear)
+        app[alias_cache_key] = alias_cache
+        app[group_cache_key] = group_cache
+        app[feed_cache_key] = feed_cache
+        app[search_cache_key] = search_cache
+
+        task = asyncio.create_task(listener.run())
+        await listener.ready.wait()
+        yield
+        task.cancel()
+        with suppress(asyncio.CancelledError):
+            await task
+
+
+async def run_migrations(config: Config):
+    async with await AsyncConnection.connect(config.database_url) as conn:
+        await execute_migrations(conn)
+
+
+# Outdated variants would be served instead of a rebuilt stylesheet, so they
+# are refreshed before serving. The package may be installed read-only.
+def refresh_static():
+    try:
+        for path in compress_static(STATIC_DIR):
+            LOGGER.info(f"Compressed {path.relative_to(STATIC_DIR)}")
+    except OSError as e:
+        LOGGER.warning(f"Could not compress static files: {e}")
+
 
-    app = web.Application()
+def make_app(config: Config) -> web.Application:
+    middlewares = [overload_middleware]
+    if config.metrics_enabled and config.metrics_request_timing:
+        middlewares.insert(0, metrics_middleware)
+    app = web.Application(middlewares=middlewares)
     aiohttp_jinja2.setup(app, loader=jinja2.PackageLoader("m2rss"), enable_async=True)
     app.add_routes(ROUTES)
-    app.router.add_static("/static/", PROJECT_DIR / "m2rss" / "static", name="static")
+    if config.metrics_enabled:
+        app.router.add_get("/metrics", handle_metrics)
+    # Serves the precompressed `.br`/`.gz` variants when the client accepts them.
+    app.router.add_static("/static/", STATIC_DIR, name="static")
     app[config_key] = config
-    app.cleanup_ctx.append(PGEngine(config.database_url))
+    app[single_flight_key] = SingleFlight(
+        config.feed_max_concurrency, config.feed_max_queue
+    )
+    app.cleanup_ctx.append(PGEngine(config))
+    app.cleanup_ctx.append(ListenerEngine(config))
+    return app
 
-    runner = web.AppRunner(app)
+
+# Serves until SIGTERM (or SIGINT), then stops accepting connections and lets
+# the requests in flight finish within server_shutdown_timeout.
+async def serve_app(
+    config: Config, reuse_port: bool = False, ready: Event | None = None
+):
+    runner = web.AppRunner(
+        make_app(config), shutdown_timeout=config.server_shutdown_timeout
+    )
     await runner.setup()
-    site = web.TCPSite(runner, port=config.server_port)
-    LOGGER.info(f"Listening on http://localhost:{config.server_port}")
+    site = web.TCPSite(runner, port=config.server_port, reuse_port=reuse_port)
     await site.start()
-    await asyncio.Event().wait()
+    LOGGER.info(f"Listening on http://localhost:{config.server_port}")
+    if ready is not None:
+        ready.set()
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    loop.add_signal_handler(signal.SIGTERM, stop.set)
+    if ready is None:
+        loop.add_signal_handler(signal.SIGINT, stop.set)
+    await stop.wait()
+    LOGGER.info("Draining connections")
+    await runner.cleanup()
+
+
+# Entry point of the worker processes, the port is shared with SO_REUSEPORT
+# and the supervisor handles the terminal signals.
+def serve_worker(ready: Event):
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGHUP, signal.SIG_IGN)
+    asyncio.run(serve_app(load_config(), reuse_port=True, ready=ready))
 
 
 @click.command("serve")
-def serve_command():
-    asyncio.run(http_server_task_runner())
+@click.option(
+    "--workers", type=int, default=None, help="Worker processes [server_workers]"
+)
+def serve_command(workers: int | None):
+    config = load_config()
+    workers = config.server_workers if workers is None else workers
+    refresh_static()
+    if workers <= 1:
+        asyncio.run(run_migrations(config))
+        asyncio.run(serve_app(config))
+        return
+    Supervisor(
+        serve_worker,
+        workers,
+        config.server_shutdown_timeout,
+        lambda: asyncio.run(run_migrations(load_config())),
+    ).run()
+
+
+@click.command("compress-static")
+def compress_static_command():
+    for path in compress_static(STATIC_DIR):
+        print(f"Wrote {path.relative_to(PROJECT_DIR)}")
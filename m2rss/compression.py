@@ -0,0 +1,117 @@
+import gzip
+from collections.abc import Iterable
+from pathlib import Path
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# Higher levels cost twice the CPU for a 1% smaller feed, even though cached
+# bodies are compressed only once (see benchmarks/compression.py).
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+ZSTD_LEVEL = 6
+
+# Below this size the headers outweigh the savings.
+MIN_SIZE = 1024
+
+# Server preference, used when the client accepts several codings equally.
+ENCODINGS: tuple[str, ...] = tuple(
+    encoding
+    for encoding, available in (
+        ("zstd", zstandard is not None),
+        ("br", brotli is not None),
+        ("gzip", True),
+    )
+    if available
+)
+
+# Codings for the static files, which aiohttp serves as `<file>.br`/`<file>.gz`.
+STATIC_ENCODINGS: dict[str, str] = {
+    encoding: suffix
+    for encoding, suffix in (("br", ".br"), ("gzip", ".gz"))
+    if encoding in ENCODINGS
+}
+STATIC_SUFFIXES = (".br", ".gz")
+
+
+def negotiate(accept_encoding: str, encodings: Iterable[str] = ENCODINGS) -> str | None:
+    accepted: dict[str, float] = {}
+    for item in accept_encoding.lower().split(","):
+        coding, _, params = item.partition(";")
+        quality = 1.0
+        for param in params.split(";"):
+            name, _, value = param.strip().partition("=")
+            if name == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        if coding.strip():
+            accepted[coding.strip()] = quality
+
+    best, best_quality = None, 0.0
+    for encoding in encodings:
+        quality = accepted.get(encoding, accepted.get("*", 0.0))
+        if quality > best_quality:
+            best, best_quality = encoding, quality
+    return best
+
+
+def compress(body: bytes, encoding: str) -> bytes:
+    if encoding == "gzip":
+        # mtime=0 keeps the output, and so the ETag, reproducible.
+        return gzip.compress(body, GZIP_LEVEL, mtime=0)
+    if encoding == "br" and brotli is not None:
+        return brotli.compress(body, quality=BROTLI_QUALITY)
+    if encoding == "zstd" and zstandard is not None:
+        return zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(body)
+    raise ValueError(f"Unsupported content coding {encoding}")
+
+
+# Write then rename so the server never sends a truncated file.
+def write_atomic(path: Path, body: bytes):
+    tmp = path.with_name(path.name + ".tmp")
+    tmp.write_bytes(body)
+    tmp.replace(path)
+
+
+# Writes the compressed variants of the files under `directory` that are
+# missing or older than their source, unless compression does not shrink them.
+# Returns the paths written.
+def compress_static(directory: Path) -> list[Path]:
+    written: list[Path] = []
+    for path in sorted(directory.rglob("*")):
+        if not path.is_file() or path.suffix in STATIC_SUFFIXES:
+            continue
+        mtime = path.stat().st_mtime
+        body: bytes | None = None
+        for encoding, suffix in STATIC_ENCODINGS.items():
+            target = path.with_name(path.name + suffix)
+            if target.exists() and target.stat().st_mtime >= mtime:
+                continue
+            if body is None:
+                body = path.read_bytes()
+            compressed = compress(body, encoding)
+            if len(compressed) >= len(body):
+                continue
+            write_atomic(target, compressed)
+            written.append(target)
+    return written
+
+
+__all__ = [
+    "ENCODINGS",
+    "MIN_SIZE",
+    "STATIC_ENCODINGS",
+    "compress",
+    "compress_static",
+    "negotiate",
+    "write_atomic",
+]
@@ -3,24 +3,85 @@ import shutil
 import yaml
 from pydantic import BaseModel
 
-from m2rss.constants import PROJECT_DIR
+from m2rss.constants import LOGGER, PROJECT_DIR
+from m2rss.metrics import REGISTRY
 
 
-class Config(BaseModel):
+class MailboxConfig(BaseModel):
     email_addr: str
     email_server: str
     email_pass: str
-    imap_port: int
+    imap_port: int = 143
+    imap_starttls: bool = True
+    folders: list[str] = ["INBOX"]
+
+
+class Config(BaseModel):
+    # Single mailbox, kept along `mailboxes` for existing configs.
+    email_addr: str = ""
+    email_server: str | None = None
+    email_pass: str = ""
+    imap_port: int = 143
+    imap_mailbox: str = "INBOX"
+    mailboxes: list[MailboxConfig] = []
     fetch_mail_every: int
+    imap_fetch_batch_size: int = 100
+    imap_starttls: bool = True
+    imap_idle: bool = True
+    imap_idle_refresh: int = 1500
+    imap_reconnect_max_delay: int = 300
+    imap_max_concurrency: int = 4
+    ingest_workers: int = 0
+    ingest_queue_size: int = 4
 
     database_url: str
+    db_pool_min_size: int = 2
+    db_pool_max_size: int = 10
+    db_pool_timeout: float = 10.0
+    db_pool_max_idle: float = 600.0
 
     service_url: str
     server_port: int
+    server_workers: int = 1
+    server_shutdown_timeout: float = 30.0
+    feed_cache_max_entries: int = 1024
+    feed_cache_max_bytes: int = 64 * 1024 * 1024
+    feed_stream_threshold: int = 200
+    feed_max_concurrency: int = 8
+    feed_max_queue: int = 64
+    feed_retry_after: int = 5
+    search_max_matches: int = 1000
+    search_cache_max_entries: int = 128
+    search_cache_max_bytes: int = 8 * 1024 * 1024
+    export_dir: str | None = None
+    retention_days: int | None = None
+    alias_retention_days: dict[str, int] = {}
+
+    log_level: str = "INFO"
+    metrics_enabled: bool = True
+    metrics_request_timing: bool = True
+    watch_metrics_port: int | None = None
 
     admin_pass: str
 
 
+def get_mailboxes(config: Config) -> list[MailboxConfig]:
+    mailboxes = list(config.mailboxes)
+    if config.email_server is not None:
+        mailboxes.insert(
+            0,
+            MailboxConfig(
+                email_addr=config.email_addr,
+                email_server=config.email_server,
+                email_pass=config.email_pass,
+                imap_port=config.imap_port,
+                imap_starttls=config.imap_starttls,
+                folders=[config.imap_mailbox],
+            ),
+        )
+    return mailboxes
+
+
 def load_config() -> Config:
     default_config_path = PROJECT_DIR / "example-config.yaml"
     config_path = PROJECT_DIR / "config.yaml"
@@ -28,4 +89,7 @@ def load_config() -> Config:
         shutil.copyfile(default_config_path, config_path)
     with open(config_path) as f:
         data = yaml.safe_load(f)
-    return Config.model_validate(data)
+    config = Config.model_validate(data)
+    LOGGER.setLevel(config.log_level)
+    REGISTRY.enabled = config.metrics_enabled
+    return config
@@ -2,13 +2,13 @@ import logging
 from pathlib import Path
 
 PROJECT_DIR = Path(__file__).resolve().parent.parent
-LOGGING_LEVEL = logging.DEBUG
+LOGGING_LEVEL = logging.INFO
 LOGGER = logging.getLogger("m2r")
 
 LOGGER.setLevel(LOGGING_LEVEL)
 
+# The level is set from the log_level config key by load_config.
 handler = logging.StreamHandler()
-handler.setLevel(LOGGING_LEVEL)
 LOGGER.addHandler(handler)
 
 
@@ -0,0 +1,44 @@
+from psycopg import Notify
+from psycopg_pool import AsyncConnectionPool
+
+from m2rss.metrics import timed_query
+
+ALIASES_CHANNEL = "aliases_changed"
+LINK_KEYS = ["from_addr", "sender_addr", "delivered_to"]
+
+
+@timed_query
+async def get_aliases(pool: AsyncConnectionPool) -> dict[str, tuple[str, str]]:
+    aliases: dict[str, tuple[str, str]] = {}
+    async with pool.connection() as conn, conn.cursor() as cur:
+        await cur.execute("SELECT alias, link_key, link_val FROM aliases ORDER BY id")
+        async for record in cur:
+            aliases.setdefault(record[0], (record[1], record[2]))
+    return aliases
+
+
+# Holds the whole aliases table, so a miss is a negative lookup without a
+# database round trip. Refreshed by the aliases trigger notifications.
+class AliasCache:
+    def __init__(self, pool: AsyncConnectionPool):
+        self.pool = pool
+        self.aliases: dict[str, tuple[str, str]] = {}
+
+    async def reload(self):
+        self.aliases = await get_aliases(self.pool)
+
+    async def on_notify(self, notify: Notify):
+        await self.reload()
+
+    def matching(self, values: dict[str, str | None]) -> list[str]:
+        return [
+            alias
+            for alias, (link_key, link_val) in self.aliases.items()
+            if values.get(link_key) == link_val
+        ]
+
+    def get(self, alias: str) -> tuple[str, str] | tuple[None, None]:
+        return self.aliases.get(alias, (None, None))
+
+
+__all__ = ["ALIASES_CHANNEL", "LINK_KEYS", "AliasCache", "get_aliases"]
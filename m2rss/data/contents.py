@@ -0,0 +1,56 @@
+import hashlib
+import zlib
+from typing import NamedTuple
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# Bodies are compressed once and read on item pages only, so the level favours
+# size over speed. zlib is always available, so every server can read what any
+# other wrote. zstd bodies written by earlier versions are still read when
+# zstandard is installed.
+ZLIB_LEVEL = 9
+CODEC = "zlib"
+
+EXCERPT_LENGTH = 280
+
+
+class Content(NamedTuple):
+    hash: bytes
+    codec: str
+    data: bytes
+
+
+# Same as the excerpt column of migration 15.
+def excerpt_of(body: str) -> str:
+    text = " ".join(body.split())
+    if len(text) > EXCERPT_LENGTH:
+        return text[:EXCERPT_LENGTH] + "…"
+    return text
+
+
+def pack(text: str) -> Content:
+    raw = text.encode()
+    digest = hashlib.sha256(raw).digest()
+    data = zlib.compress(raw, ZLIB_LEVEL)
+    # Short bodies do not shrink.
+    if len(data) >= len(raw):
+        return Content(digest, "identity", raw)
+    return Content(digest, CODEC, data)
+
+
+def unpack(codec: str | None, data: bytes | None) -> str:
+    if codec is None or data is None:
+        return ""
+    if codec == "identity":
+        return data.decode()
+    if codec == "zlib":
+        return zlib.decompress(data).decode()
+    if codec == "zstd" and zstandard is not None:
+        return zstandard.ZstdDecompressor().decompress(data).decode()
+    raise ValueError(f"Unsupported content codec {codec}")
+
+
+__all__ = ["CODEC", "Content", "excerpt_of", "pack", "unpack"]
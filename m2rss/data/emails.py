@@ -1,8 +1,28 @@
+import asyncio
 from datetime import datetime
+from typing import NamedTuple
 
-from psycopg import AsyncConnection, sql
+from psycopg import sql
+from psycopg.rows import args_row
+from psycopg_pool import AsyncConnectionPool
 from pydantic import BaseModel
 
+from m2rss.data.contents import Content, excerpt_of, pack, unpack
+from m2rss.metrics import timed_query
+
+EMAILS_CHANNEL = "emails_changed"
+
+Cursor = tuple[datetime, int]
+SearchCursor = tuple[float, datetime, int]
+
+# Text search configuration of the search_vector column (migration 13).
+SEARCH_CONFIG = "english"
+# Bodies are cut below the 1MB tsvector limit.
+SEARCH_VECTOR = sql.SQL(
+    "setweight(to_tsvector(%s::regconfig, COALESCE(subject, '')), 'A') || "
+    "setweight(to_tsvector(%s::regconfig, LEFT(COALESCE(body, ''), 262144)), 'B')"
+)
+
 
 class Email(BaseModel):
     date: datetime
@@ -19,132 +39,579 @@ class Email(BaseModel):
     subject: str
     body: str
     formatted_body: str
+    message_id: str | None = None
+    rss_fragment: str | None = None
+    html_fragment: str | None = None
+    fragment_version: int = 0
 
 
 class RetrievedEmail(Email):
     id: int
+    excerpt: str = ""
+
+
+# Read path rows are plain tuples built by psycopg, only the columns of a view
+# are selected and nothing is validated. `content` is only loaded (and the body
+# decompressed) when the fragment is missing or outdated.
+class FeedRow(NamedTuple):
+    id: int
+    date: datetime
+    subject: str
+    from_full: str
+    fragment: str | None
+    content: str
+
+
+# A page of search results. `older` is the oldest ranked match when older
+# matches were left out of the ranking, searching before it continues with them.
+class SearchPage(NamedTuple):
+    matches: list[tuple[FeedRow, float]]
+    # More ranked matches after the last of `matches`.
+    more: bool
+    older: Cursor | None
+
+
+class ItemRow(NamedTuple):
+    id: int
+    date: datetime
+    subject: str
+    from_full: str
+    formatted_body: str
 
 
 class Emails(BaseModel):
     emails: list[Email]
 
 
-async def save_email(conn: AsyncConnection, mail: Email):
-    async with conn.cursor() as cur:
+EMAIL_COLUMNS = [
+    "date",
+    "user_agent",
+    "content_language",
+    "recipient",
+    "delivered_to",
+    "from_full",
+    "from_name",
+    "from_addr",
+    "sender_full",
+    "sender_name",
+    "sender_addr",
+    "subject",
+    "message_id",
+    "rss_fragment",
+    "html_fragment",
+    "fragment_version",
+]
+# The bodies are stored in email_contents (migration 15) and referenced by hash.
+STORED_COLUMNS = [*EMAIL_COLUMNS, "body_hash", "formatted_body_hash", "excerpt"]
+
+# Fragment and source content columns of each feed view. Cards are rendered
+# from the excerpt, feed items from the body. "text" is rendered from the body
+# on every request (Atom, JSON Feed).
+FEED_VIEWS: dict[str, tuple[str | None, str]] = {
+    "rss": ("rss_fragment", "body_hash"),
+    "html": ("html_fragment", "excerpt"),
+    "text": (None, "body_hash"),
+}
+
+
+def email_row(mail: Email, body: Content, formatted_body: Content) -> tuple:
+    return (
+        *(getattr(mail, column) for column in EMAIL_COLUMNS),
+        body.hash,
+        formatted_body.hash,
+        excerpt_of(mail.body),
+        mail.body,
+    )
+
+
+def pack_bodies(mails: list[Email]) -> list[tuple[Content, Content]]:
+    return [(pack(mail.body), pack(mail.formatted_body)) for mail in mails]
+
+
+@timed_query
+async def save_emails(pool: AsyncConnectionPool, mails: list[Email]) -> int:
+    if not mails:
+        return 0
+    bodies = await asyncio.to_thread(pack_bodies, mails)
+    columns = sql.SQL(", ").join(map(sql.Identifier, STORED_COLUMNS))
+    async with pool.connection() as conn, conn.cursor() as cur:
+        # The plain body is only staged to compute the search vector.
+        await cur.execute(
+            sql.SQL(
+                "CREATE TEMP TABLE emails_staging ON COMMIT DROP AS "
+                "SELECT {}, ''::text AS body FROM emails WITH NO DATA"
+            ).format(columns)
+        )
+        async with cur.copy(
+            sql.SQL("COPY emails_staging ({}, body) FROM STDIN").format(columns)
+        ) as copy:
+            for mail, (body, formatted_body) in zip(mails, bodies):
+                await copy.write_row(email_row(mail, body, formatted_body))
         await cur.execute(
-            "INSERT INTO emails "
-            "(date, user_agent, content_language, recipient, delivered_to, "
-            "from_full, from_name, from_addr, "
-            "sender_full, sender_name, sender_addr, subject, body, formatted_body) "
-            "VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)",
+            "CREATE TEMP TABLE email_contents_staging ON COMMIT DROP AS "
+            "SELECT hash, codec, data FROM email_contents WITH NO DATA"
+        )
+        async with cur.copy(
+            "COPY email_contents_staging (hash, codec, data) FROM STDIN"
+        ) as copy:
+            for contents in bodies:
+                for content in contents:
+                    await copy.write_row(content)
+        # Repeated bodies (footers, digests) are stored once.
+        await cur.execute(
+            "INSERT INTO email_contents (hash, codec, data) "
+            "SELECT DISTINCT ON (hash) hash, codec, data FROM email_contents_staging "
+            "ON CONFLICT (hash) DO NOTHING"
+        )
+        # Rows of a month without partition would go to emails_default.
+        await cur.execute(
+            "SELECT create_email_partition(month) FROM ("
+            "SELECT DISTINCT date_trunc('month', date) AS month "
+            "FROM emails_staging WHERE date IS NOT NULL) months"
+        )
+        # Already ingested messages (retries, re-fetches) are skipped here, copies
+        # delivered to another list or account are kept.
+        await cur.execute(
+            sql.SQL(
+                "INSERT INTO emails ({}, search_vector) "
+                "SELECT {}, {} FROM emails_staging "
+                "ON CONFLICT (message_id, delivered_to, sender_addr, date) DO NOTHING"
+            ).format(columns, columns, SEARCH_VECTOR),
+            (SEARCH_CONFIG, SEARCH_CONFIG),
+        )
+        return cur.rowcount
+
+
+# Timed through save_emails.
+async def save_email(pool: AsyncConnectionPool, mail: Email) -> bool:
+    return await save_emails(pool, [mail]) == 1
+
+
+def encode_cursor(date: datetime, email_id: int) -> str:
+    return f"{date:%Y%m%d%H%M%S%f}-{email_id}"
+
+
+def decode_cursor(cursor: str) -> Cursor:
+    date, _, email_id = cursor.partition("-")
+    return datetime.strptime(date, "%Y%m%d%H%M%S%f"), int(email_id)
+
+
+def encode_search_cursor(rank: float, date: datetime, email_id: int) -> str:
+    return f"{encode_cursor(date, email_id)}-{rank!r}"
+
+
+def decode_search_cursor(cursor: str) -> SearchCursor:
+    date, email_id, rank = cursor.split("-", 2)
+    return float(rank), *decode_cursor(f"{date}-{email_id}")
+
+
+def page_clause(
+    page: int, limit: int, before: Cursor | None, after: Cursor | None
+) -> tuple[sql.Composable, sql.Composable, tuple, int]:
+    # Keyset pages cost the same at any depth, `page` is only an OFFSET fallback.
+    # The plain date bound lets Postgres skip the partitions past the cursor.
+    if before is not None:
+        keyset = sql.SQL("AND date <= %s AND (date, id) < (%s, %s) ")
+        return keyset, sql.SQL("DESC"), (before[0], *before), 0
+    if after is not None:
+        keyset = sql.SQL("AND date >= %s AND (date, id) > (%s, %s) ")
+        return keyset, sql.SQL("ASC"), (after[0], *after), 0
+    return sql.SQL(""), sql.SQL("DESC"), (), page * limit
+
+
+# Selected columns (fragment, content, codec, data) of a view and the join of
+# its compressed content, to place right after "FROM emails". Their parameters
+# are in the same order.
+def view_columns(
+    kind: str, version: int
+) -> tuple[sql.Composable, sql.Composable, tuple]:
+    fragment, content = FEED_VIEWS[kind]
+    if fragment is None:
+        join = sql.SQL("LEFT JOIN email_contents c ON c.hash = emails.{} ")
+        return (
+            sql.SQL("NULL, '', c.codec, c.data"),
+            join.format(sql.Identifier(content)),
+            (),
+        )
+    if content == "excerpt":
+        columns = sql.SQL(
+            "CASE WHEN fragment_version = %s THEN {} END, "
+            "CASE WHEN fragment_version = %s THEN '' ELSE COALESCE(excerpt, '') END, "
+            "NULL, NULL"
+        )
+        return columns.format(sql.Identifier(fragment)), sql.SQL(""), (version, version)
+    # Bodies are only read for the rows whose fragment is outdated.
+    columns = sql.SQL(
+        "CASE WHEN fragment_version = %s THEN {} END, '', c.codec, c.data"
+    )
+    join = sql.SQL(
+        "LEFT JOIN email_contents c ON c.hash = emails.{} "
+        "AND fragment_version IS DISTINCT FROM %s "
+    )
+    return (
+        columns.format(sql.Identifier(fragment)),
+        join.format(sql.Identifier(content)),
+        (version, version),
+    )
+
+
+def feed_row(
+    email_id: int,
+    date: datetime,
+    subject: str,
+    from_full: str,
+    fragment: str | None,
+    content: str,
+    codec: str | None,
+    data: bytes | None,
+) -> FeedRow:
+    return FeedRow(
+        email_id, date, subject, from_full, fragment, content or unpack(codec, data)
+    )
+
+
+def item_row(
+    email_id: int,
+    date: datetime,
+    subject: str,
+    from_full: str,
+    codec: str | None,
+    data: bytes | None,
+) -> ItemRow:
+    return ItemRow(email_id, date, subject, from_full, unpack(codec, data))
+
+
+@timed_query
+async def get_feed_rows(
+    pool: AsyncConnectionPool,
+    alias_key: str,
+    alias_val: str,
+    kind: str,
+    version: int,
+    page: int = 0,
+    limit: int = 20,
+    before: Cursor | None = None,
+    after: Cursor | None = None,
+) -> list[FeedRow]:
+    columns, join, view_params = view_columns(kind, version)
+    keyset, order, params, offset = page_clause(page, limit, before, after)
+    async with (
+        pool.connection() as conn,
+        conn.cursor(row_factory=args_row(feed_row)) as cur,
+    ):
+        await cur.execute(
+            sql.SQL(
+                "SELECT id, date, subject, from_full, {} "
+                "FROM emails {}"
+                "WHERE {} = %s {}"
+                "ORDER BY date {}, id {} LIMIT %s OFFSET %s"
+            ).format(columns, join, sql.Identifier(alias_key), keyset, order, order),
+            (*view_params, alias_val, *params, limit, offset),
+        )
+        rows = await cur.fetchall()
+    if after is not None:
+        rows.reverse()
+    return rows
+
+
+@timed_query
+async def get_feed_months(
+    pool: AsyncConnectionPool, alias_key: str, alias_val: str
+) -> list[datetime]:
+    async with pool.connection() as conn, conn.cursor() as cur:
+        await cur.execute(
+            sql.SQL(
+                "SELECT DISTINCT date_trunc('month', date) FROM emails "
+                "WHERE {} = %s ORDER BY 1"
+            ).format(sql.Identifier(alias_key)),
+            (alias_val,),
+        )
+        return [record[0] for record in await cur.fetchall()]
+
+
+# Rows with `start <= date < end`, newest first.
+@timed_query
+async def get_period_rows(
+    pool: AsyncConnectionPool,
+    alias_key: str,
+    alias_val: str,
+    kind: str,
+    version: int,
+    start: datetime,
+    end: datetime,
+) -> list[FeedRow]:
+    columns, join, view_params = view_columns(kind, version)
+    async with (
+        pool.connection() as conn,
+        conn.cursor(row_factory=args_row(feed_row)) as cur,
+    ):
+        await cur.execute(
+            sql.SQL(
+                "SELECT id, date, subject, from_full, {} "
+                "FROM emails {}"
+                "WHERE {} = %s AND date >= %s AND date < %s "
+                "ORDER BY date DESC, id DESC"
+            ).format(columns, join, sql.Identifier(alias_key)),
+            (*view_params, alias_val, start, end),
+        )
+        return await cur.fetchall()
+
+
+# Emails stored after `after_id`, in insertion order.
+@timed_query
+async def get_new_items(
+    pool: AsyncConnectionPool,
+    alias_key: str,
+    alias_val: str,
+    after_id: int = 0,
+    limit: int = 1000,
+) -> list[ItemRow]:
+    async with (
+        pool.connection() as conn,
+        conn.cursor(row_factory=args_row(item_row)) as cur,
+    ):
+        await cur.execute(
+            sql.SQL(
+                "SELECT id, date, subject, from_full, c.codec, c.data "
+                "FROM emails "
+                "LEFT JOIN email_contents c ON c.hash = emails.formatted_body_hash "
+                "WHERE {} = %s AND id > %s ORDER BY id LIMIT %s"
+            ).format(sql.Identifier(alias_key)),
+            (alias_val, after_id, limit),
+        )
+        return await cur.fetchall()
+
+
+def search_row(*values) -> tuple[FeedRow, float, Cursor | None]:
+    *row, rank, older_date, older_id = values
+    older = None if older_date is None else (older_date, older_id)
+    return feed_row(*row), rank, older
+
+
+# Matches are ranked by relevance, then newest first. Only the `max_matches`
+# newest matches of the alias before `until` are ranked: ts_rank reads every
+# matched vector, so common words on large lists would otherwise rank the whole
+# archive. When there are older matches the page says so, and the search goes
+# on in the window before the oldest ranked match.
+@timed_query
+async def search_feed_rows(
+    pool: AsyncConnectionPool,
+    alias_key: str,
+    alias_val: str,
+    kind: str,
+    version: int,
+    query: str,
+    limit: int = 20,
+    before: SearchCursor | None = None,
+    max_matches: int = 1000,
+    until: Cursor | None = None,
+) -> SearchPage:
+    columns, join, view_params = view_columns(kind, version)
+    window = sql.SQL("")
+    if until is not None:
+        window = sql.SQL("AND date <= %s AND (date, id) < (%s, %s) ")
+    keyset = sql.SQL("")
+    if before is not None:
+        keyset = sql.SQL("WHERE (rank, date, id) < (%s::real, %s, %s) ")
+    async with (
+        pool.connection() as conn,
+        conn.cursor(row_factory=args_row(search_row)) as cur,
+    ):
+        # One match past the window and one row past the page tell whether
+        # there is more.
+        await cur.execute(
+            sql.SQL(
+                "WITH query AS (SELECT websearch_to_tsquery(%s::regconfig, %s) AS q), "
+                "matches AS ("
+                "SELECT id, date, search_vector FROM emails, query "
+                "WHERE {} = %s AND search_vector @@ q {}"
+                "ORDER BY date DESC, id DESC LIMIT %s + 1), "
+                "ranked AS ("
+                "SELECT id, date, ts_rank(search_vector, q) AS rank "
+                "FROM (SELECT * FROM matches ORDER BY date DESC, id DESC LIMIT %s) "
+                "newest, query), "
+                "older AS ("
+                "SELECT date AS older_date, id AS older_id FROM ranked "
+                "WHERE (SELECT count(*) FROM matches) > %s "
+                "ORDER BY date, id LIMIT 1), "
+                "page AS ("
+                "SELECT id, rank FROM ranked {}"
+                "ORDER BY rank DESC, date DESC, id DESC LIMIT %s + 1) "
+                "SELECT id, date, subject, from_full, {}, page.rank, "
+                "older_date, older_id "
+                "FROM page JOIN emails USING (id) {}"
+                "LEFT JOIN older ON true "
+                "ORDER BY page.rank DESC, date DESC, id DESC"
+            ).format(sql.Identifier(alias_key), window, keyset, columns, join),
             (
-                mail.date,
-                mail.user_agent,
-                mail.content_language,
-                mail.recipient,
-                mail.delivered_to,
-                mail.from_full,
-                mail.from_name,
-                mail.from_addr,
-                mail.sender_full,
-                mail.sender_name,
-                mail.sender_addr,
-                mail.subject,
-                mail.body,
-                mail.formatted_body,
+                SEARCH_CONFIG,
+                query,
+                alias_val,
+                *((until[0], *until) if until is not None else ()),
+                max_matches,
+                max_matches,
+                max_matches,
+                *(before or ()),
+                limit,
+                *view_params,
+            ),
+        )
+        rows = await cur.fetchall()
+    return SearchPage(
+        matches=[(row, rank) for row, rank, _ in rows[:limit]],
+        more=len(rows) > limit,
+        older=rows[0][2] if rows else None,
+    )
+
+
+def group_row(*values) -> tuple[FeedRow, str]:
+    return feed_row(*values[:-1]), values[-1]
+
+
+# Newest emails of several aliases in one query. Each alias reads its own
+# (link_key, date, id) index up to the page end, and an email matching several
+# aliases is kept once, under the first of them.
+@timed_query
+async def get_group_rows(
+    pool: AsyncConnectionPool,
+    links: list[tuple[str, str, str]],
+    kind: str,
+    version: int,
+    page: int = 0,
+    limit: int = 20,
+    before: Cursor | None = None,
+    after: Cursor | None = None,
+) -> list[tuple[FeedRow, str]]:
+    if not links:
+        return []
+    columns, join, view_params = view_columns(kind, version)
+    keyset, order, params, offset = page_clause(page, limit, before, after)
+    branch = sql.SQL(
+        "(SELECT id, date, %s::int AS priority, %s::text AS alias FROM emails "
+        "WHERE {} = %s {}ORDER BY date {}, id {} LIMIT %s)"
+    )
+    branches: list[sql.Composable] = []
+    branch_params: list = []
+    for priority, (alias, link_key, link_val) in enumerate(links):
+        branches.append(branch.format(sql.Identifier(link_key), keyset, order, order))
+        branch_params += [priority, alias, link_val, *params, offset + limit]
+    async with (
+        pool.connection() as conn,
+        conn.cursor(row_factory=args_row(group_row)) as cur,
+    ):
+        await cur.execute(
+            sql.SQL(
+                "WITH matches AS ({}), "
+                "deduplicated AS ("
+                "SELECT DISTINCT ON (date, id) id, date, alias FROM matches "
+                "ORDER BY date {}, id {}, priority), "
+                "page AS ("
+                "SELECT id, date, alias FROM deduplicated "
+                "ORDER BY date {}, id {} LIMIT %s OFFSET %s) "
+                "SELECT id, date, subject, from_full, {}, page.alias "
+                "FROM page JOIN emails USING (id, date) {}"
+                "ORDER BY date {}, id {}"
+            ).format(
+                sql.SQL(" UNION ALL ").join(branches),
+                order,
+                order,
+                order,
+                order,
+                columns,
+                join,
+                order,
+                order,
             ),
+            (*branch_params, limit, offset, *view_params),
         )
-        await conn.commit()
+        rows = await cur.fetchall()
+    if after is not None:
+        rows.reverse()
+    return rows
+
 
+def email_columns(full: bool) -> sql.Composable:
+    columns = sql.SQL(
+        "SELECT id, date, user_agent, content_language, recipient, delivered_to, "
+        "from_full, from_name, from_addr, sender_full, sender_name, sender_addr, "
+        "subject, excerpt, {} FROM emails {}"
+    )
+    if not full:
+        return columns.format(sql.SQL("NULL, NULL, NULL, NULL"), sql.SQL(""))
+    return columns.format(
+        sql.SQL("b.codec, b.data, f.codec, f.data"),
+        sql.SQL(
+            "LEFT JOIN email_contents b ON b.hash = emails.body_hash "
+            "LEFT JOIN email_contents f ON f.hash = emails.formatted_body_hash "
+        ),
+    )
 
-async def sender_from_alias(
-    conninfo: str, alias: str
-) -> tuple[str, str] | tuple[None, None]:
-    async with await AsyncConnection.connect(conninfo) as conn:
-        async with conn.cursor() as cur:
-            await cur.execute(
-                "SELECT link_key, link_val FROM aliases WHERE alias = %s LIMIT 1",
-                (alias,),
-            )
-            rec = await cur.fetchone()
-            if rec is None:
-                return None, None
-            return rec[0], rec[1]
 
+def retrieved_email(record: tuple) -> RetrievedEmail:
+    return RetrievedEmail(
+        id=record[0],
+        date=record[1],
+        user_agent=record[2],
+        content_language=record[3],
+        recipient=record[4],
+        delivered_to=record[5],
+        from_full=record[6],
+        from_name=record[7],
+        from_addr=record[8],
+        sender_full=record[9],
+        sender_name=record[10],
+        sender_addr=record[11],
+        subject=record[12],
+        excerpt=record[13],
+        body=unpack(record[14], record[15]),
+        formatted_body=unpack(record[16], record[17]),
+    )
 
+
+# The bodies are only read and decompressed with `full`, the excerpt is enough
+# for listings.
+@timed_query
 async def get_emails(
-    conn: AsyncConnection,
+    pool: AsyncConnectionPool,
     alias_key: str,
     alias_val: str,
     page: int = 0,
     limit: int = 20,
+    before: Cursor | None = None,
+    after: Cursor | None = None,
+    full: bool = False,
 ) -> list[RetrievedEmail] | None:
-    async with conn.cursor() as cur:
+    keyset, order, params, offset = page_clause(page, limit, before, after)
+    async with pool.connection() as conn, conn.cursor() as cur:
         await cur.execute(
             sql.SQL(
-                "SELECT id, date, user_agent, content_language, recipient, delivered_to, "
-                "from_full, from_name, from_addr, "
-                "sender_full, sender_name, sender_addr, subject, body, formatted_body "
-                "FROM emails "
-                "WHERE {} = %s ORDER BY date DESC LIMIT %s OFFSET %s "
-            ).format(sql.Identifier(alias_key)),
-            (alias_val, limit, page * limit),
+                "{}WHERE {} = %s {}ORDER BY date {}, id {} LIMIT %s OFFSET %s"
+            ).format(
+                email_columns(full), sql.Identifier(alias_key), keyset, order, order
+            ),
+            (alias_val, *params, limit, offset),
         )
-        emails: list[RetrievedEmail] = []
-        async for record in cur:
-            emails.append(
-                RetrievedEmail(
-                    id=record[0],
-                    date=record[1],
-                    user_agent=record[2],
-                    content_language=record[3],
-                    recipient=record[4],
-                    delivered_to=record[5],
-                    from_full=record[6],
-                    from_name=record[7],
-                    from_addr=record[8],
-                    sender_full=record[9],
-                    sender_name=record[10],
-                    sender_addr=record[11],
-                    subject=record[12],
-                    body=record[13],
-                    formatted_body=record[14],
-                )
-            )
-
+        emails = [retrieved_email(record) async for record in cur]
+        if after is not None:
+            emails.reverse()
         return emails
 
 
-async def get_email(
-    conn: AsyncConnection, link_key: str, link_val: str, item_id: int
-) -> RetrievedEmail | None:
-    async with conn.cursor() as cur:
+@timed_query
+async def get_item(
+    pool: AsyncConnectionPool, link_key: str, link_val: str, item_id: int
+) -> ItemRow | None:
+    async with (
+        pool.connection() as conn,
+        conn.cursor(row_factory=args_row(item_row)) as cur,
+    ):
         await cur.execute(
             sql.SQL(
-                "SELECT id, date, user_agent, content_language, recipient, delivered_to, "
-                "from_full, from_name, from_addr, "
-                "sender_full, sender_name, sender_addr, subject, body, formatted_body "
+                "SELECT id, date, subject, from_full, c.codec, c.data "
                 "FROM emails "
+                "LEFT JOIN email_contents c ON c.hash = emails.formatted_body_hash "
                 "WHERE {} = %s AND id = %s LIMIT 1"
             ).format(sql.Identifier(link_key)),
             (link_val, item_id),
         )
-        record = await cur.fetchone()
-        if record is not None:
-            return RetrievedEmail(
-                id=record[0],
-                date=record[1],
-                user_agent=record[2],
-                content_language=record[3],
-                recipient=record[4],
-                delivered_to=record[5],
-                from_full=record[6],
-                from_name=record[7],
-                from_addr=record[8],
-                sender_full=record[9],
-                sender_name=record[10],
-                sender_addr=record[11],
-                subject=record[12],
-                body=record[13],
-                formatted_body=record[14],
-            )
+        return await cur.fetchone()
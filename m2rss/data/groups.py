@@ -0,0 +1,63 @@
+from psycopg import Notify
+from psycopg_pool import AsyncConnectionPool
+
+from m2rss.data.aliases import AliasCache
+from m2rss.metrics import timed_query
+
+GROUPS_CHANNEL = "groups_changed"
+
+
+# Feed cache entries of a group are kept apart from the aliases, whose names
+# cannot contain a slash.
+def group_key(name: str) -> str:
+    return f"group/{name}"
+
+
+@timed_query
+async def get_groups(pool: AsyncConnectionPool) -> dict[str, list[str]]:
+    groups: dict[str, list[str]] = {}
+    async with pool.connection() as conn, conn.cursor() as cur:
+        await cur.execute("SELECT name, alias FROM feed_groups ORDER BY id")
+        async for record in cur:
+            groups.setdefault(record[0], []).append(record[1])
+    return groups
+
+
+# Holds the whole feed_groups table, refreshed by its trigger notifications as
+# the AliasCache.
+class GroupCache:
+    def __init__(self, pool: AsyncConnectionPool, alias_cache: AliasCache):
+        self.pool = pool
+        self.alias_cache = alias_cache
+        self.groups: dict[str, list[str]] = {}
+
+    async def reload(self):
+        self.groups = await get_groups(self.pool)
+
+    async def on_notify(self, notify: Notify):
+        await self.reload()
+
+    def containing(self, aliases: list[str]) -> list[str]:
+        return [
+            name
+            for name, members in self.groups.items()
+            if any(alias in members for alias in aliases)
+        ]
+
+    # (alias, link_key, link_val) of the members, None for an unknown group.
+    # Aliases sharing a link are merged.
+    def get(self, name: str) -> list[tuple[str, str, str]] | None:
+        members = self.groups.get(name)
+        if members is None:
+            return None
+        links: dict[tuple[str, str], str] = {}
+        for alias in members:
+            link_key, link_val = self.alias_cache.get(alias)
+            if link_key is not None and link_val is not None:
+                links.setdefault((link_key, link_val), alias)
+        return [
+            (alias, link_key, link_val) for (link_key, link_val), alias in links.items()
+        ]
+
+
+__all__ = ["GROUPS_CHANNEL", "GroupCache", "get_groups", "group_key"]
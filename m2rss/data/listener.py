@@ -0,0 +1,56 @@
+import asyncio
+from collections.abc import Awaitable, Callable
+
+from psycopg import AsyncConnection, Notify, sql
+
+from m2rss.constants import LOGGER
+
+NotifyHandler = Callable[[Notify], Awaitable[None]]
+ConnectHandler = Callable[[], Awaitable[None]]
+
+
+class PGListener:
+    def __init__(
+        self, conninfo: str, keepalive: float = 30.0, reconnect_delay: float = 1.0
+    ):
+        self.conninfo = conninfo
+        self.keepalive = keepalive
+        self.reconnect_delay = reconnect_delay
+        self.handlers: dict[str, list[NotifyHandler]] = {}
+        self.connect_handlers: list[ConnectHandler] = []
+        self.ready = asyncio.Event()
+
+    def subscribe(self, channel: str, handler: NotifyHandler):
+        self.handlers.setdefault(channel, []).append(handler)
+
+    def on_connect(self, handler: ConnectHandler):
+        self.connect_handlers.append(handler)
+
+    async def listen(self):
+        async with await AsyncConnection.connect(
+            self.conninfo, autocommit=True
+        ) as conn:
+            for channel in self.handlers:
+                await conn.execute(sql.SQL("LISTEN {}").format(sql.Identifier(channel)))
+            # Resync after LISTEN so that no change falls between load and listen.
+            for connect_handler in self.connect_handlers:
+                await connect_handler()
+            self.ready.set()
+            while True:
+                async for notify in conn.notifies(timeout=self.keepalive):
+                    for handler in self.handlers.get(notify.channel, []):
+                        await handler(notify)
+                await conn.execute("SELECT 1")
+
+    async def run(self):
+        while True:
+            try:
+                await self.listen()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                LOGGER.warning(
+                    f"Lost notification listener, reconnecting in "
+                    f"{self.reconnect_delay}s: {e}"
+                )
+            await asyncio.sleep(self.reconnect_delay)
@@ -0,0 +1,22 @@
+from psycopg_pool import AsyncConnectionPool
+
+from m2rss.config import Config
+
+
+def make_pool(config: Config) -> AsyncConnectionPool:
+    return AsyncConnectionPool(
+        config.database_url,
+        min_size=config.db_pool_min_size,
+        max_size=config.db_pool_max_size,
+        timeout=config.db_pool_timeout,
+        max_idle=config.db_pool_max_idle,
+        check=AsyncConnectionPool.check_connection,
+        open=False,
+    )
+
+
+def pool_stats(pool: AsyncConnectionPool) -> dict[str, int]:
+    return pool.get_stats()
+
+
+__all__ = ["make_pool", "pool_stats"]
@@ -0,0 +1,44 @@
+from psycopg_pool import AsyncConnectionPool
+from pydantic import BaseModel
+
+from m2rss.metrics import timed_query
+
+
+class SyncState(BaseModel):
+    account: str
+    mailbox: str
+    uid_validity: int
+    last_uid: int
+
+
+@timed_query
+async def get_sync_state(
+    pool: AsyncConnectionPool, account: str, mailbox: str
+) -> SyncState | None:
+    async with pool.connection() as conn, conn.cursor() as cur:
+        await cur.execute(
+            "SELECT uid_validity, last_uid FROM imap_sync_state "
+            "WHERE account = %s AND mailbox = %s",
+            (account, mailbox),
+        )
+        record = await cur.fetchone()
+        if record is None:
+            return None
+        return SyncState(
+            account=account,
+            mailbox=mailbox,
+            uid_validity=record[0],
+            last_uid=record[1],
+        )
+
+
+@timed_query
+async def save_sync_state(pool: AsyncConnectionPool, state: SyncState):
+    async with pool.connection() as conn, conn.cursor() as cur:
+        await cur.execute(
+            "INSERT INTO imap_sync_state (account, mailbox, uid_validity, last_uid) "
+            "VALUES (%s, %s, %s, %s) "
+            "ON CONFLICT (account, mailbox) DO UPDATE "
+            "SET uid_validity = EXCLUDED.uid_validity, last_uid = EXCLUDED.last_uid",
+            (state.account, state.mailbox, state.uid_validity, state.last_uid),
+        )
@@ -12,7 +12,7 @@ def migration_order() -> list[Path]:
         if not file.is_file() and file.suffix != ".sql":
             continue
         migrations.append(file)
-    return sorted(migrations, key=lambda x: x.stem)
+    return sorted(migrations, key=lambda x: int(x.stem.split("_", 1)[0]))
 
 
 async def check_done_migrations(conn: AsyncConnection) -> list[str]:
@@ -0,0 +1,215 @@
+import asyncio
+from bisect import bisect_right
+from datetime import datetime
+from pathlib import Path
+
+import jinja2
+from psycopg_pool import AsyncConnectionPool
+from pydantic import BaseModel
+
+from m2rss.compression import STATIC_ENCODINGS, compress, write_atomic
+from m2rss.constants import LOGGER
+from m2rss.data.aliases import get_aliases
+from m2rss.data.emails import (
+    Email,
+    ItemRow,
+    get_feed_months,
+    get_feed_rows,
+    get_new_items,
+    get_period_rows,
+)
+from m2rss.fragments import (
+    RENDERER_VERSION,
+    card_fragment,
+    feed_item,
+    item_url,
+    rss_fragment,
+)
+from m2rss.rss import RSS_SERIALIZER, RssChannel
+
+# Items of the exported RSS feed and of the first HTML page, as served by
+# default.
+FEED_SIZE = 20
+STATE_FILE = ".export-state.json"
+
+_templates = jinja2.Environment(loader=jinja2.PackageLoader("m2rss"), autoescape=True)
+
+
+class ExportState(BaseModel):
+    # Highest exported email id of each alias.
+    last_ids: dict[str, int] = {}
+
+
+def next_month(month: datetime) -> datetime:
+    if month.month == 12:
+        return month.replace(year=month.year + 1, month=1)
+    return month.replace(month=month.month + 1)
+
+
+# Writes the files under `directory` with the layout of the server URLs:
+#   rss/{alias}.xml            newest items
+#   page/{alias}.html          newest items
+#   page/{alias}/{YYYY-MM}.html  archive of a month
+#   page/{alias}/{id}.html     item
+# Emails only add items and change their month, so an update rewrites the
+# feeds, the new items and the archive of their months (with the neighbours,
+# whose links change when a month appears). Deleted or edited emails need a
+# full export.
+class Exporter:
+    def __init__(self, pool: AsyncConnectionPool, service_url: str, directory: Path):
+        self.pool = pool
+        self.service_url = service_url
+        self.directory = directory
+        self.state_path = directory / STATE_FILE
+        self.state = ExportState()
+        if self.state_path.exists():
+            self.state = ExportState.model_validate_json(self.state_path.read_text())
+        self.written = 0
+        # The watchers of several mailboxes may store emails at once.
+        self.lock = asyncio.Lock()
+
+    def write(self, name: str, body: bytes):
+        path = self.directory / name
+        path.parent.mkdir(parents=True, exist_ok=True)
+        write_atomic(path, body)
+        for encoding, suffix in STATIC_ENCODINGS.items():
+            target = path.with_name(path.name + suffix)
+            compressed = compress(body, encoding)
+            if len(compressed) < len(body):
+                write_atomic(target, compressed)
+            else:
+                target.unlink(missing_ok=True)
+        self.written += 1
+
+    async def write_text(self, name: str, text: str):
+        await asyncio.to_thread(self.write, name, text.encode())
+
+    async def export_all(self, full: bool = False):
+        aliases = await get_aliases(self.pool)
+        for alias, (link_key, link_val) in aliases.items():
+            await self.export_alias(alias, link_key, link_val, full)
+
+    # Watch mode hook, called with the emails just stored.
+    async def on_emails(self, emails: list[Email]):
+        aliases = await get_aliases(self.pool)
+        async with self.lock:
+            for alias, (link_key, link_val) in aliases.items():
+                if any(getattr(mail, link_key) == link_val for mail in emails):
+                    await self.export_alias(alias, link_key, link_val)
+
+    async def export_alias(
+        self, alias: str, link_key: str, link_val: str, full: bool = False
+    ):
+        last_id = 0 if full else self.state.last_ids.get(alias, 0)
+        dates: list[datetime] = []
+        while batch := await get_new_items(self.pool, link_key, link_val, last_id):
+            for item in batch:
+                await self.write_item(alias, link_val, item)
+            dates.extend(item.date for item in batch)
+            last_id = batch[-1].id
+        if not dates and not full:
+            return
+
+        # Read after the items so that their months are all listed.
+        months = await get_feed_months(self.pool, link_key, link_val)
+        changed = {bisect_right(months, date) - 1 for date in dates}
+        changed |= {k + step for k in changed for step in (-1, 1)}
+        for k in sorted(changed):
+            if 0 <= k < len(months):
+                await self.write_month(alias, link_key, link_val, months, k)
+        await self.write_feeds(alias, link_key, link_val, months)
+
+        self.state.last_ids[alias] = last_id
+        await asyncio.to_thread(
+            write_atomic, self.state_path, self.state.model_dump_json().encode()
+        )
+        LOGGER.info(f"Exported {len(dates)} new emails of {alias}")
+
+    async def write_item(self, alias: str, name: str, item: ItemRow):
+        body = _templates.get_template("item.html").render(
+            item_id=item.id,
+            feed_name=name,
+            feed_alias=alias,
+            item=feed_item(
+                item.subject,
+                item.from_full,
+                item.date,
+                item.formatted_body,
+                item_url(self.service_url, alias, item.id),
+            ),
+        )
+        await self.write_text(f"page/{alias}/{item.id}.html", body)
+
+    def month_url(self, alias: str, month: datetime) -> str:
+        return f"{self.service_url}/page/{alias}/{month:%Y-%m}.html"
+
+    async def write_month(
+        self,
+        alias: str,
+        link_key: str,
+        link_val: str,
+        months: list[datetime],
+        k: int,
+    ):
+        month = months[k]
+        rows = await get_period_rows(
+            self.pool,
+            link_key,
+            link_val,
+            "html",
+            RENDERER_VERSION,
+            month,
+            next_month(month),
+        )
+        next_link = f"{self.service_url}/page/{alias}.html"
+        if k + 1 < len(months):
+            next_link = self.month_url(alias, months[k + 1])
+        body = _templates.get_template("feed.html").render(
+            feed_name=link_val,
+            page_num=f"{month:%Y-%m}",
+            cards=[
+                card_fragment(row, item_url(self.service_url, alias, row.id))
+                for row in rows
+            ],
+            next_link=next_link,
+            prev_link=self.month_url(alias, months[k - 1]) if k > 0 else None,
+        )
+        await self.write_text(f"page/{alias}/{month:%Y-%m}.html", body)
+
+    async def write_feeds(
+        self, alias: str, link_key: str, link_val: str, months: list[datetime]
+    ):
+        rss_rows = await get_feed_rows(
+            self.pool, link_key, link_val, "rss", RENDERER_VERSION, limit=FEED_SIZE
+        )
+        channel = RssChannel(
+            title=link_val,
+            description=f"{link_val} mailing list",
+            link=f"{self.service_url}/page/{alias}.html",
+        )
+        rendered = [
+            rss_fragment(row, item_url(self.service_url, alias, row.id))
+            for row in rss_rows
+        ]
+        chunks = RSS_SERIALIZER.chunks(
+            f"{self.service_url}/rss/{alias}.xml", channel, [], None, rendered
+        )
+        await self.write_text(f"rss/{alias}.xml", "".join(chunks))
+
+        page_rows = await get_feed_rows(
+            self.pool, link_key, link_val, "html", RENDERER_VERSION, limit=FEED_SIZE
+        )
+        body = _templates.get_template("feed.html").render(
+            feed_name=link_val,
+            page_num=1,
+            cards=[
+                card_fragment(row, item_url(self.service_url, alias, row.id))
+                for row in page_rows
+            ],
+            next_link=None,
+            prev_link=self.month_url(alias, months[-1]) if months else None,
+        )
+        await self.write_text(f"page/{alias}.html", body)
+
+
+__all__ = ["ExportState", "Exporter"]
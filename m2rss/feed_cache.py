@@ -0,0 +1,156 @@
+import asyncio
+import hashlib
+import json
+from collections import OrderedDict
+from datetime import UTC, datetime, timedelta
+
+from psycopg import Notify
+from pydantic import BaseModel
+
+from m2rss.compression import compress
+from m2rss.data.aliases import AliasCache
+from m2rss.data.groups import GroupCache, group_key
+
+FeedKey = tuple[str, str, str, int]
+
+
+def http_now() -> datetime:
+    return datetime.now(UTC).replace(microsecond=0)
+
+
+class CachedFeed(BaseModel):
+    key: FeedKey
+    body: bytes
+    content_type: str
+    etag: str
+    last_modified: datetime
+    # Compressed bodies by content coding, filled on the first request for each.
+    encoded: dict[str, bytes] = {}
+
+    @property
+    def size(self) -> int:
+        return len(self.body) + sum(map(len, self.encoded.values()))
+
+
+class FeedCache:
+    def __init__(
+        self,
+        alias_cache: AliasCache,
+        group_cache: GroupCache,
+        max_entries: int,
+        max_bytes: int,
+    ):
+        self.alias_cache = alias_cache
+        self.group_cache = group_cache
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.entries: OrderedDict[FeedKey, CachedFeed] = OrderedDict()
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+
+        self.version = 0
+        self.cleared_version = 0
+        self.alias_versions: dict[str, int] = {}
+        self.cleared_at = http_now()
+        self.changed_at: dict[str, datetime] = {}
+
+    def generation(self, alias: str) -> int:
+        return max(self.alias_versions.get(alias, 0), self.cleared_version)
+
+    def last_modified(self, alias: str) -> datetime:
+        return max(self.changed_at.get(alias, self.cleared_at), self.cleared_at)
+
+    def get(self, key: FeedKey) -> CachedFeed | None:
+        cached = self.entries.get(key)
+        if cached is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.entries.move_to_end(key)
+        return cached
+
+    def put(
+        self, key: FeedKey, body: bytes, content_type: str, generation: int
+    ) -> CachedFeed:
+        alias = key[1]
+        cached = CachedFeed(
+            key=key,
+            body=body,
+            content_type=content_type,
+            etag=hashlib.blake2b(body, digest_size=16).hexdigest(),
+            last_modified=self.last_modified(alias),
+        )
+        # Do not store a feed rendered from data that changed while rendering.
+        if generation != self.generation(alias) or len(body) > self.max_bytes:
+            return cached
+
+        self.pop(key)
+        self.entries[key] = cached
+        self.size += len(body)
+        self.evict()
+        return cached
+
+    # The compressed body is kept with the feed and counts towards max_bytes.
+    async def encode(self, cached: CachedFeed, encoding: str) -> bytes:
+        body = cached.encoded.get(encoding)
+        if body is not None:
+            return body
+        # Large feeds take tens of milliseconds to compress.
+        body = await asyncio.to_thread(compress, cached.body, encoding)
+        cached.encoded[encoding] = body
+        if self.entries.get(cached.key) is cached:
+            self.size += len(body)
+            self.evict()
+        return body
+
+    def evict(self):
+        while len(self.entries) > self.max_entries or self.size > self.max_bytes:
+            _, evicted = self.entries.popitem(last=False)
+            self.size -= evicted.size
+
+    def pop(self, key: FeedKey):
+        cached = self.entries.pop(key, None)
+        if cached is not None:
+            self.size -= cached.size
+
+    def invalidate(self, alias: str):
+        self.version += 1
+        self.alias_versions[alias] = self.version
+        # Keep Last-Modified strictly increasing even for changes within a second.
+        self.changed_at[alias] = max(
+            http_now(), self.last_modified(alias) + timedelta(seconds=1)
+        )
+        for key in [key for key in self.entries if key[1] == alias]:
+            self.pop(key)
+
+    async def clear(self):
+        self.version += 1
+        self.cleared_version = self.version
+        self.cleared_at = max(
+            http_now(),
+            max([self.cleared_at, *self.changed_at.values()]) + timedelta(seconds=1),
+        )
+        self.changed_at.clear()
+        self.alias_versions.clear()
+        self.entries.clear()
+        self.size = 0
+
+    # Group feeds change with any of their aliases.
+    def invalidate_aliases(self, aliases: list[str]):
+        for alias in aliases:
+            self.invalidate(alias)
+        for name in self.group_cache.containing(aliases):
+            self.invalidate(group_key(name))
+
+    async def on_emails_notify(self, notify: Notify):
+        self.invalidate_aliases(self.alias_cache.matching(json.loads(notify.payload)))
+
+    async def on_aliases_notify(self, notify: Notify):
+        self.invalidate_aliases([notify.payload])
+
+    async def on_groups_notify(self, notify: Notify):
+        self.invalidate(group_key(notify.payload))
+
+
+__all__ = ["CachedFeed", "FeedCache", "FeedKey"]
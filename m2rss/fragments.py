@@ -0,0 +1,128 @@
+from datetime import UTC, datetime
+
+import jinja2
+from markupsafe import escape
+
+from m2rss.data.contents import excerpt_of, unpack
+from m2rss.data.emails import Email, FeedRow
+from m2rss.rss import RSS_SERIALIZER, RSSItem
+
+# Bump when the item markup changes. Outdated fragments are rendered on the fly
+# until `m2rss email render-fragments` has stored the new ones.
+RENDERER_VERSION = 2
+
+# Fragments are shared by every alias matching an email, so the item URL is
+# spliced in when serving. The marker is not valid in XML and is stripped from
+# the email content before rendering.
+ITEM_URL = "\x01"
+
+_templates = jinja2.Environment(loader=jinja2.PackageLoader("m2rss"), autoescape=True)
+CARD_TEMPLATE = _templates.get_template("card.html")
+
+
+def item_url(service_url: str, alias: str, email_id: int) -> str:
+    return f"{service_url}/page/{alias}/{email_id}.html"
+
+
+def pub_date(date: datetime) -> str:
+    return date.astimezone(UTC).strftime("%a, %d %b %Y %H:%M:%S %z")
+
+
+def feed_item(
+    subject: str, from_full: str, date: datetime, description: str, url: str
+) -> RSSItem:
+    return RSSItem(
+        title=subject,
+        author=from_full,
+        description=description,
+        guid=url,
+        link=url,
+        pub_date=pub_date(date),
+        published=date.astimezone(UTC),
+    )
+
+
+def render_rss_item(
+    subject: str, from_full: str, date: datetime, body: str, url: str
+) -> str:
+    return RSS_SERIALIZER.item(feed_item(subject, from_full, date, body, url))
+
+
+# Cards only show the excerpt, the full body is on the item page.
+def render_card(
+    subject: str, from_full: str, date: datetime, excerpt: str, url: str
+) -> str:
+    description = f"<p>{escape(excerpt)}</p>"
+    return CARD_TEMPLATE.render(
+        item=feed_item(subject, from_full, date, description, url)
+    )
+
+
+def fragments_for(
+    subject: str, from_full: str, date: datetime, body: str, excerpt: str
+) -> tuple[str, str]:
+    subject = subject.replace(ITEM_URL, "")
+    from_full = from_full.replace(ITEM_URL, "")
+    return (
+        render_rss_item(subject, from_full, date, body.replace(ITEM_URL, ""), ITEM_URL),
+        render_card(subject, from_full, date, excerpt.replace(ITEM_URL, ""), ITEM_URL),
+    )
+
+
+def render_fragments(mail: Email) -> Email:
+    rss_fragment, html_fragment = fragments_for(
+        mail.subject, mail.from_full, mail.date, mail.body, excerpt_of(mail.body)
+    )
+    return mail.model_copy(
+        update={
+            "rss_fragment": rss_fragment,
+            "html_fragment": html_fragment,
+            "fragment_version": RENDERER_VERSION,
+        }
+    )
+
+
+# Backfill transform of `email render-fragments`: rows of
+# (id, subject, from_full, date, excerpt, body codec, body data) to the values
+# of its UPDATE statement in m2rss/cli/email.py.
+def render_rows(rows: list[tuple]) -> list[tuple]:
+    return [
+        (
+            *fragments_for(
+                subject or "",
+                from_full or "",
+                date,
+                unpack(codec, data),
+                excerpt or "",
+            ),
+            RENDERER_VERSION,
+            email_id,
+            date,
+        )
+        for email_id, subject, from_full, date, excerpt, codec, data in rows
+    ]
+
+
+# The marker stands for the URL in markup, so it is replaced by the escaped URL
+# as the serializer and the template would have written it.
+def rss_fragment(row: FeedRow, url: str) -> str:
+    if row.fragment is not None:
+        return row.fragment.replace(ITEM_URL, escape(url))
+    return render_rss_item(row.subject, row.from_full, row.date, row.content, url)
+
+
+def card_fragment(row: FeedRow, url: str) -> str:
+    if row.fragment is not None:
+        return row.fragment.replace(ITEM_URL, escape(url))
+    return render_card(row.subject, row.from_full, row.date, row.content, url)
+
+
+__all__ = [
+    "RENDERER_VERSION",
+    "card_fragment",
+    "feed_item",
+    "fragments_for",
+    "item_url",
+    "render_fragments",
+    "rss_fragment",
+]
@@ -0,0 +1,75 @@
+from datetime import datetime
+from functools import partial
+
+from aiohttp import hdrs, web
+
+from m2rss.appkeys import feed_cache_key, single_flight_key
+from m2rss.compression import MIN_SIZE, negotiate
+from m2rss.feed_cache import CachedFeed, FeedCache
+
+
+def is_not_modified(
+    request: web.Request, last_modified: datetime, etag: str | None = None
+) -> bool:
+    if request.if_none_match is not None:
+        # Without the rendered body the ETag is unknown, so only a cache hit
+        # can answer If-None-Match.
+        if etag is None:
+            return False
+        return any(
+            tag.value == "*" or (not tag.is_weak and tag.value == etag)
+            for tag in request.if_none_match
+        )
+    if request.if_modified_since is not None:
+        return last_modified <= request.if_modified_since
+    return False
+
+
+def not_modified_response(last_modified: datetime, etag: str | None = None):
+    response = web.Response(status=304)
+    response.last_modified = last_modified
+    if etag is not None:
+        response.etag = etag
+    return response
+
+
+# `cache` is the one holding `cached`, its compressed bodies are counted there.
+async def cached_response(
+    request: web.Request,
+    cached: CachedFeed,
+    cache: web.AppKey[FeedCache] = feed_cache_key,
+) -> web.Response:
+    encoding = None
+    if len(cached.body) >= MIN_SIZE:
+        encoding = negotiate(request.headers.get(hdrs.ACCEPT_ENCODING, ""))
+    # Each coding is a distinct representation with its own ETag.
+    etag = cached.etag if encoding is None else f"{cached.etag}-{encoding}"
+    if is_not_modified(request, cached.last_modified, etag):
+        response = not_modified_response(cached.last_modified, etag)
+    elif encoding is None:
+        response = web.Response(body=cached.body, content_type=cached.content_type)
+    else:
+        body = cached.encoded.get(encoding)
+        if body is None:
+            # Concurrent requests for a new feed share its compression.
+            body = await request.app[single_flight_key].run(
+                (*cached.key, cached.etag, encoding),
+                partial(request.app[cache].encode, cached, encoding),
+            )
+        response = web.Response(
+            body=body,
+            content_type=cached.content_type,
+            headers={hdrs.CONTENT_ENCODING: encoding},
+        )
+    if response.status == 200:
+        response.last_modified = cached.last_modified
+        response.etag = etag
+    response.headers[hdrs.VARY] = hdrs.ACCEPT_ENCODING
+    return response
+
+
+# Compresses uncached responses on the fly, aiohttp only streams gzip.
+def enable_compression(request: web.Request, response: web.StreamResponse):
+    response.headers[hdrs.VARY] = hdrs.ACCEPT_ENCODING
+    if negotiate(request.headers.get(hdrs.ACCEPT_ENCODING, ""), ["gzip"]):
+        response.enable_compression(web.ContentCoding.gzip)
@@ -1,5 +1,11 @@
 import aiohttp_jinja2
 from aiohttp import web
+from aiohttp.typedefs import Handler
+from psycopg_pool import PoolTimeout
+
+from m2rss.appkeys import config_key
+from m2rss.constants import LOGGER
+from m2rss.single_flight import OverloadedException
 
 
 async def error_response(
@@ -11,3 +17,23 @@ async def error_response(
         {"error_code": error_code, "error_message": error_message},
         status=error_code,
     )
+
+
+async def overloaded_response(request: web.Request) -> web.Response:
+    response = await error_response(request, 503, "Service temporarily overloaded.")
+    response.headers["Retry-After"] = str(request.app[config_key].feed_retry_after)
+    return response
+
+
+@web.middleware
+async def overload_middleware(
+    request: web.Request, handler: Handler
+) -> web.StreamResponse:
+    try:
+        return await handler(request)
+    except PoolTimeout as e:
+        LOGGER.warning(f"No database connection available for {request.path}: {e}")
+        return await overloaded_response(request)
+    except OverloadedException as e:
+        LOGGER.warning(f"Shedding {request.path}: {e}")
+        return await overloaded_response(request)
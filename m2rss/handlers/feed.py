@@ -1,129 +1,292 @@
-from datetime import timezone
+from collections.abc import Iterator
+from datetime import datetime
 
 import aiohttp_jinja2
 from aiohttp import web
 
-from m2rss.appkeys import config_key, pg_key
-from m2rss.data.emails import get_email, get_emails, sender_from_alias
+from m2rss.appkeys import (
+    alias_cache_key,
+    config_key,
+    feed_cache_key,
+    pg_pool_key,
+    single_flight_key,
+)
+from m2rss.data.emails import (
+    Cursor,
+    FeedRow,
+    decode_cursor,
+    encode_cursor,
+    get_feed_rows,
+    get_item,
+)
+from m2rss.feed_cache import CachedFeed
+from m2rss.fragments import (
+    RENDERER_VERSION,
+    card_fragment,
+    feed_item,
+    item_url,
+    rss_fragment,
+)
+from m2rss.handlers.cache import (
+    cached_response,
+    enable_compression,
+    is_not_modified,
+    not_modified_response,
+)
 from m2rss.handlers.error import error_response
-from m2rss.rss import RssChannel, RSSItem, make_rss
+from m2rss.rss import (
+    ATOM_SERIALIZER,
+    JSON_FEED_SERIALIZER,
+    RSS_SERIALIZER,
+    FeedSerializer,
+    RssChannel,
+    RSSItem,
+)
 
+STREAM_CHUNK_SIZE = 64 * 1024
 
-async def handle_rss_feed(request: web.Request) -> web.Response:
+
+def parse_position(request: web.Request) -> tuple[str, Cursor | None, Cursor | None]:
+    before = request.query.get("before", "")
+    after = request.query.get("after", "")
+    position = f"{request.query.get('page', 0)}/{before}/{after}"
+    return (
+        position,
+        decode_cursor(before) if before else None,
+        decode_cursor(after) if after else None,
+    )
+
+
+async def stream_feed(
+    request: web.Request,
+    chunks: Iterator[str],
+    content_type: str,
+    last_modified: datetime,
+) -> web.StreamResponse:
+    response = web.StreamResponse()
+    response.content_type = content_type
+    response.last_modified = last_modified
+    response.enable_chunked_encoding()
+    enable_compression(request, response)
+    await response.prepare(request)
+    buffer: list[str] = []
+    size = 0
+    for chunk in chunks:
+        buffer.append(chunk)
+        size += len(chunk)
+        if size >= STREAM_CHUNK_SIZE:
+            await response.write("".join(buffer).encode())
+            buffer.clear()
+            size = 0
+    await response.write("".join(buffer).encode())
+    await response.write_eof()
+    return response
+
+
+async def handle_feed(
+    request: web.Request, route: str, serializer: FeedSerializer
+) -> web.StreamResponse:
     config = request.app[config_key]
-    pg_conn = request.app[pg_key]
+    pg_pool = request.app[pg_pool_key]
     alias = request.match_info.get("alias", None)
     page = int(request.query.get("page", 0))
     count = int(request.query.get("count", 20))
     if alias is None:
         return web.Response(body="404: Not Found", status=404)
-    link_key, link_val = await sender_from_alias(config.database_url, alias)
+    link_key, link_val = request.app[alias_cache_key].get(alias)
     if link_key is None or link_val is None:
         return web.Response(body="404: Not Found", status=404)
-    emails = await get_emails(pg_conn, link_key, link_val, page, count)
-    if emails is None:
-        return web.Response(body="404: Not Found", status=404)
+    try:
+        position, before, after = parse_position(request)
+    except ValueError:
+        return web.Response(body="400: Invalid cursor", status=400)
 
-    channel = RssChannel(
-        title=link_val,
-        description=f"{link_val} mailing list",
-        link=f"{config.service_url}/page/{alias}.html",
-    )
-    rss_items = [
-        RSSItem(
-            title=email.subject,
-            author=email.from_full,
-            description=email.body,
-            guid=f"{config.service_url}/page/{alias}/{email.id}.html",
-            link=f"{config.service_url}/page/{alias}/{email.id}.html",
-            pub_date=email.date.astimezone(timezone.utc).strftime(
-                "%a, %d %b %Y %H:%M:%S %z"
-            ),
+    feed_cache = request.app[feed_cache_key]
+    cache_key = (route, alias, position, count)
+    cached = feed_cache.get(cache_key)
+    if cached is not None:
+        return await cached_response(request, cached)
+    last_modified = feed_cache.last_modified(alias)
+    if is_not_modified(request, last_modified):
+        return not_modified_response(last_modified)
+    single_flight = request.app[single_flight_key]
+
+    # RSS items are stored pre-rendered, other formats are rendered from body.
+    kind = "rss" if serializer is RSS_SERIALIZER else "text"
+
+    async def fetch_rows() -> list[FeedRow]:
+        return await get_feed_rows(
+            pg_pool,
+            link_key,
+            link_val,
+            kind,
+            RENDERER_VERSION,
+            page,
+            count,
+            before=before,
+            after=after,
         )
-        for email in emails
-    ]
-    return web.Response(
-        content_type="text/xml",
-        body=make_rss(f"{config.service_url}/rss/{alias}.xml", channel, rss_items),
-        status=200,
-    )
+
+    def serialize(rows: list[FeedRow]) -> Iterator[str]:
+        items: list[RSSItem] = []
+        rendered: list[str] | None = None
+        if kind == "rss":
+            rendered = [
+                rss_fragment(row, item_url(config.service_url, alias, row.id))
+                for row in rows
+            ]
+        else:
+            items = [
+                feed_item(
+                    row.subject,
+                    row.from_full,
+                    row.date,
+                    row.content,
+                    item_url(config.service_url, alias, row.id),
+                )
+                for row in rows
+            ]
+        feed_link = request.url.path
+        channel = RssChannel(
+            title=link_val,
+            description=f"{link_val} mailing list",
+            link=f"{config.service_url}/page/{alias}.html",
+        )
+        next_link = None
+        if len(rows) == count:
+            cursor = encode_cursor(rows[-1].date, rows[-1].id)
+            next_link = f"{config.service_url}{feed_link}?before={cursor}&count={count}"
+        return serializer.chunks(
+            f"{config.service_url}{feed_link}", channel, items, next_link, rendered
+        )
+
+    # Large feeds are streamed as they are serialized and not cached, concurrent
+    # requests only share the query.
+    if count > config.feed_stream_threshold:
+        rows = await single_flight.run(cache_key, fetch_rows)
+        return await stream_feed(
+            request, serialize(rows), serializer.content_type, last_modified
+        )
+
+    async def render() -> CachedFeed:
+        generation = feed_cache.generation(alias)
+        body = "".join(serialize(await fetch_rows())).encode()
+        return feed_cache.put(cache_key, body, serializer.content_type, generation)
+
+    return await cached_response(request, await single_flight.run(cache_key, render))
+
+
+async def handle_rss_feed(request: web.Request) -> web.StreamResponse:
+    return await handle_feed(request, "rss", RSS_SERIALIZER)
+
+
+async def handle_atom_feed(request: web.Request) -> web.StreamResponse:
+    return await handle_feed(request, "atom", ATOM_SERIALIZER)
+
+
+async def handle_json_feed(request: web.Request) -> web.StreamResponse:
+    return await handle_feed(request, "json", JSON_FEED_SERIALIZER)
 
 
 async def handle_item(request: web.Request) -> web.Response:
     config = request.app[config_key]
-    pg_conn = request.app[pg_key]
+    pg_pool = request.app[pg_pool_key]
     alias = request.match_info.get("alias", None)
     item_id = request.match_info.get("item", None)
     if alias is None:
         return await error_response(request, 404, "Empty alias")
     if item_id is None:
         return await error_response(request, 404, "Empty item")
-    link_key, link_val = await sender_from_alias(config.database_url, alias)
+    link_key, link_val = request.app[alias_cache_key].get(alias)
     if link_key is None or link_val is None:
         return await error_response(request, 404, "Unknown item.")
-    email = await get_email(pg_conn, link_key, link_val, int(item_id))
+    email = await get_item(pg_pool, link_key, link_val, int(item_id))
     if email is None:
         return await error_response(request, 404, "Unknown item.")
-    return await aiohttp_jinja2.render_template_async(
+    response = await aiohttp_jinja2.render_template_async(
         "item.html",
         request,
         {
             "item_id": item_id,
             "feed_name": link_val,
             "feed_alias": alias,
-            "item": RSSItem(
-                title=email.subject,
-                description=email.formatted_body,
-                guid=f"{config.service_url}/page/{alias}/{email.id}.html",
-                pub_date=email.date.astimezone(timezone.utc).strftime(
-                    "%a, %d %b %Y %H:%M:%S %z"
-                ),
-                author=email.from_full,
+            "item": feed_item(
+                email.subject,
+                email.from_full,
+                email.date,
+                email.formatted_body,
+                item_url(config.service_url, alias, email.id),
             ),
         },
     )
+    enable_compression(request, response)
+    return response
 
 
 async def handle_page(request: web.Request) -> web.Response:
     config = request.app[config_key]
-    pg_conn = request.app[pg_key]
+    pg_pool = request.app[pg_pool_key]
     alias = request.match_info.get("alias", None)
     page = int(request.query.get("page", 0))
     count = int(request.query.get("count", 20))
     if alias is None:
         return await error_response(request, 404, "Empty alias")
-    link_key, link_val = await sender_from_alias(config.database_url, alias)
+    link_key, link_val = request.app[alias_cache_key].get(alias)
     if link_key is None or link_val is None:
         return await error_response(request, 404, "Unknown item.")
-    emails = await get_emails(pg_conn, link_key, link_val, page, count)
-    if emails is None:
-        return await error_response(request, 404, "Unknown alias.")
     if page < 0:
         return await error_response(request, 404, "Page should be positive.")
-    data = {
-        "feed_name": link_val,
-        "page_num": page + 1,
-        "items": [
-            RSSItem(
-                title=email.subject,
-                description=email.formatted_body,
-                guid=f"{config.service_url}/page/{alias}/{email.id}.html",
-                pub_date=email.date.astimezone(timezone.utc).strftime(
-                    "%a, %d %b %Y %H:%M:%S %z"
-                ),
-                author=email.from_full,
-            )
-            for email in emails
-        ],
-    }
-    if page > 0:
-        data["next_link"] = (
-            f"{config.service_url}/page/{alias}.html?page={page - 1}&count={count}"
+    try:
+        position, before, after = parse_position(request)
+    except ValueError:
+        return await error_response(request, 400, "Invalid cursor.")
+
+    feed_cache = request.app[feed_cache_key]
+    cache_key = ("page", alias, position, count)
+    cached = feed_cache.get(cache_key)
+    if cached is not None:
+        return await cached_response(request, cached)
+    last_modified = feed_cache.last_modified(alias)
+    if is_not_modified(request, last_modified):
+        return not_modified_response(last_modified)
+
+    async def render() -> CachedFeed:
+        generation = feed_cache.generation(alias)
+        rows = await get_feed_rows(
+            pg_pool,
+            link_key,
+            link_val,
+            "html",
+            RENDERER_VERSION,
+            page,
+            count,
+            before=before,
+            after=after,
         )
-    else:
+        data = {
+            "feed_name": link_val,
+            "page_num": page + 1,
+            "cards": [
+                card_fragment(row, item_url(config.service_url, alias, row.id))
+                for row in rows
+            ],
+        }
+        page_link = f"{config.service_url}/page/{alias}.html"
         data["next_link"] = None
-    data["prev_link"] = (
-        f"{config.service_url}/page/{alias}.html?page={page + 1}&count={count}"
-    )
+        data["prev_link"] = None
+        is_first_page = after is not None and len(rows) < count
+        if rows and (page > 0 or before is not None) and not is_first_page:
+            cursor = encode_cursor(rows[0].date, rows[0].id)
+            data["next_link"] = (
+                f"{page_link}?after={cursor}&page={max(page - 1, 0)}&count={count}"
+            )
+        if len(rows) == count:
+            cursor = encode_cursor(rows[-1].date, rows[-1].id)
+            data["prev_link"] = (
+                f"{page_link}?before={cursor}&page={page + 1}&count={count}"
+            )
+        body = await aiohttp_jinja2.render_string_async("feed.html", request, data)
+        return feed_cache.put(cache_key, body.encode(), "text/html", generation)
 
-    return await aiohttp_jinja2.render_template_async("feed.html", request, data)
+    single_flight = request.app[single_flight_key]
+    return await cached_response(request, await single_flight.run(cache_key, render))
@@ -0,0 +1,143 @@
+from collections.abc import Iterator
+
+from aiohttp import web
+
+from m2rss.appkeys import (
+    config_key,
+    feed_cache_key,
+    group_cache_key,
+    pg_pool_key,
+    single_flight_key,
+)
+from m2rss.data.emails import FeedRow, encode_cursor, get_group_rows
+from m2rss.data.groups import group_key
+from m2rss.feed_cache import CachedFeed
+from m2rss.fragments import RENDERER_VERSION, feed_item, item_url, rss_fragment
+from m2rss.handlers.cache import (
+    cached_response,
+    is_not_modified,
+    not_modified_response,
+)
+from m2rss.handlers.feed import parse_position, stream_feed
+from m2rss.rss import (
+    ATOM_SERIALIZER,
+    JSON_FEED_SERIALIZER,
+    RSS_SERIALIZER,
+    FeedSerializer,
+    RssChannel,
+    RSSItem,
+)
+
+GroupRow = tuple[FeedRow, str]
+
+
+# Same as handle_feed over the aliases of a group, items link to the page of
+# the alias they were found under.
+async def handle_group_feed(
+    request: web.Request, route: str, serializer: FeedSerializer
+) -> web.StreamResponse:
+    config = request.app[config_key]
+    pg_pool = request.app[pg_pool_key]
+    name = request.match_info.get("name", None)
+    page = int(request.query.get("page", 0))
+    count = int(request.query.get("count", 20))
+    if name is None:
+        return web.Response(body="404: Not Found", status=404)
+    links = request.app[group_cache_key].get(name)
+    if links is None:
+        return web.Response(body="404: Not Found", status=404)
+    try:
+        position, before, after = parse_position(request)
+    except ValueError:
+        return web.Response(body="400: Invalid cursor", status=400)
+
+    feed_cache = request.app[feed_cache_key]
+    key = group_key(name)
+    cache_key = (route, key, position, count)
+    cached = feed_cache.get(cache_key)
+    if cached is not None:
+        return await cached_response(request, cached)
+    last_modified = feed_cache.last_modified(key)
+    if is_not_modified(request, last_modified):
+        return not_modified_response(last_modified)
+    single_flight = request.app[single_flight_key]
+
+    kind = "rss" if serializer is RSS_SERIALIZER else "text"
+
+    async def fetch_rows() -> list[GroupRow]:
+        return await get_group_rows(
+            pg_pool,
+            links,
+            kind,
+            RENDERER_VERSION,
+            page,
+            count,
+            before=before,
+            after=after,
+        )
+
+    def serialize(rows: list[GroupRow]) -> Iterator[str]:
+        items: list[RSSItem] = []
+        rendered: list[str] | None = None
+        if kind == "rss":
+            rendered = [
+                rss_fragment(row, item_url(config.service_url, alias, row.id))
+                for row, alias in rows
+            ]
+        else:
+            items = [
+                feed_item(
+                    row.subject,
+                    row.from_full,
+                    row.date,
+                    row.content,
+                    item_url(config.service_url, alias, row.id),
+                )
+                for row, alias in rows
+            ]
+        feed_link = request.url.path
+        channel = RssChannel(
+            title=name,
+            description=", ".join(alias for alias, _, _ in links),
+            link=f"{config.service_url}{feed_link}",
+        )
+        next_link = None
+        if len(rows) == count:
+            last, _ = rows[-1]
+            cursor = encode_cursor(last.date, last.id)
+            next_link = f"{config.service_url}{feed_link}?before={cursor}&count={count}"
+        return serializer.chunks(
+            f"{config.service_url}{feed_link}", channel, items, next_link, rendered
+        )
+
+    if count > config.feed_stream_threshold:
+        rows = await single_flight.run(cache_key, fetch_rows)
+        return await stream_feed(
+            request, serialize(rows), serializer.content_type, last_modified
+        )
+
+    async def render() -> CachedFeed:
+        generation = feed_cache.generation(key)
+        body = "".join(serialize(await fetch_rows())).encode()
+        return feed_cache.put(cache_key, body, serializer.content_type, generation)
+
+    return await cached_response(request, await single_flight.run(cache_key, render))
+
+
+async def handle_group_rss_feed(request: web.Request) -> web.StreamResponse:
+    return await handle_group_feed(request, "group-rss", RSS_SERIALIZER)
+
+
+async def handle_group_atom_feed(request: web.Request) -> web.StreamResponse:
+    return await handle_group_feed(request, "group-atom", ATOM_SERIALIZER)
+
+
+async def handle_group_json_feed(request: web.Request) -> web.StreamResponse:
+    return await handle_group_feed(request, "group-json", JSON_FEED_SERIALIZER)
+
+
+__all__ = [
+    "handle_group_atom_feed",
+    "handle_group_json_feed",
+    "handle_group_rss_feed",
+]
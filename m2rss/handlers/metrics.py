@@ -0,0 +1,227 @@
+import asyncio
+import time
+from collections.abc import Iterable
+
+from aiohttp import web
+from aiohttp.typedefs import Handler
+
+from m2rss.appkeys import (
+    feed_cache_key,
+    mailbox_health_key,
+    pg_pool_key,
+    search_cache_key,
+    single_flight_key,
+)
+from m2rss.data.pool import pool_stats
+from m2rss.metrics import (
+    HTTP_REQUEST_SECONDS,
+    HTTP_RESPONSES,
+    REGISTRY,
+    family,
+    format_labels,
+    format_value,
+)
+
+# Status recorded when the client disconnects before the response, as nginx.
+CLIENT_CLOSED_REQUEST = 499
+
+
+@web.middleware
+async def metrics_middleware(
+    request: web.Request, handler: Handler
+) -> web.StreamResponse:
+    start = time.perf_counter()
+    status = 500
+    try:
+        response = await handler(request)
+        status = response.status
+        return response
+    except web.HTTPException as e:
+        status = e.status
+        raise
+    except asyncio.CancelledError:
+        status = CLIENT_CLOSED_REQUEST
+        raise
+    finally:
+        resource = request.match_info.route.resource
+        route = "unmatched" if resource is None else resource.canonical
+        HTTP_REQUEST_SECONDS.observe(time.perf_counter() - start, route)
+        HTTP_RESPONSES.inc(route, str(status))
+
+
+def gauge(name: str, help: str, value: float) -> str:
+    return family(name, "gauge", help, [f"{name} {format_value(value)}\n"])
+
+
+def counter(name: str, help: str, value: float) -> str:
+    return family(name, "counter", help, [f"{name} {format_value(value)}\n"])
+
+
+def labelled(
+    name: str, kind: str, help: str, values: Iterable[tuple[tuple[str, ...], float]]
+) -> str:
+    return family(
+        name,
+        kind,
+        help,
+        [
+            f"{name}{format_labels(('account', 'folder'), labels)} "
+            f"{format_value(value)}\n"
+            for labels, value in values
+        ],
+    )
+
+
+# Values read from the objects of the app at scrape time, the watch process
+# only has a pool.
+def app_metrics(app: web.Application) -> Iterable[str]:
+    pool = app.get(pg_pool_key)
+    if pool is not None:
+        stats = pool_stats(pool)
+        yield gauge(
+            "m2rss_db_pool_size", "Open connections.", stats.get("pool_size", 0)
+        )
+        yield gauge(
+            "m2rss_db_pool_available",
+            "Idle connections.",
+            stats.get("pool_available", 0),
+        )
+        yield gauge(
+            "m2rss_db_pool_max_size", "Maximum connections.", stats.get("pool_max", 0)
+        )
+        yield gauge(
+            "m2rss_db_pool_requests_waiting",
+            "Clients waiting for a connection.",
+            stats.get("requests_waiting", 0),
+        )
+        yield counter(
+            "m2rss_db_pool_requests_total",
+            "Connections requested.",
+            stats.get("requests_num", 0),
+        )
+        yield counter(
+            "m2rss_db_pool_requests_queued_total",
+            "Connection requests that had to wait.",
+            stats.get("requests_queued", 0),
+        )
+        yield counter(
+            "m2rss_db_pool_wait_seconds_total",
+            "Time spent waiting for a connection.",
+            stats.get("requests_wait_ms", 0) / 1000,
+        )
+        yield counter(
+            "m2rss_db_pool_timeouts_total",
+            "Connection requests that timed out.",
+            stats.get("requests_errors", 0),
+        )
+
+    feed_cache = app.get(feed_cache_key)
+    if feed_cache is not None:
+        yield counter(
+            "m2rss_feed_cache_hits_total", "Feed cache hits.", feed_cache.hits
+        )
+        yield counter(
+            "m2rss_feed_cache_misses_total", "Feed cache misses.", feed_cache.misses
+        )
+        yield gauge(
+            "m2rss_feed_cache_entries", "Cached feeds.", len(feed_cache.entries)
+        )
+        yield gauge(
+            "m2rss_feed_cache_bytes",
+            "Size of the cached feeds, compressed ones included.",
+            feed_cache.size,
+        )
+
+    search_cache = app.get(search_cache_key)
+    if search_cache is not None:
+        yield counter(
+            "m2rss_search_cache_hits_total", "Search cache hits.", search_cache.hits
+        )
+        yield counter(
+            "m2rss_search_cache_misses_total",
+            "Search cache misses.",
+            search_cache.misses,
+        )
+        yield gauge(
+            "m2rss_search_cache_entries",
+            "Cached searches.",
+            len(search_cache.entries),
+        )
+        yield gauge(
+            "m2rss_search_cache_bytes",
+            "Size of the cached searches, compressed ones included.",
+            search_cache.size,
+        )
+
+    single_flight = app.get(single_flight_key)
+    if single_flight is not None:
+        yield counter(
+            "m2rss_feed_renders_coalesced_total",
+            "Requests that joined a render or compression in flight.",
+            single_flight.coalesced,
+        )
+        yield counter(
+            "m2rss_feed_renders_shed_total",
+            "Requests refused with 503 because too many renders were queued.",
+            single_flight.shed,
+        )
+        yield gauge(
+            "m2rss_feed_renders_in_flight",
+            "Renders and compressions running or queued.",
+            len(single_flight.flights),
+        )
+
+    mailboxes = app.get(mailbox_health_key)
+    if mailboxes:
+        labels = [(health.account, health.folder) for health in mailboxes]
+        yield labelled(
+            "m2rss_mailbox_connected",
+            "gauge",
+            "Whether the IMAP session of the folder is open.",
+            zip(labels, [health.connected for health in mailboxes]),
+        )
+        yield labelled(
+            "m2rss_mailbox_failures",
+            "gauge",
+            "Failed sessions since the last successful sync.",
+            zip(labels, [health.failures for health in mailboxes]),
+        )
+        yield labelled(
+            "m2rss_mailbox_errors_total",
+            "counter",
+            "Failed sessions.",
+            zip(labels, [health.errors for health in mailboxes]),
+        )
+        yield labelled(
+            "m2rss_mailbox_messages_total",
+            "counter",
+            "Emails stored from the folder.",
+            zip(labels, [health.messages for health in mailboxes]),
+        )
+        yield labelled(
+            "m2rss_mailbox_last_sync_timestamp_seconds",
+            "gauge",
+            "End of the last successful sync.",
+            [
+                (label, health.last_sync.timestamp())
+                for label, health in zip(labels, mailboxes)
+                if health.last_sync is not None
+            ],
+        )
+
+
+async def handle_metrics(request: web.Request) -> web.Response:
+    body = REGISTRY.render() + "".join(app_metrics(request.app))
+    return web.Response(text=body, content_type="text/plain", charset="utf-8")
+
+
+# Health of the watched folders, 503 while any of them is failing.
+async def handle_mailbox_health(request: web.Request) -> web.Response:
+    mailboxes = request.app.get(mailbox_health_key, [])
+    return web.json_response(
+        [health.model_dump(mode="json") for health in mailboxes],
+        status=200 if all(health.healthy for health in mailboxes) else 503,
+    )
+
+
+__all__ = ["handle_mailbox_health", "handle_metrics", "metrics_middleware"]
@@ -0,0 +1,193 @@
+from collections.abc import Awaitable, Callable
+from urllib.parse import urlencode
+
+import aiohttp_jinja2
+from aiohttp import web
+
+from m2rss.appkeys import (
+    alias_cache_key,
+    config_key,
+    pg_pool_key,
+    search_cache_key,
+    single_flight_key,
+)
+from m2rss.data.emails import (
+    FeedRow,
+    SearchPage,
+    decode_cursor,
+    decode_search_cursor,
+    encode_cursor,
+    encode_search_cursor,
+    search_feed_rows,
+)
+from m2rss.feed_cache import CachedFeed
+from m2rss.fragments import RENDERER_VERSION, card_fragment, item_url, rss_fragment
+from m2rss.handlers.cache import (
+    cached_response,
+    is_not_modified,
+    not_modified_response,
+)
+from m2rss.handlers.error import error_response
+from m2rss.rss import RSS_SERIALIZER, RssChannel
+
+MAX_QUERY_LENGTH = 256
+MAX_COUNT = 100
+
+# Renders the matches of (alias, feed name, query, rows, page path, next page
+# path, older matches path) into a body and its content type.
+SearchRenderer = Callable[
+    [str, str, str, list[FeedRow], str, str | None, str | None],
+    Awaitable[tuple[str, str]],
+]
+
+
+def search_path(path: str, **params: str | int) -> str:
+    return f"{path}?{urlencode({k: v for k, v in params.items() if v})}"
+
+
+# Links of a results page: itself, the next one and, when older matches were
+# not ranked, the search before the oldest ranked match. Past the last page of
+# ranked matches, the next page is the older search.
+def search_links(
+    path: str, query: str, count: int, until: str, before: str, page: SearchPage
+) -> tuple[str, str | None, str | None]:
+    self_link = search_path(path, q=query, until=until, before=before, count=count)
+    older_link = None
+    if page.older is not None:
+        older = encode_cursor(*page.older)
+        older_link = search_path(path, q=query, until=older, count=count)
+    next_link = older_link
+    if page.more:
+        row, rank = page.matches[-1]
+        next_cursor = encode_search_cursor(rank, row.date, row.id)
+        next_link = search_path(
+            path, q=query, until=until, before=next_cursor, count=count
+        )
+    return self_link, next_link, older_link
+
+
+# Search results are cached apart from the feeds, in a smaller cache, and are
+# invalidated with the feeds of the alias when new emails arrive.
+async def handle_search(
+    request: web.Request, route: str, kind: str, render_body: SearchRenderer
+) -> web.Response:
+    alias = request.match_info.get("alias", None)
+    query = request.query.get("q", "").strip()
+    before = request.query.get("before", "")
+    until = request.query.get("until", "")
+    count = min(int(request.query.get("count", 20)), MAX_COUNT)
+    if alias is None:
+        return await error_response(request, 404, "Empty alias")
+    link_key, link_val = request.app[alias_cache_key].get(alias)
+    if link_key is None or link_val is None:
+        return await error_response(request, 404, "Unknown item.")
+    if not query:
+        return await error_response(request, 400, "Missing search query.")
+    if len(query) > MAX_QUERY_LENGTH:
+        return await error_response(request, 400, "Search query too long.")
+    if count <= 0:
+        return await error_response(request, 400, "Count should be positive.")
+    try:
+        cursor = decode_search_cursor(before) if before else None
+        window = decode_cursor(until) if until else None
+    except ValueError:
+        return await error_response(request, 400, "Invalid cursor.")
+
+    search_cache = request.app[search_cache_key]
+    cache_key = (route, alias, f"{until}/{before}/{query}", count)
+    cached = search_cache.get(cache_key)
+    if cached is not None:
+        return await cached_response(request, cached, search_cache_key)
+    last_modified = search_cache.last_modified(alias)
+    if is_not_modified(request, last_modified):
+        return not_modified_response(last_modified)
+
+    async def render() -> CachedFeed:
+        generation = search_cache.generation(alias)
+        page = await search_feed_rows(
+            request.app[pg_pool_key],
+            link_key,
+            link_val,
+            kind,
+            RENDERER_VERSION,
+            query,
+            count,
+            before=cursor,
+            max_matches=request.app[config_key].search_max_matches,
+            until=window,
+        )
+        self_link, next_link, older_link = search_links(
+            request.url.path, query, count, until, before, page
+        )
+        rows = [row for row, _ in page.matches]
+        body, content_type = await render_body(
+            alias, link_val, query, rows, self_link, next_link, older_link
+        )
+        return search_cache.put(cache_key, body.encode(), content_type, generation)
+
+    single_flight = request.app[single_flight_key]
+    searched = await single_flight.run(cache_key, render)
+    return await cached_response(request, searched, search_cache_key)
+
+
+async def handle_search_feed(request: web.Request) -> web.Response:
+    service_url = request.app[config_key].service_url
+
+    async def render_body(
+        alias: str,
+        name: str,
+        query: str,
+        rows: list[FeedRow],
+        self_link: str,
+        next_link: str | None,
+        older_link: str | None,
+    ) -> tuple[str, str]:
+        channel = RssChannel(
+            title=f"{name}: {query}",
+            description=f"Search results for {query} in the {name} mailing list",
+            link=f"{service_url}/search/{alias}.html?{urlencode({'q': query})}",
+        )
+        rendered = [
+            rss_fragment(row, item_url(service_url, alias, row.id)) for row in rows
+        ]
+        # Feed readers reach the older matches through next_link.
+        if next_link is not None:
+            next_link = f"{service_url}{next_link}"
+        chunks = RSS_SERIALIZER.chunks(
+            f"{service_url}{self_link}", channel, [], next_link, rendered
+        )
+        return "".join(chunks), RSS_SERIALIZER.content_type
+
+    return await handle_search(request, "search-rss", "rss", render_body)
+
+
+async def handle_search_page(request: web.Request) -> web.Response:
+    service_url = request.app[config_key].service_url
+
+    async def render_body(
+        alias: str,
+        name: str,
+        query: str,
+        rows: list[FeedRow],
+        self_link: str,
+        next_link: str | None,
+        older_link: str | None,
+    ) -> tuple[str, str]:
+        data = {
+            "feed_name": name,
+            "feed_alias": alias,
+            "query": query,
+            "cards": [
+                card_fragment(row, item_url(service_url, alias, row.id)) for row in rows
+            ],
+            "next_link": None if next_link is None else f"{service_url}{next_link}",
+            "older_link": None if older_link is None else f"{service_url}{older_link}",
+            "max_matches": request.app[config_key].search_max_matches,
+        }
+        body = await aiohttp_jinja2.render_string_async("search.html", request, data)
+        return body, "text/html"
+
+    return await handle_search(request, "search-page", "html", render_body)
+
+
+__all__ = ["handle_search_feed", "handle_search_page"]
@@ -0,0 +1,225 @@
+import asyncio
+import re
+import ssl
+from collections.abc import Iterable
+
+from pydantic import BaseModel
+
+LITERAL_PATTERN = re.compile(rb"\{(\d+)\}\r\n$")
+UID_PATTERN = re.compile(rb"UID (\d+)")
+UIDVALIDITY_PATTERN = re.compile(rb"\[UIDVALIDITY (\d+)\]")
+EXISTS_PATTERN = re.compile(rb"^\* \d+ EXISTS")
+FETCH_PATTERN = re.compile(rb"^\* \d+ FETCH")
+
+
+class ImapError(Exception):
+    pass
+
+
+class ImapResponse(BaseModel):
+    line: bytes
+    literals: list[bytes] = []
+
+
+def uid_set(uids: Iterable[int]) -> str:
+    ranges: list[str] = []
+    start = end = None
+    for uid in sorted(uids):
+        if end is not None and uid == end + 1:
+            end = uid
+            continue
+        if start is not None:
+            ranges.append(str(start) if start == end else f"{start}:{end}")
+        start = end = uid
+    if start is not None:
+        ranges.append(str(start) if start == end else f"{start}:{end}")
+    return ",".join(ranges)
+
+
+def quote(value: str) -> str:
+    return '"' + value.replace("\\", "\\\\").replace('"', '\\"') + '"'
+
+
+class ImapClient:
+    def __init__(
+        self, host: str, port: int, starttls: bool = True, timeout: float = 60.0
+    ):
+        self.host = host
+        self.port = port
+        self.starttls = starttls
+        self.timeout = timeout
+        self.tag_counter = 0
+        self.lock = asyncio.Lock()
+        self.capabilities: set[str] = set()
+        # Set by any EXISTS, servers may send it in the response to any command.
+        self.exists = False
+        self.reader: asyncio.StreamReader | None = None
+        self.writer: asyncio.StreamWriter | None = None
+
+    async def __aenter__(self) -> "ImapClient":
+        await self.connect()
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    async def connect(self):
+        self.reader, writer = await asyncio.wait_for(
+            asyncio.open_connection(self.host, self.port, limit=2**20), self.timeout
+        )
+        self.writer = writer
+        greeting = await self.read_response()
+        if not greeting.line.startswith(b"* OK"):
+            raise ImapError(f"Unexpected IMAP greeting: {greeting.line!r}")
+        if self.starttls:
+            await self.command("STARTTLS")
+            await writer.start_tls(
+                ssl.create_default_context(), server_hostname=self.host
+            )
+
+    async def close(self):
+        if self.writer is None:
+            return
+        try:
+            await asyncio.wait_for(self.command("LOGOUT"), self.timeout)
+        except (ImapError, OSError, TimeoutError, asyncio.IncompleteReadError):
+            pass
+        self.writer.close()
+        self.writer = None
+
+    def next_tag(self) -> bytes:
+        self.tag_counter += 1
+        return f"M{self.tag_counter}".encode()
+
+    async def send(self, line: bytes):
+        assert self.writer is not None
+        self.writer.write(line + b"\r\n")
+        await self.writer.drain()
+
+    async def read_response(self) -> ImapResponse:
+        assert self.reader is not None
+        line = await self.reader.readuntil(b"\r\n")
+        parts = [line]
+        literals: list[bytes] = []
+        while (match := LITERAL_PATTERN.search(line)) is not None:
+            literals.append(await self.reader.readexactly(int(match.group(1))))
+            line = await self.reader.readuntil(b"\r\n")
+            parts.append(line)
+        if EXISTS_PATTERN.match(parts[0]) is not None:
+            self.exists = True
+        return ImapResponse(line=b"".join(parts), literals=literals)
+
+    async def read_until_tagged(self, tag: bytes) -> list[ImapResponse]:
+        untagged: list[ImapResponse] = []
+        while True:
+            response = await self.read_response()
+            if not response.line.startswith(tag + b" "):
+                untagged.append(response)
+                continue
+            status = response.line.split(b" ", 2)[1]
+            if status != b"OK":
+                raise ImapError(f"IMAP command failed: {response.line!r}")
+            return untagged
+
+    async def command(self, *args: str) -> list[ImapResponse]:
+        async with self.lock:
+            tag = self.next_tag()
+            await self.send(tag + b" " + " ".join(args).encode())
+            return await asyncio.wait_for(self.read_until_tagged(tag), self.timeout)
+
+    async def login(self, user: str, password: str):
+        await self.command("LOGIN", quote(user), quote(password))
+        for response in await self.command("CAPABILITY"):
+            if response.line.startswith(b"* CAPABILITY "):
+                self.capabilities.update(response.line.decode().split()[2:])
+
+    # Whether EXISTS was received since the last call.
+    def take_exists(self) -> bool:
+        exists, self.exists = self.exists, False
+        return exists
+
+    # IDLE (RFC 2177) for at most `timeout` sec, returns whether EXISTS was sent
+    # since the last call. Messages announced during the previous commands are
+    # returned without idling, so that they are not left until the timeout.
+    async def idle(self, timeout: float) -> bool:
+        if self.take_exists():
+            return True
+        tag = self.next_tag()
+        await self.send(tag + b" IDLE")
+        response = await asyncio.wait_for(self.read_response(), self.timeout)
+        while not response.line.startswith(b"+"):
+            if response.line.startswith(tag + b" "):
+                raise ImapError(f"IDLE refused: {response.line!r}")
+            response = await asyncio.wait_for(self.read_response(), self.timeout)
+
+        try:
+            async with asyncio.timeout(timeout):
+                while not self.exists:
+                    await self.read_response()
+        except TimeoutError:
+            pass
+        await self.send(b"DONE")
+        await asyncio.wait_for(self.read_until_tagged(tag), self.timeout)
+        return self.take_exists()
+
+
+class MailboxSync:
+    def __init__(self, client: ImapClient, mailbox: str = "INBOX"):
+        self.client = client
+        self.mailbox = mailbox
+
+    # The EXISTS of SELECT is covered by the sync that follows it.
+    async def select(self) -> int:
+        responses = await self.client.command("SELECT", quote(self.mailbox))
+        self.client.take_exists()
+        for response in responses:
+            match = UIDVALIDITY_PATTERN.search(response.line)
+            if match is not None:
+                return int(match.group(1))
+        raise ImapError(f"Server did not send UIDVALIDITY for {self.mailbox}")
+
+    async def new_uids(self, last_uid: int) -> list[int]:
+        uids: list[int] = []
+        for response in await self.client.command(
+            "UID", "SEARCH", "UID", f"{last_uid + 1}:*"
+        ):
+            if response.line.startswith(b"* SEARCH"):
+                uids.extend(map(int, response.line.split()[2:]))
+        # "n:*" always matches the last message, even when its UID is below n.
+        return sorted(uid for uid in uids if uid > last_uid)
+
+    async def fetch(self, uids: Iterable[int]) -> list[tuple[int, bytes]]:
+        messages: list[tuple[int, bytes]] = []
+        for response in await self.client.command(
+            "UID", "FETCH", uid_set(uids), "(RFC822)"
+        ):
+            if FETCH_PATTERN.match(response.line) is None or not response.literals:
+                continue
+            match = UID_PATTERN.search(response.line)
+            if match is not None:
+                messages.append((int(match.group(1)), response.literals[0]))
+        return messages
+
+    async def delete(self, uids: Iterable[int]):
+        sequence = uid_set(uids)
+        if sequence:
+            await self.client.command(
+                "UID", "STORE", sequence, "+FLAGS.SILENT", "(\\Deleted)"
+            )
+
+    async def expunge(self):
+        await self.client.command("EXPUNGE")
+
+
+class Backoff:
+    def __init__(self, initial: float = 1.0, maximum: float = 300.0):
+        self.initial = initial
+        self.maximum = maximum
+        self.delay = initial
+
+    def reset(self):
+        self.delay = self.initial
+
+    async def wait(self):
+        await asyncio.sleep(self.delay)
+        self.delay = min(self.delay * 2, self.maximum)
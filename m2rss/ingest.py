@@ -0,0 +1,153 @@
+import asyncio
+import multiprocessing
+import os
+import time
+from collections.abc import Awaitable, Callable, Iterable
+from concurrent.futures import Executor, ProcessPoolExecutor
+from itertools import batched
+from typing import Protocol
+
+from pydantic import BaseModel
+
+from m2rss.config import Config
+from m2rss.constants import LOGGER
+from m2rss.data.emails import Email
+from m2rss.metrics import IMAP_MESSAGES, IMAP_STAGE_SECONDS
+from m2rss.parsing import parse_messages
+
+StoreEmails = Callable[[list[Email]], Awaitable[None]]
+Checkpoint = Callable[[int], Awaitable[None]]
+
+Fetched = tuple[list[int], list[tuple[int, bytes]]]
+Parsed = tuple[list[int], list[tuple[int, Email]]]
+
+
+# A mailbox (MailboxSync) or an archive, stored messages are deleted from it.
+class MessageSource(Protocol):
+    async def fetch(self, uids: Iterable[int]) -> list[tuple[int, bytes]]: ...
+
+    async def delete(self, uids: Iterable[int]): ...
+
+
+class IngestStats(BaseModel):
+    messages: int = 0
+    failed: int = 0
+    seconds: float = 0.0
+
+    @property
+    def rate(self) -> float:
+        return self.messages / self.seconds if self.seconds > 0 else 0.0
+
+
+def ingest_workers(config: Config) -> int:
+    return config.ingest_workers or os.cpu_count() or 1
+
+
+def make_executor(config: Config) -> ProcessPoolExecutor:
+    return ProcessPoolExecutor(
+        ingest_workers(config), mp_context=multiprocessing.get_context("spawn")
+    )
+
+
+# fetch -> parse -> store stages joined by bounded queues of UID batches. The
+# store stage runs batches in order so that a checkpoint covers every UID below.
+class IngestPipeline:
+    def __init__(
+        self,
+        executor: Executor,
+        workers: int,
+        email_addr: str,
+        batch_size: int,
+        queue_size: int,
+        store: StoreEmails,
+        checkpoint: Checkpoint,
+    ):
+        self.executor = executor
+        self.workers = workers
+        self.email_addr = email_addr
+        self.batch_size = batch_size
+        self.queue_size = queue_size
+        self.store = store
+        self.checkpoint = checkpoint
+
+    async def run(self, sync: MessageSource, uids: list[int]) -> IngestStats:
+        stats = IngestStats()
+        start = time.perf_counter()
+        parse_queue: asyncio.Queue[Fetched | None] = asyncio.Queue(self.queue_size)
+        store_queue: asyncio.Queue[Parsed | None] = asyncio.Queue(self.queue_size)
+        async with asyncio.TaskGroup() as group:
+            group.create_task(self.fetch_stage(sync, uids, parse_queue))
+            group.create_task(self.parse_stage(parse_queue, store_queue, stats))
+            group.create_task(self.store_stage(sync, store_queue, stats))
+        stats.seconds = time.perf_counter() - start
+        return stats
+
+    async def fetch_stage(
+        self,
+        sync: MessageSource,
+        uids: list[int],
+        parse_queue: asyncio.Queue[Fetched | None],
+    ):
+        for batch in batched(uids, self.batch_size):
+            start = time.perf_counter()
+            messages = await sync.fetch(batch)
+            IMAP_STAGE_SECONDS.observe(time.perf_counter() - start, "fetch")
+            IMAP_MESSAGES.inc("fetched", amount=len(messages))
+            await parse_queue.put((list(batch), messages))
+        await parse_queue.put(None)
+
+    async def parse_stage(
+        self,
+        parse_queue: asyncio.Queue[Fetched | None],
+        store_queue: asyncio.Queue[Parsed | None],
+        stats: IngestStats,
+    ):
+        loop = asyncio.get_running_loop()
+        while (fetched := await parse_queue.get()) is not None:
+            uids, messages = fetched
+            start = time.perf_counter()
+            chunk_size = max(1, -(-len(messages) // self.workers))
+            results = await asyncio.gather(
+                *[
+                    loop.run_in_executor(
+                        self.executor, parse_messages, self.email_addr, list(chunk)
+                    )
+                    for chunk in batched(messages, chunk_size)
+                ]
+            )
+            IMAP_STAGE_SECONDS.observe(time.perf_counter() - start, "parse")
+            parsed: list[tuple[int, Email]] = []
+            for uid, mail, error in (item for result in results for item in result):
+                if mail is None:
+                    stats.failed += 1
+                    IMAP_MESSAGES.inc("skipped")
+                    LOGGER.warning(f"Could not parse email {uid}, skipping: {error}")
+                else:
+                    parsed.append((uid, mail))
+            await store_queue.put((uids, parsed))
+        await store_queue.put(None)
+
+    async def store_stage(
+        self,
+        sync: MessageSource,
+        store_queue: asyncio.Queue[Parsed | None],
+        stats: IngestStats,
+    ):
+        while (batch := await store_queue.get()) is not None:
+            uids, parsed = batch
+            start = time.perf_counter()
+            await self.store([mail for _, mail in parsed])
+            await sync.delete(uid for uid, _ in parsed)
+            await self.checkpoint(max(uids))
+            IMAP_STAGE_SECONDS.observe(time.perf_counter() - start, "store")
+            IMAP_MESSAGES.inc("stored", amount=len(parsed))
+            stats.messages += len(parsed)
+
+
+__all__ = [
+    "IngestPipeline",
+    "IngestStats",
+    "MessageSource",
+    "ingest_workers",
+    "make_executor",
+]
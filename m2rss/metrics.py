@@ -0,0 +1,188 @@
+import time
+from abc import ABC, abstractmethod
+from bisect import bisect_left
+from collections.abc import Awaitable, Callable, Iterable
+from functools import wraps
+from typing import ParamSpec, TypeVar
+
+P = ParamSpec("P")
+T = TypeVar("T")
+
+LATENCY_BUCKETS = (
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+)
+
+
+def escape_label(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def format_labels(names: Iterable[str], values: Iterable[str]) -> str:
+    pairs = [f'{name}="{escape_label(value)}"' for name, value in zip(names, values)]
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def format_value(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+def family(name: str, kind: str, help: str, samples: Iterable[str]) -> str:
+    return "".join([f"# HELP {name} {help}\n# TYPE {name} {kind}\n", *samples])
+
+
+class Registry:
+    def __init__(self):
+        self.enabled = True
+        self.metrics: list["Metric"] = []
+
+    def render(self) -> str:
+        return "".join(metric.render() for metric in self.metrics)
+
+
+REGISTRY = Registry()
+
+
+# Metrics known when the process starts, values read at scrape time (pool,
+# caches) are rendered by the /metrics handler.
+class Metric(ABC):
+    kind = "untyped"
+
+    def __init__(self, name: str, help: str, labels: tuple[str, ...] = ()):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        REGISTRY.metrics.append(self)
+
+    @abstractmethod
+    def samples(self) -> Iterable[str]: ...
+
+    def render(self) -> str:
+        return family(self.name, self.kind, self.help, self.samples())
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labels: tuple[str, ...] = ()):
+        super().__init__(name, help, labels)
+        self.values: dict[tuple[str, ...], float] = {}
+
+    def inc(self, *labels: str, amount: float = 1):
+        if REGISTRY.enabled:
+            self.values[labels] = self.values.get(labels, 0) + amount
+
+    def samples(self) -> Iterable[str]:
+        for labels, value in sorted(self.values.items()):
+            yield (
+                f"{self.name}{format_labels(self.labels, labels)} "
+                f"{format_value(value)}\n"
+            )
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        help: str,
+        labels: tuple[str, ...] = (),
+        buckets: tuple[float, ...] = LATENCY_BUCKETS,
+    ):
+        super().__init__(name, help, labels)
+        self.buckets = buckets
+        self.bounds = [*map(format_value, buckets), "+Inf"]
+        # Per label values, the count of each bucket (not cumulative, the last
+        # one is +Inf) and the sum.
+        self.counts: dict[tuple[str, ...], list[int]] = {}
+        self.sums: dict[tuple[str, ...], float] = {}
+
+    def observe(self, value: float, *labels: str):
+        if not REGISTRY.enabled:
+            return
+        counts = self.counts.get(labels)
+        if counts is None:
+            counts = self.counts[labels] = [0] * (len(self.buckets) + 1)
+            self.sums[labels] = 0.0
+        counts[bisect_left(self.buckets, value)] += 1
+        self.sums[labels] += value
+
+    def samples(self) -> Iterable[str]:
+        for labels, counts in sorted(self.counts.items()):
+            total = 0
+            for bound, count in zip(self.bounds, counts):
+                total += count
+                label_set = format_labels((*self.labels, "le"), (*labels, bound))
+                yield f"{self.name}_bucket{label_set} {total}\n"
+            label_set = format_labels(self.labels, labels)
+            yield f"{self.name}_sum{label_set} {format_value(self.sums[labels])}\n"
+            yield f"{self.name}_count{label_set} {total}\n"
+
+
+HTTP_REQUEST_SECONDS = Histogram(
+    "m2rss_http_request_duration_seconds",
+    "Time to handle a request, streaming included.",
+    ("route",),
+)
+HTTP_RESPONSES = Counter(
+    "m2rss_http_responses_total", "Responses by route and status.", ("route", "status")
+)
+DB_QUERY_SECONDS = Histogram(
+    "m2rss_db_query_duration_seconds",
+    "Time spent in data layer functions, waiting for a connection included.",
+    ("function",),
+)
+IMAP_STAGE_SECONDS = Histogram(
+    "m2rss_imap_batch_duration_seconds",
+    "Time to fetch, parse or store a batch of emails.",
+    ("stage",),
+)
+IMAP_MESSAGES = Counter(
+    "m2rss_imap_messages_total", "Emails fetched, stored or skipped.", ("result",)
+)
+
+
+# Records the duration of a data layer function under its name.
+def timed_query(
+    function: Callable[P, Awaitable[T]],
+) -> Callable[P, Awaitable[T]]:
+    name = function.__name__
+
+    @wraps(function)
+    async def wrapper(*args: P.args, **kwargs: P.kwargs) -> T:
+        if not REGISTRY.enabled:
+            return await function(*args, **kwargs)
+        start = time.perf_counter()
+        try:
+            return await function(*args, **kwargs)
+        finally:
+            DB_QUERY_SECONDS.observe(time.perf_counter() - start, name)
+
+    return wrapper
+
+
+__all__ = [
+    "DB_QUERY_SECONDS",
+    "HTTP_REQUEST_SECONDS",
+    "HTTP_RESPONSES",
+    "IMAP_MESSAGES",
+    "IMAP_STAGE_SECONDS",
+    "REGISTRY",
+    "Counter",
+    "Histogram",
+    "family",
+    "format_value",
+    "timed_query",
+]
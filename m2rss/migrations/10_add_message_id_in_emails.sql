@@ -0,0 +1,3 @@
+ALTER TABLE emails ADD message_id TEXT DEFAULT NULL;
+
+CREATE UNIQUE INDEX emails_message_id_idx ON emails (message_id);
@@ -0,0 +1,3 @@
+ALTER TABLE emails ADD rss_fragment TEXT DEFAULT NULL;
+ALTER TABLE emails ADD html_fragment TEXT DEFAULT NULL;
+ALTER TABLE emails ADD fragment_version INTEGER DEFAULT 0;
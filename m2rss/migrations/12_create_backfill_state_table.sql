@@ -0,0 +1,4 @@
+CREATE TABLE backfill_state (
+    name TEXT PRIMARY KEY,
+    last_id INTEGER
+);
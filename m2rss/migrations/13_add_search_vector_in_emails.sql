@@ -0,0 +1,8 @@
+-- Maintained by Postgres on every insert, so new emails are searchable at once.
+-- The text search configuration must match SEARCH_CONFIG in m2rss/data/emails.py
+-- and bodies are cut below the 1MB tsvector limit.
+ALTER TABLE emails ADD search_vector tsvector GENERATED ALWAYS AS (
+    setweight(to_tsvector('english', COALESCE(subject, '')), 'A') ||
+    setweight(to_tsvector('english', LEFT(COALESCE(body, ''), 262144)), 'B')
+) STORED;
+CREATE INDEX emails_search_vector_idx ON emails USING GIN (search_vector);
@@ -0,0 +1,67 @@
+-- Monthly range partitions on `date`, old months are dropped or detached by
+-- `m2rss email retention` instead of deleted row by row. Unique constraints
+-- must include the partition key: ids are unique with their date, and so are
+-- Message-IDs. Rows without a date land in emails_default, which is why
+-- (id, date) is a unique index and not a primary key.
+ALTER TABLE emails RENAME TO emails_unpartitioned;
+
+CREATE TABLE emails (
+    LIKE emails_unpartitioned INCLUDING DEFAULTS INCLUDING GENERATED INCLUDING IDENTITY
+) PARTITION BY RANGE (date);
+CREATE TABLE emails_default PARTITION OF emails DEFAULT;
+
+-- Partitions are named emails_YYYY_MM, save_emails creates the missing ones.
+CREATE FUNCTION create_email_partition(month TIMESTAMP) RETURNS void AS $$
+DECLARE
+    name TEXT := 'emails_' || to_char(month, 'YYYY_MM');
+BEGIN
+    IF to_regclass(name) IS NULL THEN
+        EXECUTE format(
+            'CREATE TABLE %I PARTITION OF emails FOR VALUES FROM (%L) TO (%L)',
+            name,
+            date_trunc('month', month),
+            date_trunc('month', month) + INTERVAL '1 month'
+        );
+    END IF;
+EXCEPTION WHEN duplicate_table THEN
+    -- Created by a concurrent import.
+    NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+SELECT create_email_partition(month)
+FROM (
+    SELECT DISTINCT date_trunc('month', date) AS month
+    FROM emails_unpartitioned
+    WHERE date IS NOT NULL
+) months;
+
+INSERT INTO emails (
+    id, date, user_agent, content_language, recipient, delivered_to,
+    from_full, from_name, from_addr, sender_full, sender_name, sender_addr,
+    subject, body, formatted_body, message_id,
+    rss_fragment, html_fragment, fragment_version
+)
+OVERRIDING SYSTEM VALUE
+SELECT
+    id, date, user_agent, content_language, recipient, delivered_to,
+    from_full, from_name, from_addr, sender_full, sender_name, sender_addr,
+    subject, body, formatted_body, message_id,
+    rss_fragment, html_fragment, fragment_version
+FROM emails_unpartitioned;
+
+SELECT setval(pg_get_serial_sequence('emails', 'id'), COALESCE(MAX(id), 0) + 1, false)
+FROM emails;
+
+DROP TABLE emails_unpartitioned;
+
+CREATE UNIQUE INDEX emails_id_date_idx ON emails (id, date);
+CREATE UNIQUE INDEX emails_message_id_date_idx ON emails (message_id, date);
+CREATE INDEX emails_from_addr_date_id_idx ON emails (from_addr, date DESC, id DESC);
+CREATE INDEX emails_sender_addr_date_id_idx ON emails (sender_addr, date DESC, id DESC);
+CREATE INDEX emails_delivered_to_date_id_idx ON emails (delivered_to, date DESC, id DESC);
+CREATE INDEX emails_search_vector_idx ON emails USING GIN (search_vector);
+
+CREATE TRIGGER emails_changed
+    AFTER INSERT OR UPDATE OR DELETE ON emails
+    FOR EACH ROW EXECUTE FUNCTION notify_emails_changed();
@@ -0,0 +1,41 @@
+-- Bodies are stored once per distinct content, keyed by the SHA-256 of their
+-- UTF-8 text and compressed by the application (codec zstd or zlib). Existing
+-- bodies are moved as is ("identity"), TOAST still compresses them.
+CREATE TABLE email_contents (
+    hash BYTEA PRIMARY KEY,
+    codec TEXT NOT NULL,
+    data BYTEA NOT NULL
+);
+
+-- The search vector can no longer be generated from the row, save_emails
+-- computes it from the body it stores.
+ALTER TABLE emails ALTER COLUMN search_vector DROP EXPRESSION;
+
+ALTER TABLE emails ADD body_hash BYTEA DEFAULT NULL;
+ALTER TABLE emails ADD formatted_body_hash BYTEA DEFAULT NULL;
+-- Whitespace collapsed start of the body, see excerpt_of in m2rss/data/contents.py.
+ALTER TABLE emails ADD excerpt TEXT DEFAULT '';
+
+INSERT INTO email_contents (hash, codec, data)
+SELECT sha256(data), 'identity', data
+FROM (
+    SELECT convert_to(COALESCE(body, ''), 'UTF8') AS data FROM emails
+    UNION
+    SELECT convert_to(COALESCE(formatted_body, ''), 'UTF8') FROM emails
+) contents;
+
+UPDATE emails SET
+    body_hash = sha256(convert_to(COALESCE(body, ''), 'UTF8')),
+    formatted_body_hash = sha256(convert_to(COALESCE(formatted_body, ''), 'UTF8')),
+    excerpt = left(btrim(regexp_replace(COALESCE(body, ''), '\s+', ' ', 'g')), 280)
+        || CASE
+            WHEN length(btrim(regexp_replace(COALESCE(body, ''), '\s+', ' ', 'g'))) > 280
+            THEN '…' ELSE ''
+        END;
+
+ALTER TABLE emails DROP COLUMN body;
+ALTER TABLE emails DROP COLUMN formatted_body;
+
+-- For `email retention --prune-contents`.
+CREATE INDEX emails_body_hash_idx ON emails (body_hash);
+CREATE INDEX emails_formatted_body_hash_idx ON emails (formatted_body_hash);
@@ -0,0 +1,26 @@
+-- Members of the combined feeds, by alias name so that a group follows the
+-- changes of its aliases.
+CREATE TABLE feed_groups (
+    id INTEGER PRIMARY KEY GENERATED ALWAYS AS IDENTITY,
+    name TEXT NOT NULL,
+    alias TEXT NOT NULL,
+    UNIQUE (name, alias)
+);
+
+CREATE FUNCTION notify_groups_changed() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'DELETE' THEN
+        PERFORM pg_notify('groups_changed', OLD.name);
+        RETURN OLD;
+    END IF;
+    IF TG_OP = 'UPDATE' AND OLD.name IS DISTINCT FROM NEW.name THEN
+        PERFORM pg_notify('groups_changed', OLD.name);
+    END IF;
+    PERFORM pg_notify('groups_changed', NEW.name);
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER groups_changed
+    AFTER INSERT OR UPDATE OR DELETE ON feed_groups
+    FOR EACH ROW EXECUTE FUNCTION notify_groups_changed();
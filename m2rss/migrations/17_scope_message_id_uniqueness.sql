@@ -0,0 +1,33 @@
+-- A message cross-posted to several lists, or received by several accounts,
+-- is stored once per list and recipient so that every feed keeps it. Missing
+-- headers are equal for the dedup, NULLS NOT DISTINCT needs PostgreSQL 15.
+DO $$
+BEGIN
+    IF current_setting('server_version_num')::int < 150000 THEN
+        RAISE EXCEPTION 'm2rss needs PostgreSQL 15 or later, found %',
+            current_setting('server_version');
+    END IF;
+END;
+$$;
+
+-- Rows stored before migration 10 have no Message-ID, and an interrupted
+-- fetch could store them twice. Identical copies are merged into the first,
+-- the others get an id of their own so that they stay distinct.
+DELETE FROM emails dup
+USING emails first
+WHERE dup.message_id IS NULL
+    AND first.message_id IS NULL
+    AND first.id < dup.id
+    AND first.date IS NOT DISTINCT FROM dup.date
+    AND first.delivered_to IS NOT DISTINCT FROM dup.delivered_to
+    AND first.sender_addr IS NOT DISTINCT FROM dup.sender_addr
+    AND first.from_addr IS NOT DISTINCT FROM dup.from_addr
+    AND first.subject IS NOT DISTINCT FROM dup.subject
+    AND first.body_hash IS NOT DISTINCT FROM dup.body_hash;
+
+UPDATE emails SET message_id = 'legacy:' || id WHERE message_id IS NULL;
+
+DROP INDEX emails_message_id_date_idx;
+
+CREATE UNIQUE INDEX emails_message_id_link_date_idx
+    ON emails (message_id, delivered_to, sender_addr, date) NULLS NOT DISTINCT;
@@ -0,0 +1,17 @@
+CREATE FUNCTION notify_aliases_changed() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'DELETE' THEN
+        PERFORM pg_notify('aliases_changed', OLD.alias);
+        RETURN OLD;
+    END IF;
+    IF TG_OP = 'UPDATE' AND OLD.alias IS DISTINCT FROM NEW.alias THEN
+        PERFORM pg_notify('aliases_changed', OLD.alias);
+    END IF;
+    PERFORM pg_notify('aliases_changed', NEW.alias);
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER aliases_changed
+    AFTER INSERT OR UPDATE OR DELETE ON aliases
+    FOR EACH ROW EXECUTE FUNCTION notify_aliases_changed();
@@ -0,0 +1,21 @@
+CREATE FUNCTION notify_emails_changed() RETURNS trigger AS $$
+DECLARE
+    mail emails;
+BEGIN
+    IF TG_OP = 'DELETE' THEN
+        mail := OLD;
+    ELSE
+        mail := NEW;
+    END IF;
+    PERFORM pg_notify('emails_changed', json_build_object(
+        'from_addr', mail.from_addr,
+        'sender_addr', mail.sender_addr,
+        'delivered_to', mail.delivered_to
+    )::text);
+    RETURN mail;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER emails_changed
+    AFTER INSERT OR UPDATE OR DELETE ON emails
+    FOR EACH ROW EXECUTE FUNCTION notify_emails_changed();
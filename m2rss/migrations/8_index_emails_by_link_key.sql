@@ -0,0 +1,3 @@
+CREATE INDEX emails_from_addr_date_id_idx ON emails (from_addr, date DESC, id DESC);
+CREATE INDEX emails_sender_addr_date_id_idx ON emails (sender_addr, date DESC, id DESC);
+CREATE INDEX emails_delivered_to_date_id_idx ON emails (delivered_to, date DESC, id DESC);
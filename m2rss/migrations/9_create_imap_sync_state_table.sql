@@ -0,0 +1,7 @@
+CREATE TABLE imap_sync_state (
+    account TEXT,
+    mailbox TEXT,
+    uid_validity BIGINT,
+    last_uid BIGINT,
+    PRIMARY KEY (account, mailbox)
+);
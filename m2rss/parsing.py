@@ -0,0 +1,162 @@
+import email
+import hashlib
+import re
+from email.message import Message
+from email.utils import parsedate_to_datetime
+
+from html_sanitizer import Sanitizer
+
+from m2rss.data.contents import pack, unpack
+from m2rss.data.emails import Email
+from m2rss.fragments import RENDERER_VERSION, fragments_for, render_fragments
+
+
+class UnknownCharsetException(Exception):
+    pass
+
+
+# In the sanitizer output every "<" starts a tag, so tags can be matched as is.
+VOID_OR_ANCHOR_PATTERN = re.compile(r"<(br|hr)>|<a ((?:[^>\"']|\"[^\"]*\"|'[^']*')*)>")
+ATTRIBUTE_PATTERN = re.compile(r"([^\s=]+)(=(?:\"[^\"]*\"|'[^']*'))?")
+WRAPPER_END_PATTERN = re.compile(r"</div>(\s*)$")
+
+
+def format_plain(text: str) -> str:
+    parts: list[str] = []
+    for line in text.splitlines():
+        if line == "":
+            parts.append("</p><p>")
+        elif not parts:
+            parts.append(line)
+        else:
+            parts.append("<br>" + line)
+    return "<p>" + "".join(parts) + "</p>"
+
+
+def normalize_tag(match: re.Match) -> str:
+    if match.group(1) is not None:
+        return f"<{match.group(1)}/>"
+    attributes = sorted(ATTRIBUTE_PATTERN.findall(match.group(2)))
+    return "<a " + " ".join(name + value for name, value in attributes) + ">"
+
+
+# Sanitized HTML body, or None when nothing is left. The markup is written the
+# way BeautifulSoup serializes it (void tags closed, sorted attributes), which
+# is how formatted bodies used to be stored, without parsing it a second time.
+def format_html(html_sanitizer: Sanitizer, html: str) -> str | None:
+    sanitized = html_sanitizer.sanitize(html)
+    # The sanitizer leaves its wrapper end tag when the body ends with spaces.
+    sanitized = WRAPPER_END_PATTERN.sub(r"\1", sanitized)
+    return VOID_OR_ANCHOR_PATTERN.sub(normalize_tag, sanitized).lstrip() or None
+
+
+def email_from_data(html_sanitizer: Sanitizer, email_addr: str, data: bytes) -> Email:
+    msg: Message = email.message_from_bytes(data)
+    params = {}
+    for key, val in msg.items():
+        match key:
+            case "Date":
+                params["date"] = parsedate_to_datetime(val)
+            case "User-Agent":
+                params["user_agent"] = val
+            case "Content-Language":
+                params["content_language"] = val
+            case "To":
+                params["recipient"] = val
+            case "From":
+                author, _, addr = val.rpartition("<")
+                params["from_full"] = val
+                params["from_name"] = author.strip()
+                params["from_addr"] = addr.replace(">", "")
+            case "Sender":
+                author, _, addr = val.rpartition("<")
+                params["sender_full"] = val
+                params["sender_name"] = author.strip()
+                params["sender_addr"] = addr.replace(">", "")
+            case "Delivered-To":
+                params["delivered_to"] = val
+            case "Subject":
+                params["subject"] = val
+    # Header names are case-insensitive, spellings of Message-ID vary.
+    if (message_id := msg.get("Message-ID")) is not None:
+        params["message_id"] = message_id.strip()
+    for part in msg.walk():
+        maintype = part.get_content_maintype()
+        subtype = part.get_content_subtype()
+        if maintype != "text":
+            continue
+        payload = part.get_payload(decode=True)
+        charset = part.get_content_charset()
+        if charset is None:
+            raise UnknownCharsetException(
+                f"Charset is not given in email {params['subject']}"
+            )
+        if isinstance(payload, bytes):
+            body = payload.decode(charset)
+        elif isinstance(payload, str):
+            body = payload
+        else:
+            raise UnknownCharsetException(f"Type of payload is {type(payload)}")
+        if email_addr:
+            body = body.replace(email_addr, "redacted")
+        if subtype == "plain":
+            params["body"] = body
+        elif subtype == "html":
+            formatted_body = format_html(html_sanitizer, body)
+            if formatted_body is not None:
+                params["formatted_body"] = formatted_body
+
+    if not params.get("message_id"):
+        params["message_id"] = "sha256:" + hashlib.sha256(data).hexdigest()
+    if "formatted_body" not in params:
+        params["formatted_body"] = html_sanitizer.sanitize(format_plain(params["body"]))
+    return render_fragments(Email.model_validate(params))
+
+
+_sanitizer: Sanitizer | None = None
+
+
+# Built once per process, the sanitizer is expensive to create.
+def get_sanitizer() -> Sanitizer:
+    global _sanitizer
+    if _sanitizer is None:
+        _sanitizer = Sanitizer()
+    return _sanitizer
+
+
+# Entry point of the ingestion process pool, failures are returned as messages.
+def parse_messages(
+    email_addr: str, messages: list[tuple[int, bytes]]
+) -> list[tuple[int, Email | None, str]]:
+    sanitizer = get_sanitizer()
+    parsed: list[tuple[int, Email | None, str]] = []
+    for uid, data in messages:
+        try:
+            parsed.append((uid, email_from_data(sanitizer, email_addr, data), ""))
+        except Exception as e:
+            parsed.append((uid, None, str(e)))
+    return parsed
+
+
+# Backfill transform of `email format-body`: rows of
+# (id, subject, from_full, date, excerpt, body codec, body data) to the values
+# of its UPDATE statement in m2rss/cli/email.py.
+def format_bodies(rows: list[tuple]) -> list[tuple]:
+    sanitizer = get_sanitizer()
+    updates: list[tuple] = []
+    for email_id, subject, from_full, date, excerpt, codec, data in rows:
+        body = unpack(codec, data)
+        content = pack(sanitizer.sanitize(format_plain(body)))
+        updates.append(
+            (
+                *content,
+                content.hash,
+                *fragments_for(
+                    subject or "", from_full or "", date, body, excerpt or ""
+                ),
+                RENDERER_VERSION,
+                email_id,
+                date,
+            )
+        )
+    return updates
@@ -0,0 +1,172 @@
+import gzip
+import json
+import re
+from datetime import datetime, timedelta
+from pathlib import Path
+
+from psycopg import Connection, sql
+from pydantic import BaseModel
+
+from m2rss.data.emails import EMAILS_CHANNEL, STORED_COLUMNS
+
+PARTITION_PATTERN = re.compile(r"emails_(\d{4})_(\d{2})")
+DETACHED_PREFIX = "archived_"
+
+
+class Partition(BaseModel):
+    name: str
+    start: datetime
+    end: datetime
+
+
+def get_partitions(conn: Connection) -> list[Partition]:
+    records = conn.execute(
+        "SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+        "WHERE i.inhparent = 'emails'::regclass ORDER BY c.relname"
+    ).fetchall()
+    partitions: list[Partition] = []
+    for (name,) in records:
+        match = PARTITION_PATTERN.fullmatch(name)
+        if match is None:
+            continue
+        start = datetime(int(match.group(1)), int(match.group(2)), 1)
+        end = datetime(start.year + start.month // 12, start.month % 12 + 1, 1)
+        partitions.append(Partition(name=name, start=start, end=end))
+    return partitions
+
+
+def partition_aliases(
+    conn: Connection, partition: Partition, aliases: dict[str, tuple[str, str]]
+) -> list[str]:
+    present: list[str] = []
+    for alias, (link_key, link_val) in aliases.items():
+        record = conn.execute(
+            sql.SQL("SELECT EXISTS (SELECT FROM {} WHERE {} = %s)").format(
+                sql.Identifier(partition.name), sql.Identifier(link_key)
+            ),
+            (link_val,),
+        ).fetchone()
+        if record is not None and record[0]:
+            present.append(alias)
+    return present
+
+
+# A month is kept while any alias with emails in it is within its horizon,
+# partitions are shared so the longest horizon wins. Months without emails of
+# an alias follow the default horizon. None keeps everything.
+def is_expired(
+    partition: Partition,
+    present: list[str],
+    default_days: int | None,
+    alias_days: dict[str, int],
+    now: datetime,
+) -> bool:
+    horizons = [alias_days.get(alias, default_days) for alias in present]
+    if not present:
+        horizons = [default_days]
+    return all(
+        days is not None and partition.end <= now - timedelta(days=days)
+        for days in horizons
+    )
+
+
+# The archive is self-contained, the bodies are copied along as stored (codec
+# and data).
+def archive_partition(conn: Connection, partition: Partition, directory: Path) -> Path:
+    directory.mkdir(parents=True, exist_ok=True)
+    path = directory / f"{partition.name}.csv.gz"
+    tmp = path.with_name(path.name + ".tmp")
+    columns = sql.SQL(", ").join(
+        sql.Identifier("e", column) for column in ["id", *STORED_COLUMNS]
+    )
+    with (
+        conn.cursor() as cur,
+        cur.copy(
+            sql.SQL(
+                "COPY (SELECT {}, b.codec AS body_codec, b.data AS body_data, "
+                "f.codec AS formatted_body_codec, f.data AS formatted_body_data "
+                "FROM {} e "
+                "LEFT JOIN email_contents b ON b.hash = e.body_hash "
+                "LEFT JOIN email_contents f ON f.hash = e.formatted_body_hash) "
+                "TO STDOUT (FORMAT csv, HEADER)"
+            ).format(columns, sql.Identifier(partition.name))
+        ) as copy,
+        gzip.open(tmp, "wb") as f,
+    ):
+        for data in copy:
+            f.write(data)
+    tmp.replace(path)
+    return path
+
+
+# Removes a month in one transaction. Writes are blocked while it is archived,
+# and the feeds of its aliases are invalidated as DROP does not fire the row
+# triggers. Detached partitions are renamed so that the month can be recreated.
+def remove_partition(
+    conn: Connection,
+    partition: Partition,
+    aliases: dict[str, tuple[str, str]],
+    present: list[str],
+    detach: bool,
+    archive_dir: Path | None,
+) -> Path | None:
+    table = sql.Identifier(partition.name)
+    archive = None
+    with conn.transaction():
+        conn.execute(sql.SQL("LOCK TABLE {} IN SHARE MODE").format(table))
+        if archive_dir is not None:
+            archive = archive_partition(conn, partition, archive_dir)
+        if detach:
+            conn.execute(
+                sql.SQL("ALTER TABLE emails DETACH PARTITION {}").format(table)
+            )
+            conn.execute(
+                sql.SQL("ALTER TABLE {} RENAME TO {}").format(
+                    table, sql.Identifier(DETACHED_PREFIX + partition.name)
+                )
+            )
+        else:
+            conn.execute(sql.SQL("DROP TABLE {}").format(table))
+        for alias in present:
+            link_key, link_val = aliases[alias]
+            conn.execute(
+                "SELECT pg_notify(%s, %s)",
+                (EMAILS_CHANNEL, json.dumps({link_key: link_val})),
+            )
+    return archive
+
+
+# Deletes the bodies no longer referenced by emails or detached partitions.
+# Saving emails is blocked meanwhile, so a body reused by an email being
+# stored is not deleted under it.
+def prune_contents(conn: Connection) -> int:
+    tables = [
+        name
+        for (name,) in conn.execute(
+            "SELECT relname FROM pg_class WHERE relkind = 'r' AND relname LIKE %s",
+            (DETACHED_PREFIX.replace("_", "\\_") + "emails\\_%",),
+        )
+    ]
+    unreferenced = sql.SQL(" AND ").join(
+        sql.SQL(
+            "NOT EXISTS (SELECT FROM {} e WHERE e.body_hash = c.hash) "
+            "AND NOT EXISTS (SELECT FROM {} e WHERE e.formatted_body_hash = c.hash)"
+        ).format(sql.Identifier(table), sql.Identifier(table))
+        for table in ["emails", *tables]
+    )
+    with conn.transaction():
+        conn.execute("LOCK TABLE email_contents IN SHARE ROW EXCLUSIVE MODE")
+        cur = conn.execute(
+            sql.SQL("DELETE FROM email_contents c WHERE {}").format(unreferenced)
+        )
+        return cur.rowcount
+
+
+__all__ = [
+    "Partition",
+    "get_partitions",
+    "is_expired",
+    "partition_aliases",
+    "prune_contents",
+    "remove_partition",
+]
@@ -1,11 +1,30 @@
 from aiohttp import web
 
-from m2rss.handlers.feed import handle_item, handle_page, handle_rss_feed
+from m2rss.handlers.feed import (
+    handle_atom_feed,
+    handle_item,
+    handle_json_feed,
+    handle_page,
+    handle_rss_feed,
+)
+from m2rss.handlers.group import (
+    handle_group_atom_feed,
+    handle_group_json_feed,
+    handle_group_rss_feed,
+)
+from m2rss.handlers.search import handle_search_feed, handle_search_page
 
 ROUTES: list[web.RouteDef] = [
     web.get("/rss/{alias}.xml", handle_rss_feed),
+    web.get("/atom/{alias}.xml", handle_atom_feed),
+    web.get("/json/{alias}.json", handle_json_feed),
+    web.get("/rss/group/{name}.xml", handle_group_rss_feed),
+    web.get("/atom/group/{name}.xml", handle_group_atom_feed),
+    web.get("/json/group/{name}.json", handle_group_json_feed),
     web.get("/page/{alias}/{item}.html", handle_item),
     web.get("/page/{alias}.html", handle_page),
+    web.get("/search/{alias}.xml", handle_search_feed),
+    web.get("/search/{alias}.html", handle_search_page),
 ]
 
 
@@ -1,6 +1,10 @@
-from collections.abc import Sequence
+import json
+from abc import ABC, abstractmethod
+from collections.abc import Iterable, Iterator, Sequence
+from datetime import UTC, datetime
+from html import escape
+from typing import Any
 
-from jinja2 import Environment, PackageLoader, select_autoescape
 from pydantic import BaseModel
 
 
@@ -11,6 +15,7 @@ class RSSItem(BaseModel):
     guid: str
     pub_date: str
     author: str | None = None
+    published: datetime | None = None
 
 
 class RssChannel(BaseModel):
@@ -24,11 +29,197 @@ class RssChannel(BaseModel):
     ttl: int | None = None
 
 
-def make_rss(self_link: str, channel: RssChannel, items: Sequence[RSSItem]) -> str:
-    env = Environment(loader=PackageLoader("m2rss"), autoescape=select_autoescape())
-    template = env.get_template("feed.xml")
-    return template.render(
-        self_link=self_link,
-        channel=channel.model_dump(exclude_none=True),
-        items=items,
-    )
+def text_to_html(text: str) -> str:
+    return "".join(f"{escape(line)}<br/>" for line in text.splitlines())
+
+
+def rfc3339(date: datetime | None) -> str:
+    return (date or datetime.now(UTC)).isoformat()
+
+
+# Serializers are stateless and built once, `chunks` yields the document
+# incrementally so that large feeds can be streamed.
+class FeedSerializer(ABC):
+    content_type = "text/xml"
+    separator = ""
+
+    @abstractmethod
+    def head(
+        self,
+        self_link: str,
+        channel: RssChannel,
+        items: Sequence[RSSItem],
+        next_link: str | None,
+    ) -> str: ...
+
+    @abstractmethod
+    def item(self, item: RSSItem) -> str: ...
+
+    @abstractmethod
+    def tail(self) -> str: ...
+
+    def chunks(
+        self,
+        self_link: str,
+        channel: RssChannel,
+        items: Sequence[RSSItem],
+        next_link: str | None = None,
+        rendered: Iterable[str] | None = None,
+    ) -> Iterator[str]:
+        # `rendered` replaces the items by already serialized ones.
+        yield self.head(self_link, channel, items, next_link)
+        if rendered is None:
+            rendered = map(self.item, items)
+        for k, item in enumerate(rendered):
+            yield item if k == 0 else self.separator + item
+        yield self.tail()
+
+    def render(
+        self,
+        self_link: str,
+        channel: RssChannel,
+        items: Sequence[RSSItem],
+        next_link: str | None = None,
+    ) -> str:
+        return "".join(self.chunks(self_link, channel, items, next_link))
+
+
+class RssSerializer(FeedSerializer):
+    def head(
+        self,
+        self_link: str,
+        channel: RssChannel,
+        items: Sequence[RSSItem],
+        next_link: str | None,
+    ) -> str:
+        parts = [
+            '<?xml version="1.0" encoding="UTF-8" ?>\n'
+            '<rss version="2.0" xmlns:atom="http://www.w3.org/2005/Atom">\n'
+            "<channel>\n"
+            f'<atom:link href="{escape(self_link)}" rel="self" '
+            'type="application/rss+xml" />\n'
+        ]
+        if next_link is not None:
+            parts.append(
+                f'<atom:link href="{escape(next_link)}" rel="next" '
+                'type="application/rss+xml" />\n'
+            )
+        for key, val in channel.model_dump(exclude_none=True).items():
+            parts.append(f"<{key}>{escape(str(val))}</{key}>\n")
+        return "".join(parts)
+
+    def item(self, item: RSSItem) -> str:
+        # Escaped text never contains "]]>", so the CDATA section is safe.
+        parts = [
+            f"<item><title>{escape(item.title)}</title>"
+            f"<description><![CDATA[{text_to_html(item.description)}]]></description>"
+        ]
+        if item.link is not None:
+            parts.append(f"<link>{escape(item.link)}</link>")
+        parts.append(
+            f'<guid isPermaLink="true">{escape(item.guid)}</guid>'
+            f"<pubDate>{escape(item.pub_date)}</pubDate>"
+        )
+        if item.author is not None:
+            parts.append(f"<author>{escape(item.author)}</author>")
+        parts.append("</item>\n")
+        return "".join(parts)
+
+    def tail(self) -> str:
+        return "</channel>\n</rss>\n"
+
+
+class AtomSerializer(FeedSerializer):
+    content_type = "application/atom+xml"
+
+    def head(
+        self,
+        self_link: str,
+        channel: RssChannel,
+        items: Sequence[RSSItem],
+        next_link: str | None,
+    ) -> str:
+        parts = [
+            '<?xml version="1.0" encoding="UTF-8" ?>\n'
+            '<feed xmlns="http://www.w3.org/2005/Atom">\n'
+            f"<id>{escape(self_link)}</id>\n"
+            f"<title>{escape(channel.title)}</title>\n"
+            f"<subtitle>{escape(channel.description)}</subtitle>\n"
+            f"<updated>{rfc3339(items[0].published if items else None)}</updated>\n"
+            f'<link href="{escape(self_link)}" rel="self" />\n'
+            f'<link href="{escape(channel.link)}" rel="alternate" />\n'
+        ]
+        if next_link is not None:
+            parts.append(f'<link href="{escape(next_link)}" rel="next" />\n')
+        return "".join(parts)
+
+    def item(self, item: RSSItem) -> str:
+        parts = [
+            f"<entry><id>{escape(item.guid)}</id>"
+            f"<title>{escape(item.title)}</title>"
+            f"<updated>{rfc3339(item.published)}</updated>"
+        ]
+        if item.link is not None:
+            parts.append(f'<link href="{escape(item.link)}" rel="alternate" />')
+        if item.author is not None:
+            parts.append(f"<author><name>{escape(item.author)}</name></author>")
+        parts.append(
+            f'<content type="html">{escape(text_to_html(item.description))}'
+            "</content></entry>\n"
+        )
+        return "".join(parts)
+
+    def tail(self) -> str:
+        return "</feed>\n"
+
+
+class JsonFeedSerializer(FeedSerializer):
+    content_type = "application/feed+json"
+    separator = ","
+
+    def head(
+        self,
+        self_link: str,
+        channel: RssChannel,
+        items: Sequence[RSSItem],
+        next_link: str | None,
+    ) -> str:
+        feed = {
+            "version": "https://jsonfeed.org/version/1.1",
+            "title": channel.title,
+            "description": channel.description,
+            "home_page_url": channel.link,
+            "feed_url": self_link,
+        }
+        if next_link is not None:
+            feed["next_url"] = next_link
+        return json.dumps(feed)[:-1] + ', "items": ['
+
+    def item(self, item: RSSItem) -> str:
+        entry: dict[str, Any] = {
+            "id": item.guid,
+            "url": item.link or item.guid,
+            "title": item.title,
+            "content_html": text_to_html(item.description),
+            "date_published": rfc3339(item.published),
+        }
+        if item.author is not None:
+            entry["authors"] = [{"name": item.author}]
+        return json.dumps(entry)
+
+    def tail(self) -> str:
+        return "]}"
+
+
+RSS_SERIALIZER = RssSerializer()
+ATOM_SERIALIZER = AtomSerializer()
+JSON_FEED_SERIALIZER = JsonFeedSerializer()
+
+
+def make_rss(
+    self_link: str,
+    channel: RssChannel,
+    items: Sequence[RSSItem],
+    next_link: str | None = None,
+) -> str:
+    return RSS_SERIALIZER.render(self_link, channel, items, next_link)
@@ -0,0 +1,56 @@
+import asyncio
+from collections.abc import Awaitable, Callable, Hashable
+from typing import Any, TypeVar
+
+T = TypeVar("T")
+
+
+class OverloadedException(Exception):
+    pass
+
+
+# Concurrent callers with the same key share one computation. Computations run
+# in their own task, so a client going away does not cancel it for the others,
+# at most `max_concurrency` run at once and new ones are refused once
+# `max_queue` are already waiting for a slot.
+class SingleFlight:
+    def __init__(self, max_concurrency: int, max_queue: int):
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.semaphore = asyncio.Semaphore(max_concurrency)
+        self.flights: dict[Hashable, asyncio.Task[Any]] = {}
+        self.coalesced = 0
+        self.shed = 0
+
+    async def run(self, key: Hashable, compute: Callable[[], Awaitable[T]]) -> T:
+        task = self.flights.get(key)
+        if task is not None:
+            self.coalesced += 1
+        else:
+            if self.queued >= self.max_queue:
+                self.shed += 1
+                raise OverloadedException(f"{self.queued} computations queued")
+            task = asyncio.create_task(self.execute(key, compute))
+            task.add_done_callback(retrieve_exception)
+            self.flights[key] = task
+        return await asyncio.shield(task)
+
+    @property
+    def queued(self) -> int:
+        return max(0, len(self.flights) - self.max_concurrency)
+
+    async def execute(self, key: Hashable, compute: Callable[[], Awaitable[T]]) -> T:
+        try:
+            async with self.semaphore:
+                return await compute()
+        finally:
+            del self.flights[key]
+
+
+# Marks the error as seen when every caller went away before the task ended.
+def retrieve_exception(task: asyncio.Task):
+    if not task.cancelled():
+        task.exception()
+
+
+__all__ = ["OverloadedException", "SingleFlight"]
@@ -0,0 +1,166 @@
+import multiprocessing
+import os
+import signal
+import time
+from collections.abc import Callable, Iterable
+from contextlib import suppress
+from multiprocessing.connection import wait
+from multiprocessing.synchronize import Event
+from types import FrameType
+
+from m2rss.constants import LOGGER
+
+WorkerTarget = Callable[[Event], None]
+
+READY_TIMEOUT = 60.0
+# Workers exiting sooner than this after their start are restarted with backoff.
+MIN_UPTIME = 5.0
+MAX_RESTART_DELAY = 30.0
+
+
+class Worker:
+    def __init__(self, target: WorkerTarget):
+        context = multiprocessing.get_context("spawn")
+        self.ready = context.Event()
+        self.process = context.Process(target=target, args=(self.ready,))
+        self.started_at = 0.0
+
+    def start(self):
+        self.process.start()
+        self.started_at = time.monotonic()
+
+    @property
+    def uptime(self) -> float:
+        return time.monotonic() - self.started_at
+
+    def wait_ready(self, timeout: float) -> bool:
+        deadline = time.monotonic() + timeout
+        while not self.ready.wait(0.2):
+            if not self.process.is_alive() or time.monotonic() > deadline:
+                return False
+        return True
+
+    def stop(self):
+        if self.process.pid is not None and self.process.is_alive():
+            os.kill(self.process.pid, signal.SIGTERM)
+
+    def join(self, timeout: float):
+        self.process.join(timeout)
+        if self.process.is_alive():
+            LOGGER.warning(f"Worker {self.process.pid} did not drain, killing it")
+            self.process.kill()
+            self.process.join()
+
+
+# Pre-forked worker processes: crashed workers are restarted, SIGTERM/SIGINT
+# drain every worker and SIGHUP replaces them one at a time, each new worker
+# being ready before the old one drains. `prepare` runs before the first start
+# and before every reload (migrations).
+class Supervisor:
+    def __init__(
+        self,
+        target: WorkerTarget,
+        workers: int,
+        shutdown_timeout: float,
+        prepare: Callable[[], None],
+    ):
+        self.target = target
+        self.count = workers
+        self.shutdown_timeout = shutdown_timeout
+        self.prepare = prepare
+        self.workers: list[Worker] = []
+        self.stopping = False
+        self.reloading = False
+        self.restart_delay = 1.0
+        # Signals are written to this pipe (signal.set_wakeup_fd), so that
+        # waits end as soon as one arrives. Handlers only set flags.
+        self.wakeup_read, self.wakeup_write = os.pipe()
+        os.set_blocking(self.wakeup_read, False)
+        os.set_blocking(self.wakeup_write, False)
+
+    def on_stop(self, signum: int, frame: FrameType | None):
+        self.stopping = True
+
+    def on_reload(self, signum: int, frame: FrameType | None):
+        self.reloading = True
+
+    # Waits for one of `sentinels` or a signal, at most `timeout` sec.
+    def pause(self, timeout: float, sentinels: Iterable[int] = ()):
+        ready = wait([*sentinels, self.wakeup_read], timeout)
+        if self.wakeup_read in ready:
+            with suppress(BlockingIOError):
+                while os.read(self.wakeup_read, 512):
+                    pass
+
+    # Delay before restarting a crashed worker, cut short by SIGTERM/SIGINT.
+    def backoff(self, delay: float):
+        deadline = time.monotonic() + delay
+        while not self.stopping and (left := deadline - time.monotonic()) > 0:
+            self.pause(left)
+
+    def spawn(self) -> Worker:
+        worker = Worker(self.target)
+        worker.start()
+        LOGGER.info(f"Started worker {worker.process.pid}")
+        return worker
+
+    def run(self):
+        signal.set_wakeup_fd(self.wakeup_write)
+        signal.signal(signal.SIGTERM, self.on_stop)
+        signal.signal(signal.SIGINT, self.on_stop)
+        signal.signal(signal.SIGHUP, self.on_reload)
+        self.prepare()
+        self.workers = [self.spawn() for _ in range(self.count)]
+        for worker in self.workers:
+            worker.wait_ready(READY_TIMEOUT)
+
+        while not self.stopping:
+            if self.reloading:
+                self.reloading = False
+                self.reload()
+            self.pause(1.0, [worker.process.sentinel for worker in self.workers])
+            for k, worker in enumerate(self.workers):
+                if worker.process.is_alive() or self.stopping:
+                    continue
+                LOGGER.warning(
+                    f"Worker {worker.process.pid} exited with code "
+                    f"{worker.process.exitcode}, restarting it"
+                )
+                if worker.uptime < MIN_UPTIME:
+                    self.backoff(self.restart_delay)
+                    if self.stopping:
+                        break
+                    self.restart_delay = min(self.restart_delay * 2, MAX_RESTART_DELAY)
+                else:
+                    self.restart_delay = 1.0
+                self.workers[k] = self.spawn()
+        self.shutdown()
+
+    def reload(self):
+        LOGGER.info("Reloading workers")
+        try:
+            self.prepare()
+        except Exception as e:
+            LOGGER.error(f"Reload aborted, could not prepare: {e}")
+            return
+        for k, old in enumerate(self.workers):
+            new = self.spawn()
+            if not new.wait_ready(READY_TIMEOUT):
+                LOGGER.error(f"Worker {new.process.pid} did not start, reload aborted")
+                new.stop()
+                new.join(self.shutdown_timeout)
+                return
+            self.workers[k] = new
+            old.stop()
+            old.join(self.shutdown_timeout)
+        LOGGER.info("Workers reloaded")
+
+    def shutdown(self):
+        LOGGER.info("Draining workers")
+        for worker in self.workers:
+            worker.stop()
+        for worker in self.workers:
+            worker.join(self.shutdown_timeout)
+
+
+__all__ = ["Supervisor"]
@@ -0,0 +1,234 @@
+import asyncio
+from concurrent.futures import Executor
+from datetime import UTC, datetime
+
+from psycopg_pool import AsyncConnectionPool
+from pydantic import BaseModel
+
+from m2rss.config import Config, MailboxConfig, get_mailboxes
+from m2rss.constants import LOGGER
+from m2rss.data.aliases import LINK_KEYS
+from m2rss.data.emails import Email, save_emails
+from m2rss.data.sync_state import SyncState, get_sync_state, save_sync_state
+from m2rss.export import Exporter
+from m2rss.imap import Backoff, ImapClient, MailboxSync
+from m2rss.ingest import IngestPipeline, ingest_workers
+
+
+class IdleNotSupportedException(Exception):
+    pass
+
+
+class MailboxHealth(BaseModel):
+    account: str
+    folder: str
+    connected: bool = False
+    last_sync: datetime | None = None
+    last_error: str | None = None
+    # Failed sessions since the last successful sync.
+    failures: int = 0
+    errors: int = 0
+    messages: int = 0
+
+    @property
+    def healthy(self) -> bool:
+        return self.failures == 0
+
+
+# Watches one folder of a mailbox with its own IMAP session. The executor, the
+# database pool and the `limit` of concurrent syncs are shared by the watchers.
+class MailboxWatcher:
+    def __init__(
+        self,
+        config: Config,
+        mailbox: MailboxConfig,
+        folder: str,
+        pool: AsyncConnectionPool,
+        executor: Executor,
+        exporter: Exporter | None,
+        limit: asyncio.Semaphore,
+    ):
+        self.config = config
+        self.mailbox = mailbox
+        self.folder = folder
+        self.pool = pool
+        self.executor = executor
+        self.exporter = exporter
+        self.limit = limit
+        self.health = MailboxHealth(account=mailbox.email_addr, folder=folder)
+        self.name = f"{mailbox.email_addr}/{folder}"
+
+    def client(self) -> ImapClient:
+        return ImapClient(
+            self.mailbox.email_server,
+            self.mailbox.imap_port,
+            self.mailbox.imap_starttls,
+        )
+
+    def failed(self, e: Exception):
+        self.health.connected = False
+        self.health.failures += 1
+        self.health.errors += 1
+        self.health.last_error = str(e)
+
+    async def open(self, client: ImapClient) -> tuple[MailboxSync, int]:
+        await client.login(self.mailbox.email_addr, self.mailbox.email_pass)
+        sync = MailboxSync(client, self.folder)
+        return sync, await sync.select()
+
+    # The export runs once the emails are checkpointed and the sync slot is
+    # released, a slow or failing export does not hold up ingestion.
+    async def sync(self, sync: MailboxSync, uid_validity: int):
+        async with self.limit:
+            emails = await self.sync_mailbox(sync, uid_validity)
+        self.health.last_sync = datetime.now(UTC)
+        self.health.failures = 0
+        self.health.last_error = None
+        await self.export(emails)
+
+    async def export(self, emails: list[Email]):
+        if self.exporter is None or not emails:
+            return
+        try:
+            await self.exporter.on_emails(emails)
+        except Exception as e:
+            LOGGER.error(f"{self.name}: export failed: {e}")
+
+    # Returns the stored emails to export, one per feed link (the exporter
+    # reads the new items from the database).
+    async def sync_mailbox(self, sync: MailboxSync, uid_validity: int) -> list[Email]:
+        account = self.mailbox.email_addr
+        state = await get_sync_state(self.pool, account, sync.mailbox)
+        last_uid = 0
+        if state is not None and state.uid_validity == uid_validity:
+            last_uid = state.last_uid
+        uids = await sync.new_uids(last_uid)
+        if not uids:
+            return []
+
+        stored: dict[tuple[str | None, ...], Email] = {}
+
+        async def store(emails: list[Email]):
+            await save_emails(self.pool, emails)
+            if self.exporter is not None:
+                for mail in emails:
+                    link = tuple(getattr(mail, key) for key in LINK_KEYS)
+                    stored.setdefault(link, mail)
+
+        async def checkpoint(uid: int):
+            await save_sync_state(
+                self.pool,
+                SyncState(
+                    account=account,
+                    mailbox=sync.mailbox,
+                    uid_validity=uid_validity,
+                    last_uid=uid,
+                ),
+            )
+
+        pipeline = IngestPipeline(
+            self.executor,
+            ingest_workers(self.config),
+            account,
+            self.config.imap_fetch_batch_size,
+            self.config.ingest_queue_size,
+            store,
+            checkpoint,
+        )
+        stats = await pipeline.run(sync, uids)
+        await sync.expunge()
+        self.health.messages += stats.messages
+        LOGGER.info(
+            f"{self.name}: received {stats.messages} new emails "
+            f"({stats.failed} skipped) in {stats.seconds:.2f}s, "
+            f"{stats.rate:.1f} emails/s"
+        )
+        return list(stored.values())
+
+    async def fetch(self):
+        async with self.client() as client:
+            sync, uid_validity = await self.open(client)
+            self.health.connected = True
+            try:
+                await self.sync(sync, uid_validity)
+            finally:
+                self.health.connected = False
+
+    async def idle(self, backoff: Backoff):
+        async with self.client() as client:
+            sync, uid_validity = await self.open(client)
+            if "IDLE" not in client.capabilities:
+                raise IdleNotSupportedException(
+                    f"{self.mailbox.email_server} lacks IDLE"
+                )
+            self.health.connected = True
+            backoff.reset()
+            await self.sync(sync, uid_validity)
+            while True:
+                # Servers may drop IDLE sessions after 30 min, so refresh before.
+                if await client.idle(self.config.imap_idle_refresh):
+                    await self.sync(sync, uid_validity)
+
+    async def poll(self):
+        while True:
+            try:
+                await self.fetch()
+            except Exception as e:
+                self.failed(e)
+                LOGGER.error(
+                    f"{self.name}: an error occured. "
+                    f"Retrying in {self.config.fetch_mail_every}s: {e}"
+                )
+            await asyncio.sleep(self.config.fetch_mail_every)
+
+    async def watch_idle(self):
+        backoff = Backoff(maximum=self.config.imap_reconnect_max_delay)
+        while True:
+            try:
+                await self.idle(backoff)
+            except IdleNotSupportedException as e:
+                LOGGER.warning(f"{self.name}: {e}, falling back to polling.")
+                return await self.poll()
+            except Exception as e:
+                self.failed(e)
+                LOGGER.warning(
+                    f"{self.name}: IMAP session lost. "
+                    f"Reconnecting in {backoff.delay}s: {e}"
+                )
+            await backoff.wait()
+
+    async def run(self):
+        if self.config.imap_idle:
+            await self.watch_idle()
+        else:
+            await self.poll()
+
+
+def make_watchers(
+    config: Config,
+    pool: AsyncConnectionPool,
+    executor: Executor,
+    exporter: Exporter | None,
+) -> list[MailboxWatcher]:
+    limit = asyncio.Semaphore(config.imap_max_concurrency)
+    return [
+        MailboxWatcher(config, mailbox, folder, pool, executor, exporter, limit)
+        for mailbox in get_mailboxes(config)
+        for folder in mailbox.folders
+    ]
+
+
+# Every watcher retries on its own, a failing server only delays its folders.
+async def watch_mailboxes(watchers: list[MailboxWatcher]):
+    async with asyncio.TaskGroup() as group:
+        for watcher in watchers:
+            group.create_task(watcher.run(), name=watcher.name)
+
+
+__all__ = [
+    "IdleNotSupportedException",
+    "MailboxHealth",
+    "MailboxWatcher",
+    "make_watchers",
+    "watch_mailboxes",
+]
@@ -0,0 +1,47 @@
+import tempfile
+import unittest
+from pathlib import Path
+
+from m2rss.archive import ArchiveSource
+
+# Two messages of a mboxrd file, the first quotes body lines starting with
+# "From " and ">From ".
+MBOXRD = (
+    b"From alice@example.org Mon Jan  1 10:00:00 2024\n"
+    b"Subject: first\n"
+    b"\n"
+    b">From the start, quoted once.\n"
+    b">>From here, quoted twice.\n"
+    b"> From is not a From line.\n"
+    b"\n"
+    b"From bob@example.org Mon Jan  1 11:00:00 2024\n"
+    b"Subject: second\n"
+    b"\n"
+    b"Body\n"
+)
+
+
+class MboxTest(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = Path(directory.name) / "archive.mbox"
+        self.path.write_bytes(MBOXRD)
+
+    def test_quoted_from_lines(self):
+        with ArchiveSource(self.path) as source:
+            self.assertEqual(source.uids(), [0, 1])
+            (_, first), (_, second) = source.read([0, 1])
+        self.assertEqual(
+            first,
+            b"Subject: first\n"
+            b"\n"
+            b"From the start, quoted once.\n"
+            b">From here, quoted twice.\n"
+            b"> From is not a From line.\n",
+        )
+        self.assertEqual(second, b"Subject: second\n\nBody")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,46 @@
+import asyncio
+import unittest
+
+from benchmarks.imap_server import ImapStandIn
+from m2rss.imap import ImapClient, MailboxSync
+
+MESSAGE = b"From: a@example.org\r\nSubject: test\r\n\r\nbody\r\n"
+
+
+class IdleTest(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.server = ImapStandIn()
+        port = await self.server.start()
+        self.client = ImapClient("127.0.0.1", port, starttls=False, timeout=5)
+        await self.client.connect()
+        await self.client.login("user", "pass")
+        self.sync = MailboxSync(self.client)
+        await self.sync.select()
+
+    async def asyncTearDown(self):
+        await self.client.close()
+        await self.server.stop()
+
+    async def test_exists_during_command(self):
+        uid = self.server.add_message(MESSAGE)
+        await self.sync.new_uids(uid)
+        commands = len(self.server.commands)
+        async with asyncio.timeout(1):
+            self.assertTrue(await self.client.idle(30))
+        self.assertEqual(len(self.server.commands), commands)
+
+    async def test_exists_during_idle(self):
+        idle = asyncio.create_task(self.client.idle(30))
+        while not self.server.idling:
+            await asyncio.sleep(0.01)
+        self.server.add_message(MESSAGE)
+        async with asyncio.timeout(1):
+            self.assertTrue(await idle)
+        self.assertFalse(self.client.exists)
+
+    async def test_idle_timeout(self):
+        self.assertFalse(await self.client.idle(0.1))
+
+
+if __name__ == "__main__":
+    unittest.main()
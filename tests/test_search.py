@@ -0,0 +1,83 @@
+import unittest
+from datetime import datetime
+from urllib.parse import parse_qs, urlsplit
+
+import jinja2
+
+from m2rss.data.emails import (
+    FeedRow,
+    SearchPage,
+    decode_cursor,
+    decode_search_cursor,
+)
+from m2rss.handlers.search import search_links
+
+PATH = "/search/list.html"
+
+
+def row(email_id: int) -> FeedRow:
+    return FeedRow(email_id, datetime(2024, 5, email_id), "s", "f", "", "")
+
+
+def params(link: str | None) -> dict[str, str]:
+    assert link is not None
+    return {k: v for k, (v,) in parse_qs(urlsplit(link).query).items()}
+
+
+# Only the `max_matches` newest matches are ranked, the pages must lead to the
+# older ones instead of ending at the cap.
+class SearchCapTest(unittest.TestCase):
+    def test_within_cap(self):
+        page = SearchPage([(row(3), 0.5), (row(2), 0.25)], more=False, older=None)
+        _, next_link, older_link = search_links(PATH, "word", 2, "", "", page)
+        self.assertIsNone(next_link)
+        self.assertIsNone(older_link)
+
+    def test_more_ranked_matches(self):
+        older = (datetime(2024, 5, 1), 1)
+        page = SearchPage([(row(3), 0.5), (row(2), 0.25)], more=True, older=older)
+        _, next_link, older_link = search_links(PATH, "word", 2, "", "", page)
+        rank, date, email_id = decode_search_cursor(params(next_link)["before"])
+        self.assertEqual((rank, date, email_id), (0.25, row(2).date, 2))
+        self.assertNotIn("until", params(next_link))
+        self.assertEqual(decode_cursor(params(older_link)["until"]), older)
+
+    def test_last_ranked_page_continues_with_older_matches(self):
+        older = (datetime(2024, 5, 1), 1)
+        page = SearchPage([(row(2), 0.25)], more=False, older=older)
+        self_link, next_link, older_link = search_links(
+            PATH, "word", 2, "", "20240506000000000000-6-0.5", page
+        )
+        self.assertIn("before", params(self_link))
+        self.assertEqual(next_link, older_link)
+        self.assertEqual(params(next_link), params(older_link))
+        self.assertNotIn("before", params(next_link))
+        self.assertEqual(decode_cursor(params(next_link)["until"]), older)
+
+    def test_older_window_keeps_its_bound(self):
+        until = "20240501000000000000-1"
+        page = SearchPage([(row(3), 0.5), (row(2), 0.25)], more=True, older=None)
+        _, next_link, _ = search_links(PATH, "word", 2, until, "", page)
+        self.assertEqual(params(next_link)["until"], until)
+
+    def test_page_tells_results_are_truncated(self):
+        templates = jinja2.Environment(
+            loader=jinja2.PackageLoader("m2rss"), autoescape=True
+        )
+        data = {
+            "feed_name": "list",
+            "feed_alias": "list",
+            "query": "word",
+            "cards": [],
+            "next_link": None,
+            "max_matches": 1000,
+        }
+        template = templates.get_template("search.html")
+        self.assertNotIn("Search older", template.render(data, older_link=None))
+        body = template.render(data, older_link=f"{PATH}?q=word&until=x")
+        self.assertIn("Only the 1000 newest matches are ranked", body)
+        self.assertIn("Search older messages", body)
+
+
+if __name__ == "__main__":
+    unittest.main()